@@ -0,0 +1,364 @@
+import logging
+import datetime
+from bisect import bisect_right
+from threading import Lock
+from data_utils import load_saved_transactions, get_data_version, parse_date
+from ledger_utils import get_ledger_entry, get_ledger_entries, add_ledger_listener, effective_transaction
+
+logger = logging.getLogger(__name__)
+
+# Day numbers for the daily series count from this date
+DAY_ZERO = datetime.date(1970, 1, 1).toordinal()
+
+class PrefixSums:
+    """
+    Running totals over day numbers with point updates (a sparse Fenwick tree).
+
+    add() and prefix() each touch at most log2(SIZE) nodes, so a window
+    total is two prefix lookups however much history there is.
+    """
+    SIZE = 1 << 16  # about 179 years of days from DAY_ZERO
+
+    def __init__(self):
+        self.tree = {}
+
+    def add(self, day, value):
+        i = day + 1
+        while i <= self.SIZE:
+            self.tree[i] = self.tree.get(i, 0) + value
+            i += i & -i
+
+    def prefix(self, day):
+        """Sum of every value on days 0 through day."""
+        total = 0
+        i = min(day + 1, self.SIZE)
+        while i > 0:
+            total += self.tree.get(i, 0)
+            i -= i & -i
+        return total
+
+    def range_sum(self, start_day, end_day):
+        """Sum of the values on days start_day through end_day, inclusive."""
+        return self.prefix(end_day) - self.prefix(start_day - 1)
+
+def _manual_transaction(tx_data):
+    """A manual transaction in the same shape as ledger_utils.effective_transaction."""
+    return {
+        'date': tx_data.get('date', ''),
+        'amount_cents': tx_data.get('amount_cents', 0),
+        'is_debit': tx_data.get('is_debit', True),
+        'category': tx_data.get('category', 'Uncategorized'),
+        'subcategory': tx_data.get('subcategory', ''),
+        'account_id': tx_data.get('account_id', '')
+    }
+
+class AggregateCube:
+    """
+    Transaction sums and counts by month, category, subcategory, account and direction.
+
+    Cells are grouped by (year, month) and keyed by (category, subcategory,
+    account_id, is_debit); each holds [cents, count] with cents always
+    positive. The cube remembers what every transaction contributed, so a
+    change is applied as a delta: the old contribution is taken out and
+    the new one added. Alongside the monthly cells, each category keeps a
+    daily prefix-sum series so any date window is answered in
+    O(categories), and each day keeps its own cells for cash-flow series.
+    Ledger changes arrive through a ledger listener.
+    Changes to saved transactions are found on the next read by comparing
+    them with the snapshot the cube last saw, which happens only when the
+    transactions data version has moved. Reports then read only the months
+    they cover.
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.months = None
+        # Transaction counts: category -> [count, {subcategory: count}]
+        self.category_counts = {}
+        # Signed cents per day: category -> PrefixSums
+        self.daily = {}
+        # Day number -> {cell key: cents}
+        self.days = {}
+        # tx_id -> (month key, cell key, cents, day) it was added with
+        self.contributions = {}
+        self.saved_snapshot = {}
+        self.transactions_version = None
+        self.pending_ids = set()
+
+    def mark_changed(self, tx_ids):
+        """Queue transactions to be re-aggregated on the next read."""
+        with self.lock:
+            if self.months is not None:
+                self.pending_ids.update(tx_ids)
+
+    def _remove(self, tx_id):
+        contribution = self.contributions.pop(tx_id, None)
+        if contribution is None:
+            return
+        month_key, cell_key, cents, day = contribution
+        self.daily[cell_key[0]].add(day, cents if cell_key[3] else -cents)
+        if cents:
+            day_cells = self.days[day]
+            day_cells[cell_key] -= cents
+            if day_cells[cell_key] == 0:
+                del day_cells[cell_key]
+                if not day_cells:
+                    del self.days[day]
+        cells = self.months[month_key]
+        cell = cells[cell_key]
+        cell[0] -= cents
+        cell[1] -= 1
+        if cell[1] == 0:
+            del cells[cell_key]
+            if not cells:
+                del self.months[month_key]
+
+        category, subcategory = cell_key[0], cell_key[1]
+        counts = self.category_counts[category]
+        counts[0] -= 1
+        if subcategory:
+            counts[1][subcategory] -= 1
+            if counts[1][subcategory] == 0:
+                del counts[1][subcategory]
+        if counts[0] == 0:
+            del self.category_counts[category]
+
+    def _add(self, tx_id, tx):
+        try:
+            tx_date = parse_date(tx['date'])
+        except (ValueError, TypeError):
+            logger.warning(f"Skipping transaction {tx_id} with invalid date in aggregates")
+            return
+        cents = tx['amount_cents']
+        day = tx_date.toordinal() - DAY_ZERO
+        if not 0 <= day < PrefixSums.SIZE:
+            logger.warning(f"Skipping transaction {tx_id} dated outside the aggregate range: {tx_date}")
+            return
+        month_key = (tx_date.year, tx_date.month)
+        cell_key = (tx['category'], tx['subcategory'] or '', tx['account_id'] or '', bool(tx['is_debit']))
+        cell = self.months.setdefault(month_key, {}).setdefault(cell_key, [0, 0])
+        cell[0] += cents
+        cell[1] += 1
+        self.daily.setdefault(cell_key[0], PrefixSums()).add(day, -cents if cell_key[3] else cents)
+        if cents:
+            day_cells = self.days.setdefault(day, {})
+            day_cells[cell_key] = day_cells.get(cell_key, 0) + cents
+        self.contributions[tx_id] = (month_key, cell_key, cents, day)
+
+        counts = self.category_counts.setdefault(cell_key[0], [0, {}])
+        counts[0] += 1
+        if cell_key[1]:
+            counts[1][cell_key[1]] = counts[1].get(cell_key[1], 0) + 1
+
+    def _aggregate(self, tx_id, entry, tx_data):
+        """Replace one transaction's contribution with its current state."""
+        self._remove(tx_id)
+        if tx_data.get('deleted', False):
+            return
+        if tx_data.get('manual', False):
+            self._add(tx_id, _manual_transaction(tx_data))
+        elif entry is not None:
+            tx = effective_transaction(entry, tx_data)
+            if 'date' in tx_data:
+                try:
+                    parse_date(tx['date'])
+                except ValueError:
+                    tx['date'] = entry['raw_date']
+            self._add(tx_id, tx)
+
+    def _refresh(self):
+        """Build the cube on first use, then apply pending changes. Caller must hold the lock."""
+        transactions_version = get_data_version('transactions')
+        saved_transactions = load_saved_transactions()
+        if self.months is None:
+            self.months = {}
+            self.daily = {}
+            self.days = {}
+            self.pending_ids = set()
+            entries = get_ledger_entries()
+            for tx_id, entry in entries.items():
+                self._aggregate(tx_id, entry, saved_transactions.get(tx_id, {}))
+            for tx_id, tx_data in saved_transactions.items():
+                if tx_data.get('manual', False):
+                    self._aggregate(tx_id, None, tx_data)
+            self.saved_snapshot = {tx_id: dict(tx_data) for tx_id, tx_data in saved_transactions.items()}
+            self.transactions_version = transactions_version
+            logger.info(f"Built aggregate cube from {len(self.contributions)} transactions")
+            return
+
+        changed = self.pending_ids
+        self.pending_ids = set()
+        if transactions_version != self.transactions_version:
+            for tx_id in set(saved_transactions) | set(self.saved_snapshot):
+                if saved_transactions.get(tx_id) != self.saved_snapshot.get(tx_id):
+                    changed.add(tx_id)
+                    if tx_id in saved_transactions:
+                        self.saved_snapshot[tx_id] = dict(saved_transactions[tx_id])
+                    else:
+                        del self.saved_snapshot[tx_id]
+            self.transactions_version = transactions_version
+        for tx_id in changed:
+            self._aggregate(tx_id, get_ledger_entry(tx_id), saved_transactions.get(tx_id, {}))
+
+    def annual_totals(self, start_year=None, end_year=None):
+        """Signed cents by year and category, debits negative. Returns {year: {category: cents}}."""
+        with self.lock:
+            self._refresh()
+            totals = {}
+            for (year, month), cells in self.months.items():
+                if (start_year and year < start_year) or (end_year and year > end_year):
+                    continue
+                year_totals = totals.setdefault(year, {})
+                for (category, _, _, is_debit), (cents, _) in cells.items():
+                    year_totals[category] = year_totals.get(category, 0) + (-cents if is_debit else cents)
+            return totals
+
+    def window_totals(self, start_date, end_date):
+        """
+        Signed cents by category for transactions dated start_date through end_date.
+
+        Two prefix-sum lookups per category. Categories that net to zero in
+        the window are left out.
+        """
+        start_day = max(start_date.toordinal() - DAY_ZERO, 0)
+        end_day = min(end_date.toordinal() - DAY_ZERO, PrefixSums.SIZE - 1)
+        with self.lock:
+            self._refresh()
+            totals = {}
+            if start_day > end_day:
+                return totals
+            for category in self.category_counts:
+                cents = self.daily[category].range_sum(start_day, end_day)
+                if cents:
+                    totals[category] = cents
+            return totals
+
+    def monthly_totals(self, month_keys, by_subcategory=False):
+        """
+        Signed cents per month for each category, or (category, subcategory).
+
+        month_keys is the list of (year, month) columns. Returns
+        {row key: {(year, month): cents}} with debits negative.
+        """
+        with self.lock:
+            self._refresh()
+            totals = {}
+            for month_key in month_keys:
+                for (category, subcategory, _, is_debit), (cents, _) in self.months.get(month_key, {}).items():
+                    row_key = (category, subcategory) if by_subcategory else category
+                    row = totals.setdefault(row_key, {})
+                    row[month_key] = row.get(month_key, 0) + (-cents if is_debit else cents)
+            return totals
+
+    def flow_series(self, bucket_starts, end_date, group_by='category'):
+        """
+        Income and expense cents per bucket for each category or account.
+
+        bucket_starts is the sorted list of bucket start dates; the last
+        bucket runs through end_date. Only days with transactions are
+        visited. Returns {group: ([income cents], [expense cents])}.
+        """
+        group_index = 2 if group_by == 'account' else 0
+        starts = [start.toordinal() - DAY_ZERO for start in bucket_starts]
+        end_day = end_date.toordinal() - DAY_ZERO
+        with self.lock:
+            self._refresh()
+            series = {}
+            if not starts or starts[0] > end_day:
+                return series
+            if end_day - starts[0] < len(self.days):
+                days = [day for day in range(starts[0], end_day + 1) if day in self.days]
+            else:
+                days = sorted(day for day in self.days if starts[0] <= day <= end_day)
+            for day in days:
+                bucket = bisect_right(starts, day) - 1
+                for cell_key, cents in self.days[day].items():
+                    group = cell_key[group_index]
+                    if group not in series:
+                        series[group] = ([0] * len(starts), [0] * len(starts))
+                    series[group][1 if cell_key[3] else 0][bucket] += cents
+            return series
+
+    def category_counts_by_name(self):
+        """Transaction counts by category and by category and subcategory."""
+        with self.lock:
+            self._refresh()
+            category_counts = {category: counts[0] for category, counts in self.category_counts.items()}
+            subcategory_counts = {
+                category: dict(counts[1]) for category, counts in self.category_counts.items() if counts[1]
+            }
+            return category_counts, subcategory_counts
+
+_cube = AggregateCube()
+add_ledger_listener(_cube.mark_changed)
+
+def annual_category_totals(start_year=None, end_year=None):
+    """Signed cents by year and category."""
+    return _cube.annual_totals(start_year, end_year)
+
+def window_category_totals(start_date, end_date):
+    """Signed cents by category for an inclusive date window."""
+    return _cube.window_totals(start_date, end_date)
+
+def rolling_window(window, today=None):
+    """
+    The (start_date, end_date) of a named trailing window ending today.
+
+    LTM, T3M and T6M start on the first of the month 12, 3 or 6 months
+    back; YTD starts on January 1. Raises ValueError for other names.
+    """
+    today = today or datetime.date.today()
+    window = (window or '').upper()
+    if window == 'YTD':
+        return datetime.date(today.year, 1, 1), today
+    months_back = {'LTM': 12, 'T3M': 3, 'T6M': 6}.get(window)
+    if months_back is None:
+        raise ValueError(f"Unknown window: {window}")
+    month_index = today.year * 12 + today.month - 1 - months_back
+    return datetime.date(month_index // 12, month_index % 12 + 1, 1), today
+
+def monthly_category_totals(month_keys, by_subcategory=False):
+    """Signed cents per (year, month) for each category, or (category, subcategory) pair."""
+    return _cube.monthly_totals(month_keys, by_subcategory)
+
+CASHFLOW_INTERVALS = ('day', 'week', 'month')
+
+def cashflow_buckets(start_date, end_date, interval='month', max_points=None):
+    """
+    Start dates of the day, week (Monday) or month buckets covering a date range.
+
+    The first bucket starts at start_date even when that falls mid-week
+    or mid-month. If there would be more than max_points buckets, runs
+    of consecutive buckets are merged so there are at most max_points.
+    Returns (bucket start dates, intervals per bucket). Raises ValueError
+    for an unknown interval.
+    """
+    if interval not in CASHFLOW_INTERVALS:
+        raise ValueError(f"Unknown interval: {interval}")
+    if interval == 'day':
+        count = (end_date - start_date).days + 1
+        starts = [start_date + datetime.timedelta(days=i) for i in range(max(count, 0))]
+    elif interval == 'week':
+        week = start_date - datetime.timedelta(days=start_date.weekday())
+        starts = []
+        while week <= end_date:
+            starts.append(max(week, start_date))
+            week += datetime.timedelta(days=7)
+    else:
+        month_index = start_date.year * 12 + start_date.month - 1
+        end_index = end_date.year * 12 + end_date.month - 1
+        starts = [start_date] + [
+            datetime.date(index // 12, index % 12 + 1, 1) for index in range(month_index + 1, end_index + 1)
+        ]
+    step = 1
+    if max_points and len(starts) > max_points:
+        step = -(-len(starts) // max_points)
+        starts = starts[::step]
+    return starts, step
+
+def cashflow_series(bucket_starts, end_date, group_by='category'):
+    """Income and expense cents per bucket, by category or by account ID."""
+    return _cube.flow_series(bucket_starts, end_date, group_by)
+
+def category_transaction_counts():
+    """Transaction counts by category, and by subcategory within each category."""
+    return _cube.category_counts_by_name()
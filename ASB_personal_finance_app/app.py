@@ -7,19 +7,33 @@ from plaid.model.products import Products
 from plaid.model.country_code import CountryCode
 from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchangeRequest
 from plaid.model.transactions_get_request import TransactionsGetRequest
+from plaid.model.transactions_get_request_options import TransactionsGetRequestOptions
 from plaid.model.accounts_get_request import AccountsGetRequest
 import werkzeug
-from flask import Flask, render_template, jsonify, request, send_from_directory, session
+from flask import Flask, render_template, jsonify, request, send_from_directory, session, g, Response, make_response
 from functools import wraps
 from data_utils import (
     LRUCache, KeyedLRUCache, load_access_token, save_access_token,
     load_saved_transactions, save_transactions, parse_date,
-    load_rules, save_rules, apply_rules_to_transaction,
-    apply_rule_to_past_transactions,
+    load_rules, save_rules,
+    get_rules_with_stats, flush_rule_stats, forget_rule_stats, load_categories, save_categories,
+    CATEGORIES_FILE, PlaidRecord, get_cache_statistics, get_data_versions,
     _access_token_cache, _saved_transactions_cache, 
     _account_names_cache, _transaction_cache, _category_counts_cache,
-    _rules_cache
+    _rules_cache, _plaid_transactions_cache
 )
+from merchant_utils import normalize_merchant
+from money_utils import to_cents, cents_to_amount, format_cents
+from ledger_utils import (
+    ingest_plaid_transactions, refresh_ledger_transactions, sync_ledger_rules, get_ledger_entry, preview_rule,
+    analyze_rules, apply_rule_to_past_transactions, apply_all_rules_to_past_transactions, rename_applied_category,
+    ledger_has_transactions, effective_transaction, flush_ledger
+)
+from aggregate_utils import (
+    annual_category_totals, monthly_category_totals, window_category_totals, rolling_window,
+    cashflow_buckets, cashflow_series, category_transaction_counts
+)
+from metrics_utils import InstrumentedPlaidClient, REQUEST_LATENCY, render_metrics
 from error_utils import api_error_handler, AppError, AuthenticationError, ValidationError, ResourceNotFoundError, PlaidApiError
 from validation_utils import InputValidator, ValidationError
 from secrets import token_hex
@@ -35,6 +49,9 @@ import re
 import asyncio
 import hashlib
 
+# Count and time every Plaid API call
+client = InstrumentedPlaidClient(client)
+
 # Initialize Flask app
 app = Flask(__name__, static_url_path='/static', static_folder='static')
 
@@ -91,12 +108,90 @@ def csrf_protect(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Plaid data has no local version, so ETags of Plaid-backed routes also roll over on this interval
+PLAID_ETAG_INTERVAL_SECONDS = 300
+
+def etag_conditional(*domains, plaid_backed=False):
+    """
+    Answer GET requests with a strong ETag built from the data versions the
+    response depends on plus the query string, and return 304 Not Modified
+    before doing any work when the client's If-None-Match is still current.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag_parts = [request.path, sorted(request.args.items(multi=True)), get_data_versions(*domains)]
+            if plaid_backed:
+                etag_parts.append(int(time.time() // PLAID_ETAG_INTERVAL_SECONDS))
+            etag = generate_cache_key("etag", *etag_parts)
+            
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+                return response
+            
+            response = make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                # Let the browser keep the body but revalidate it on every use
+                response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
 def generate_cache_key(*args):
     """Generate a hash-based cache key from arguments"""
     key_parts = [str(arg) for arg in args]
     key_string = "|".join(key_parts)  # Use delimiter to prevent collision
     return hashlib.md5(key_string.encode()).hexdigest()[:16]
 
+# Transactions per /transactions/get page (Plaid's maximum)
+PLAID_PAGE_SIZE = 500
+
+def fetch_plaid_transactions(access_token, start_date, end_date):
+    """Fetch Plaid transactions for a date range, served from the response cache when possible"""
+    cache_key = generate_cache_key("plaid_txn", access_token, start_date, end_date)
+    plaid_txs = _plaid_transactions_cache.get(cache_key)
+    if plaid_txs is not None:
+        # The cache outlives restarts and ledger rebuilds, so make sure the ledger has the response
+        if not ledger_has_transactions(getattr(tx, 'transaction_id', None) for tx in plaid_txs):
+            ingest_plaid_transactions(plaid_txs, start_date, end_date)
+        return plaid_txs
+    
+    # Page through the range so the response is complete
+    plaid_txs = []
+    offset = 0
+    while True:
+        transactions_request = TransactionsGetRequest(
+            access_token=access_token,
+            start_date=start_date,
+            end_date=end_date,
+            options=TransactionsGetRequestOptions(count=PLAID_PAGE_SIZE, offset=offset)
+        )
+        response = client.transactions_get(transactions_request)
+        page = response.get('transactions', [])
+        offset += len(page)
+        # Store plain copies so responses can be persisted and still support attribute access
+        plaid_txs.extend(PlaidRecord(tx.to_dict()) for tx in page if tx is not None)
+        if not page or offset >= response.get('total_transactions', 0):
+            break
+    _plaid_transactions_cache.set(cache_key, plaid_txs)
+    
+    # Categorize by rules at ingest time so reads only look the result up; the
+    # response covers the whole range, so ledger entries it lacks are dropped
+    ingest_plaid_transactions(plaid_txs, start_date, end_date)
+    return plaid_txs
+
+def ensure_full_history_ingested():
+    """Fetch the full Plaid history (from the response cache when possible) so the ledger holds every transaction"""
+    access_token = load_access_token()
+    if not access_token:
+        return
+    try:
+        fetch_plaid_transactions(access_token, datetime.datetime(2015, 1, 1).date(), datetime.datetime.now().date())
+    except Exception as e:
+        logger.error(f"Error fetching Plaid history: {str(e)}")
+
 @app.route('/get_csrf_token', methods=['GET'])
 def get_csrf_token():
     """Endpoint to get CSRF token for AJAX requests"""
@@ -152,6 +247,41 @@ def verify_app_setup():
 # Verify setup
 verify_app_setup()
 
+# Record per-route request latency for the metrics endpoint
+@app.before_request
+def start_request_timer():
+    g.request_start_time = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start_time = g.get('request_start_time')
+    if start_time is not None:
+        # Use the route template rather than the raw path to keep label cardinality bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start_time,
+            route=route, method=request.method, status=response.status_code
+        )
+    return response
+
+@app.teardown_request
+def flush_pending_writes(exc):
+    # Write requests flush rule statistics and the ledger; reads leave them to the background flushers
+    if request.method != 'GET':
+        try:
+            flush_rule_stats()
+        except Exception as e:
+            logger.error(f"Error flushing rule statistics: {str(e)}")
+        try:
+            flush_ledger()
+        except Exception as e:
+            logger.error(f"Error flushing the transaction ledger: {str(e)}")
+
+@app.route('/metrics')
+def metrics():
+    """Expose cache, request, Plaid and persistence metrics in Prometheus text format"""
+    return Response(render_metrics(get_cache_statistics()), mimetype='text/plain; version=0.0.4')
+
 # Handle favicon requests
 @app.route('/favicon.ico')
 def favicon():
@@ -433,6 +563,7 @@ def create_update_link_token():
         }), 500
 
 @app.route('/get_transactions', methods=['GET'])
+@etag_conditional('transactions', 'rules', 'tokens', 'ledger', plaid_backed=True)
 @api_error_handler
 def get_transactions():
     logger.info("=== GET TRANSACTIONS CALLED ===")
@@ -444,6 +575,9 @@ def get_transactions():
     account_filter = request.args.get('account_id')
     if account_filter and not InputValidator.is_valid_id(account_filter):
         return jsonify({'error': 'Invalid account ID'}), 400
+    # Merchant search compares normalized names, so "blue bottle" finds "SQ *BLUE BOTTLE #123"
+    search_term = request.args.get('search', '').strip()[:100]
+    search_filter = normalize_merchant(search_term) if search_term else None
     
     # Parse dates with validation
     try:
@@ -452,14 +586,24 @@ def get_transactions():
     except ValueError as e:
         return jsonify({'error': f'Invalid date format: {str(e)}', 'transactions': []}), 400
     
+    # Pagination parameters are deliberately not part of the cache key: the cache
+    # holds the full filtered, sorted, rules-applied list and every page is sliced from it
+    page = max(request.args.get('page', default=1, type=int) or 1, 1)
+    # No upper bound: the dashboard asks for everything in one page and paginates itself
+    page_size = max(request.args.get('page_size', default=50, type=int) or 50, 1)
+    
     # Create cache key
-    cache_key = generate_cache_key("txn", start_date, end_date, category_filter, account_filter)
+    # Embedding data versions makes any write invalidate the entry without clearing the cache
+    cache_key = generate_cache_key(
+        "txn", get_data_versions('transactions', 'rules', 'tokens', 'ledger'),
+        start_date, end_date, category_filter, account_filter, search_filter
+    )
     
     # Check cache first
-    cached_result = _transaction_cache.get(cache_key)
-    if cached_result:
+    transaction_list = _transaction_cache.get(cache_key)
+    if transaction_list is not None:
         logger.info(f"Using cached transactions for {cache_key}")
-        return jsonify(cached_result)
+        return jsonify(paginate_transactions(transaction_list, page, page_size))
     
     # Verify access token
     access_token = load_access_token()
@@ -478,14 +622,10 @@ def get_transactions():
     
     # Process Plaid transactions efficiently
     try:
-        transactions_request = TransactionsGetRequest(
-            access_token=access_token,
-            start_date=start_date,
-            end_date=end_date
-        )
+        plaid_txs = fetch_plaid_transactions(access_token, start_date, end_date)
         
-        response = client.transactions_get(transactions_request)
-        plaid_txs = response.get('transactions', [])
+        # Rule categories come from the ledger; bring it up to date with the rules
+        sync_ledger_rules()
         
         # Single pass through Plaid transactions
         for tx in plaid_txs:
@@ -501,12 +641,13 @@ def get_transactions():
             # Handle the category safely
             category = getattr(tx, 'category', None)
             category = category if category is not None else ['Uncategorized']
+            amount_cents = to_cents(getattr(tx, 'amount', 0))
             tx_obj = {
                 'id': tx_id,
                 'date': getattr(tx, 'date', datetime.datetime.now()).strftime("%m/%d/%Y"),
                 'raw_date': getattr(tx, 'date', datetime.datetime.now()).strftime("%Y-%m-%d"),
-                'amount': abs(float(getattr(tx, 'amount', 0))),
-                'is_debit': float(getattr(tx, 'amount', 0)) > 0,
+                'amount': cents_to_amount(abs(amount_cents)),
+                'is_debit': amount_cents > 0,
                 'merchant': getattr(tx, 'name', 'Unknown'),
                 'category': category[0],  # Now safe to subscript
                 'subcategory': '',
@@ -517,9 +658,11 @@ def get_transactions():
             # Apply modifications if they exist
             if tx_id in modifications:
                 mods = modifications[tx_id]
-                for key in ['category', 'subcategory', 'merchant', 'amount', 'is_debit']:
+                for key in ['category', 'subcategory', 'merchant', 'is_debit']:
                     if key in mods:
                         tx_obj[key] = mods[key]
+                if 'amount_cents' in mods:
+                    tx_obj['amount'] = cents_to_amount(mods['amount_cents'])
                 if 'date' in mods:
                     try:
                         date_obj = parse_date(mods['date'])
@@ -528,6 +671,17 @@ def get_transactions():
                     except ValueError:
                         pass
             
+            # Use the category from a rule run, or else the rule-derived one,
+            # unless the category was saved by hand
+            if 'category' not in modifications.get(tx_id, {}):
+                entry = get_ledger_entry(tx_id)
+                if entry is not None and entry.get('applied'):
+                    tx_obj['category'] = entry['applied'][1]
+                    tx_obj['subcategory'] = entry['applied'][2]
+                elif entry is not None and entry.get('rule_id'):
+                    tx_obj['category'] = entry['rule_category']
+                    tx_obj['subcategory'] = entry['rule_subcategory']
+            
             transaction_list.append(tx_obj)
             
     except plaid.ApiException as e:
@@ -550,7 +704,7 @@ def get_transactions():
                     'id': tx_id,
                     'date': date_obj.strftime("%m/%d/%Y"),
                     'raw_date': date_obj.strftime("%Y-%m-%d"),
-                    'amount': abs(float(tx_data.get('amount', 0))),
+                    'amount': cents_to_amount(tx_data.get('amount_cents', 0)),
                     'is_debit': tx_data.get('is_debit', True),
                     'merchant': tx_data.get('merchant', 'Unknown'),
                     'category': tx_data.get('category', 'Uncategorized'),
@@ -566,25 +720,24 @@ def get_transactions():
         transaction_list = [tx for tx in transaction_list if tx['category'] == category_filter]
     if account_filter:
         transaction_list = [tx for tx in transaction_list if tx['account_id'] == account_filter]
+    if search_filter:
+        transaction_list = [tx for tx in transaction_list if search_filter in normalize_merchant(tx['merchant'])]
     
     # Sort by date
     transaction_list.sort(key=lambda x: x['raw_date'], reverse=True)
     
-    # Apply rules if needed
-    rules = load_rules()
-    if rules:
-        for tx in transaction_list:
-            if tx['id'] not in saved_transactions or 'category' not in saved_transactions[tx['id']]:
-                apply_rules_to_transaction(tx, rules, tx.get('category'), tx.get('subcategory'))
-    
-    # Pagination
-    page = request.args.get('page', default=1, type=int)
-    page_size = request.args.get('page_size', default=50, type=int)
+    # Cache the full result so any page can be served from it
+    _transaction_cache.set(cache_key, transaction_list)
+    
+    return jsonify(paginate_transactions(transaction_list, page, page_size))
+
+def paginate_transactions(transaction_list, page, page_size):
+    """Build a paginated response by slicing one page out of the full transaction list"""
     total_count = len(transaction_list)
     start_idx = (page - 1) * page_size
     end_idx = min(start_idx + page_size, total_count)
     
-    result = {
+    return {
         'transactions': transaction_list[start_idx:end_idx],
         'pagination': {
             'total_count': total_count,
@@ -594,11 +747,6 @@ def get_transactions():
         }
     }
     
-    # Cache the result
-    _transaction_cache.set(cache_key, result)
-    
-    return jsonify(result)
-    
 # New route to update a transaction
 @app.route('/update_transaction', methods=['POST'])
 @csrf_protect
@@ -649,13 +797,8 @@ def update_transaction():
     
     if 'amount' in tx_data:
         try:
-            # Parse and store the amount
-            amount_str = tx_data.get('amount')
-            if isinstance(amount_str, str):
-                # Remove $ and commas if present
-                amount_str = amount_str.replace('$', '').replace(',', '')
-            amount = float(amount_str)
-            saved_transactions[tx_id]['amount'] = amount
+            # Parse and store the amount as integer cents ($ and commas are accepted)
+            saved_transactions[tx_id]['amount_cents'] = abs(to_cents(tx_data.get('amount')))
             saved_transactions[tx_id]['is_debit'] = tx_data.get('is_debit', True)
         except ValueError as e:
             logger.error(f"Amount parsing error: {e}")
@@ -673,8 +816,9 @@ def update_transaction():
     
     # Save the updated transactions
     save_transactions(saved_transactions)
-    _transaction_cache.clear() 
-    _category_counts_cache.clear() 
+    
+    # Edited merchant, amount or category can change which rule applies
+    refresh_ledger_transactions([tx_id])
     logger.info(f"Transaction {tx_id} updated successfully")
     return jsonify({'message': 'Transaction updated successfully'})
 
@@ -706,17 +850,13 @@ def add_transaction():
     except ValueError:
         raise ValidationError('Invalid date format. Use MM/DD/YYYY')
     
-    # Validate amount
+    # Validate amount ($ and commas are accepted)
     try:
-        amount_str = tx_data.get('amount')
-        if isinstance(amount_str, str):
-            # Remove $ and commas if present
-            amount_str = amount_str.replace('$', '').replace(',', '')
-        amount = float(amount_str)
-        if amount <= 0:
-            raise ValidationError('Amount must be greater than zero')
+        amount_cents = to_cents(tx_data.get('amount'))
     except ValueError:
         raise ValidationError('Invalid amount format')
+    if amount_cents <= 0:
+        raise ValidationError('Amount must be greater than zero')
     
     # Validate category (non-empty string)
     category = tx_data.get('category')
@@ -738,7 +878,7 @@ def add_transaction():
     saved_transactions = load_saved_transactions()
     saved_transactions[tx_id] = {
         'date': formatted_date,
-        'amount': abs(amount),
+        'amount_cents': amount_cents,
         'is_debit': is_debit,
         'category': category,
         'subcategory': tx_data.get('subcategory', ''), 
@@ -749,15 +889,13 @@ def add_transaction():
     
     # Save the updated transactions
     save_transactions(saved_transactions)
-    _transaction_cache.clear() 
-    _category_counts_cache.clear()  # Clear category counts cache
     logger.info(f"Manual transaction {tx_id} created successfully")
     return jsonify({
         'message': 'Transaction created successfully',
         'transaction': {
             'id': tx_id,
             'date': tx_data.get('date'),
-            'amount': abs(amount),
+            'amount': cents_to_amount(amount_cents),
             'is_debit': is_debit,
             'category': category,
             'subcategory': tx_data.get('subcategory', ''),
@@ -796,10 +934,8 @@ def delete_transaction():
         saved_transactions[tx_id]['deleted'] = True
         logger.info(f"Plaid transaction {tx_id} marked as deleted")
     
-    # Save the updated transactions and clear the cache
+    # Save the updated transactions (bumps the transactions data version)
     save_transactions(saved_transactions)
-    _transaction_cache.clear()  # Add this line to invalidate the cache
-    _category_counts_cache.clear()  # Clear category counts cache
     return jsonify({'message': 'Transaction deleted successfully'})
 
 # Additional routes for enhanced functionality
@@ -824,16 +960,15 @@ def monthly_totals_page():
 
 # Route to get all categories
 @app.route('/get_categories', methods=['GET'])
+@etag_conditional('categories')
 @api_error_handler
 def get_categories():
     # Load custom categories from categories.json
-    categories_file = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
     categories = []
     
-    if os.path.exists(categories_file):
+    if os.path.exists(CATEGORIES_FILE):
         try:
-            with open(categories_file, 'r') as f:
-                categories = json.load(f)
+            categories = load_categories()
                 
             # Check if migration is needed (old format)
             if categories and isinstance(categories, list) and all(isinstance(c, str) for c in categories):
@@ -847,8 +982,7 @@ def get_categories():
                 categories = new_categories
                 
                 # Save migrated format
-                with open(categories_file, 'w') as f:
-                    json.dump(categories, f)
+                save_categories(categories)
         except Exception as e:
             logger.error(f"Error reading categories file: {str(e)}")
     
@@ -871,8 +1005,7 @@ def get_categories():
         categories = default_categories
         
         # Save default categories
-        with open(categories_file, 'w') as f:
-            json.dump(categories, f)
+        save_categories(categories)
     
     # Extract just category names for backward compatibility
     category_names = [category["name"] for category in categories]
@@ -884,11 +1017,13 @@ def get_categories():
 
 # Route to get annual category totals
 @app.route('/get_annual_totals', methods=['GET'])
+@etag_conditional('transactions', 'rules', 'tokens', 'ledger', plaid_backed=True)
 @api_error_handler
 def get_annual_totals():
     # Add validation for year parameters
     start_year_filter = request.args.get('start_year')
     end_year_filter = request.args.get('end_year')
+    start_year = end_year = None
     
     if start_year_filter:
         try:
@@ -906,308 +1041,40 @@ def get_annual_totals():
         except ValueError:
             return jsonify({'error': 'Invalid end year'}), 400
     
-    # Load all transactions
-    transactions = []
-    access_token = load_access_token()
-    saved_transactions = load_saved_transactions()
-    
-    # Create a set of deleted transaction IDs for faster lookups
-    deleted_tx_ids = {tx_id for tx_id, tx_data in saved_transactions.items() 
-                     if tx_data.get('deleted', False)}
+    # Make sure the ledger holds the full history; totals come from the aggregate cube
+    ensure_full_history_ingested()
     
-    # Modified transaction details by ID
-    modified_tx_details = {}
-    for tx_id, tx_data in saved_transactions.items():
-        if 'deleted' not in tx_data:
-            # Store only required fields
-            tx_details = {}
-            if 'category' in tx_data:
-                tx_details['category'] = tx_data['category']
-            if 'date' in tx_data:
-                tx_details['date'] = tx_data['date']
-            if 'amount' in tx_data:
-                tx_details['amount'] = tx_data['amount']
-            if 'is_debit' in tx_data:
-                tx_details['is_debit'] = tx_data['is_debit']
-            
-            if tx_details:  # Only store if it has modifications
-                modified_tx_details[tx_id] = tx_details
-    
-    # Get Plaid transactions if token exists
-    if access_token:
-        try:
-            # Use a wide date range
-            start_date = datetime.datetime(2015, 1, 1).date()
-            end_date = datetime.datetime.now().date()
-            
-            transactions_request = TransactionsGetRequest(
-                access_token=access_token,
-                start_date=start_date,
-                end_date=end_date
-            )
-            response = client.transactions_get(transactions_request)
-            plaid_txs = response['transactions']
-            
-            # First pass: collect years and categories for pre-allocating data structures
-            all_years = set()
-            all_categories = set()
-            
-            # Current date for LTM calculations
-            current_date = datetime.datetime.now().date()
-            current_year = current_date.year
-            
-            # Process transactions more efficiently
-            for tx in plaid_txs:
-                tx_id = getattr(tx, 'transaction_id', None)
-                
-                # Skip if manually deleted
-                if tx_id in deleted_tx_ids:
-                    continue
-                
-                # Get transaction date (use modified date if available)
-                tx_date = None
-                if tx_id in modified_tx_details and 'date' in modified_tx_details[tx_id]:
-                    # Use modified date
-                    try:
-                        tx_date = parse_date(modified_tx_details[tx_id]['date'])
-                    except ValueError:
-                        logger.warning(f"Invalid modified date for {tx_id}: {modified_tx_details[tx_id]['date']}")
-                        tx_date = getattr(tx, 'date', None)
-                else:
-                    # Use original date
-                    tx_date = getattr(tx, 'date', None)
-                
-                # Parse and validate date
-                if not isinstance(tx_date, datetime.date):
-                    try:
-                        tx_date = parse_date(tx_date)
-                    except (ValueError, TypeError):
-                        logger.warning(f"Invalid date for transaction {tx_id}: {tx_date}")
-                        continue
-                
-                # Extract year for filtering
-                year = tx_date.year
-                
-                # Apply year range filter if specified
-                if start_year and year < start_year:
-                    continue
-                if end_year and year > end_year:
-                    continue
-                
-                # Add year to our set
-                all_years.add(year)
-                
-                # Get category (use modified if available)
-                if tx_id in modified_tx_details and 'category' in modified_tx_details[tx_id]:
-                    category = modified_tx_details[tx_id]['category']
-                else:
-                    tx_category = getattr(tx, 'category', None)
-                    category = tx_category[0] if tx_category else 'Uncategorized'
-                
-                # Add category to our set
-                all_categories.add(category)
-            
-            # Add LTM if the end year includes the current year
-            include_ltm = (not end_year or end_year >= current_year)
-            if include_ltm:
-                all_years.add('LTM')  # Special "year" for Last Twelve Months
-
-            # Normalize all years to integers except for 'LTM'
-            normalized_years = {'LTM'} if 'LTM' in all_years else set()
-            for year in all_years:
-                if year != 'LTM':
-                    if isinstance(year, str) and year.isdigit():
-                        normalized_years.add(int(year))
-                    elif isinstance(year, int):
-                        normalized_years.add(year)
-
-            # Pre-allocate the totals dictionary for all year-category combinations
-            annual_totals = {year: {category: 0 for category in all_categories} for year in normalized_years}
-            
-            # Second pass: calculate the totals with the optimized structure
-            ltm_start_date = datetime.datetime(current_date.year - 1, current_date.month, 1).date()
-            
-            for tx in plaid_txs:
-                tx_id = getattr(tx, 'transaction_id', None)
-                
-                # Skip if manually deleted
-                if tx_id in deleted_tx_ids:
-                    continue
-                
-                # Get transaction date (use modified date if available)
-                tx_date = None
-                if tx_id in modified_tx_details and 'date' in modified_tx_details[tx_id]:
-                    # Use modified date
-                    try:
-                        tx_date = parse_date(modified_tx_details[tx_id]['date'])
-                    except ValueError:
-                        # Skip transaction with invalid date
-                        continue
-                else:
-                    # Use original date
-                    tx_date = getattr(tx, 'date', None)
-                    if not isinstance(tx_date, datetime.date):
-                        try:
-                            tx_date = parse_date(tx_date)
-                        except (ValueError, TypeError):
-                            # Skip transaction with invalid date
-                            continue
-                
-                # Extract year for filtering and calculations
-                year = tx_date.year
-                
-                # Apply year range filter if specified
-                if start_year and year < start_year:
-                    continue
-                if end_year and year > end_year:
-                    continue
-                
-                # Get category (use modified if available)
-                if tx_id in modified_tx_details and 'category' in modified_tx_details[tx_id]:
-                    category = modified_tx_details[tx_id]['category']
-                else:
-                    tx_category = getattr(tx, 'category', None)
-                    category = tx_category[0] if tx_category else 'Uncategorized'
-                
-                # Get amount and is_debit (use modified if available)
-                if tx_id in modified_tx_details:
-                    if 'amount' in modified_tx_details[tx_id]:
-                        amount = float(modified_tx_details[tx_id]['amount'])
-                    else:
-                        amount = float(getattr(tx, 'amount', 0))
-                    
-                    if 'is_debit' in modified_tx_details[tx_id]:
-                        is_debit = modified_tx_details[tx_id]['is_debit']
-                    else:
-                        is_debit = float(getattr(tx, 'amount', 0)) > 0
-                else:
-                    amount = float(getattr(tx, 'amount', 0))
-                    is_debit = amount > 0
-                
-                # Convert to signed amount (negative for expenses)
-                signed_amount = -amount if is_debit else amount
-                
-                # Add to year totals
-                annual_totals[year][category] += signed_amount
-                
-                # Add to LTM if applicable and LTM is included
-                if include_ltm and tx_date >= ltm_start_date and tx_date < current_date:
-                    annual_totals['LTM'][category] += signed_amount
-            
-        except Exception as e:
-            logger.error(f"Error processing Plaid transactions: {str(e)}")
-            logger.error(traceback.format_exc())
+    # LTM runs from the first of this month last year through today
+    current_date = datetime.datetime.now().date()
+    include_ltm = (not end_year or end_year >= current_date.year)
+    annual_totals = annual_category_totals(start_year, end_year)
+    if include_ltm:
+        annual_totals['LTM'] = window_category_totals(*rolling_window('LTM', current_date))
+    
+    numeric_years = sorted(year for year in annual_totals if year != 'LTM')
+    years = [str(year) for year in numeric_years]
+    if include_ltm and annual_totals.get('LTM'):
+        years.append('LTM')
     
-    # Add manual transactions
-    for tx_id, tx_data in saved_transactions.items():
-        if tx_data.get('manual', False) and not tx_data.get('deleted', False):
-            try:
-                # Parse date
-                date_str = tx_data.get('date')
-                if not date_str:
-                    continue
-                
-                try:
-                    tx_date = parse_date(date_str)
-                except ValueError:
-                    logger.warning(f"Invalid date for manual transaction {tx_id}: {date_str}")
-                    continue
-                
-                # Extract year
-                year = tx_date.year
-                
-                # Apply year range filter if specified
-                if start_year and year < start_year:
-                    continue
-                if end_year and year > end_year:
-                    continue
-                
-                # Get category
-                category = tx_data.get('category', 'Uncategorized')
-                
-                # Get amount (negative for debits/expenses)
-                amount = float(tx_data.get('amount', 0))
-                is_debit = tx_data.get('is_debit', True)
-                signed_amount = -amount if is_debit else amount
-                
-                # Ensure the category exists in the annual totals
-                if category not in annual_totals.get(year, {}):
-                    if year not in annual_totals:
-                        annual_totals[year] = {}
-                    annual_totals[year][category] = 0
-                
-                # Add to year totals
-                annual_totals[year][category] += signed_amount
-                
-                # Add to LTM if applicable and LTM is included
-                if include_ltm:
-                    current_date = datetime.datetime.now().date()
-                    ltm_start_date = datetime.datetime(current_date.year - 1, current_date.month, 1).date()
-                    
-                    if tx_date >= ltm_start_date and tx_date < current_date:
-                        if 'LTM' not in annual_totals:
-                            annual_totals['LTM'] = {}
-                        if category not in annual_totals['LTM']:
-                            annual_totals['LTM'][category] = 0
-                        annual_totals['LTM'][category] += signed_amount
-                
-            except Exception as e:
-                logger.error(f"Error processing manual transaction {tx_id}: {str(e)}")
+    all_categories = set()
+    for year in numeric_years:
+        all_categories.update(annual_totals[year])
+    if 'LTM' in years:
+        all_categories.update(annual_totals['LTM'])
     
-    # FIX: Handle empty result
-    if not annual_totals:
+    if not all_categories:
         logger.warning("No transactions found for annual totals")
         return jsonify({
             'annual_category_totals': [],
             'years': []
         })
     
-    # Filter years based on year range and sort them
-    numeric_years = []
-    for year in annual_totals.keys():
-        if year == 'LTM':
-            continue
-        if isinstance(year, (int, str)) and str(year).isdigit():
-            year_int = int(year)
-            if (not start_year or year_int >= start_year) and (not end_year or year_int <= end_year):
-                numeric_years.append(year_int)
-
-    # Sort the filtered years
-    numeric_years.sort()
-    years = [str(y) for y in numeric_years]
-
-    # Add LTM at the end if included
-    if include_ltm and 'LTM' in annual_totals:
-        years.append('LTM')
-    
-    # Get unique categories across all years
-    all_categories = set()
-    for year_data in annual_totals.values():
-        all_categories.update(year_data.keys())
-    
-    all_categories = sorted(all_categories)
-    
     annual_table = []
-    for category in all_categories:
+    for category in sorted(all_categories):
         row = {'category': category}
-        
         for year in years:
-            year_str = str(year)
-            # Try to get amount with both string and integer versions of the year
-            amount = 0
-            if year_str == 'LTM':
-                amount = annual_totals.get('LTM', {}).get(category, 0)
-            else:
-                # First try with year as integer
-                year_int = int(year_str) if year_str.isdigit() else 0
-                amount = annual_totals.get(year_int, {}).get(category, 0)
-                
-                # If amount is 0, try with year as string
-                if amount == 0:
-                    amount = annual_totals.get(year_str, {}).get(category, 0)
-            
-            row[year_str] = f"${abs(amount):.2f}"
-            
+            # Signed dollars (debits negative); the page formats them
+            row[year] = annual_totals.get('LTM' if year == 'LTM' else int(year), {}).get(category, 0) / 100
         annual_table.append(row)
     
     return jsonify({
@@ -1215,6 +1082,168 @@ def get_annual_totals():
         'years': years
     })
     
+# Route to get category totals over a trailing or custom date window
+@app.route('/get_rolling_totals', methods=['GET'])
+@etag_conditional('transactions', 'rules', 'tokens', 'ledger', plaid_backed=True)
+@api_error_handler
+def get_rolling_totals():
+    """
+    Return signed category totals for LTM, T3M, T6M, YTD or a custom
+    start_date/end_date window (window=custom)
+    """
+    window = request.args.get('window', 'LTM').upper()
+    try:
+        if window == 'CUSTOM':
+            start_date = parse_date(request.args.get('start_date', ''))
+            end_date = parse_date(request.args.get('end_date', ''))
+        else:
+            start_date, end_date = rolling_window(window, datetime.datetime.now().date())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start_date > end_date:
+        return jsonify({'error': 'Start date must not be after end date'}), 400
+    
+    ensure_full_history_ingested()
+    totals = window_category_totals(start_date, end_date)
+    
+    return jsonify({
+        'window': window,
+        'start_date': start_date.strftime("%Y-%m-%d"),
+        'end_date': end_date.strftime("%Y-%m-%d"),
+        'totals': [{'category': category, 'total': totals[category] / 100} for category in sorted(totals)]
+    })
+
+# Longest month range /get_monthly_totals will return in one response
+MAX_MONTHLY_TOTALS_MONTHS = 240
+
+def parse_month(value):
+    """Parse a YYYY-MM or MM/YYYY month into a (year, month) tuple"""
+    value = (value or '').strip()
+    for fmt in ("%Y-%m", "%m/%Y"):
+        try:
+            parsed = datetime.datetime.strptime(value, fmt)
+            return parsed.year, parsed.month
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid month: {value}")
+
+# Route to get category totals per month
+@app.route('/get_monthly_totals', methods=['GET'])
+@etag_conditional('transactions', 'rules', 'tokens', 'ledger', plaid_backed=True)
+@api_error_handler
+def get_monthly_totals():
+    """Return a month x category (optionally x subcategory) matrix of signed totals"""
+    today = datetime.datetime.now().date()
+    try:
+        end_month = parse_month(request.args.get('end_month')) if request.args.get('end_month') else (today.year, today.month)
+        if request.args.get('start_month'):
+            start_month = parse_month(request.args.get('start_month'))
+        else:
+            start_month = (end_month[0] - 1, end_month[1] + 1) if end_month[1] < 12 else (end_month[0], 1)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start_month > end_month:
+        return jsonify({'error': 'Start month must not be after end month'}), 400
+    
+    month_count = (end_month[0] - start_month[0]) * 12 + end_month[1] - start_month[1] + 1
+    if month_count > MAX_MONTHLY_TOTALS_MONTHS:
+        return jsonify({'error': f'Range is limited to {MAX_MONTHLY_TOTALS_MONTHS} months'}), 400
+    by_subcategory = request.args.get('by_subcategory', '').lower() in ('1', 'true', 'yes')
+    
+    month_keys = []
+    year, month = start_month
+    for _ in range(month_count):
+        month_keys.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    
+    ensure_full_history_ingested()
+    totals = monthly_category_totals(month_keys, by_subcategory)
+    
+    rows = []
+    for row_key in sorted(totals):
+        month_totals = totals[row_key]
+        row = {'category': row_key[0] if by_subcategory else row_key}
+        if by_subcategory:
+            row['subcategory'] = row_key[1]
+        row['totals'] = [month_totals.get(month_key, 0) / 100 for month_key in month_keys]
+        row['total'] = sum(month_totals.values()) / 100
+        rows.append(row)
+    
+    return jsonify({
+        'months': [f"{year:04d}-{month:02d}" for year, month in month_keys],
+        'rows': rows
+    })
+
+# Points per series /api/cashflow returns when max_points is not given, and its upper limit
+DEFAULT_CASHFLOW_POINTS = 120
+MAX_CASHFLOW_POINTS = 1000
+
+# Route to get income, expense and net series over time
+@app.route('/api/cashflow', methods=['GET'])
+@etag_conditional('transactions', 'rules', 'tokens', 'ledger', plaid_backed=True)
+@api_error_handler
+def get_cashflow():
+    """
+    Return day, week or month income, expense and net series per category
+    or account, merged into at most max_points points
+    """
+    today = datetime.datetime.now().date()
+    interval = request.args.get('interval', 'month').lower()
+    group_by = request.args.get('group_by', 'category').lower()
+    if group_by not in ('category', 'account'):
+        return jsonify({'error': 'group_by must be category or account'}), 400
+    try:
+        end_date = parse_date(request.args['end_date']) if request.args.get('end_date') else today
+        if request.args.get('start_date'):
+            start_date = parse_date(request.args['start_date'])
+        else:
+            start_date = rolling_window('LTM', end_date)[0]
+        max_points = int(request.args.get('max_points', DEFAULT_CASHFLOW_POINTS))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if start_date > end_date:
+        return jsonify({'error': 'Start date must not be after end date'}), 400
+    if not 1 <= max_points <= MAX_CASHFLOW_POINTS:
+        return jsonify({'error': f'max_points must be between 1 and {MAX_CASHFLOW_POINTS}'}), 400
+    try:
+        bucket_starts, bucket_size = cashflow_buckets(start_date, end_date, interval, max_points)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    ensure_full_history_ingested()
+    flows = cashflow_series(bucket_starts, end_date, group_by)
+    
+    # Income and expense are positive dollars; net is income minus expense
+    def series_fields(income, expense):
+        return {
+            'income': [cents / 100 for cents in income],
+            'expense': [cents / 100 for cents in expense],
+            'net': [(inc - exp) / 100 for inc, exp in zip(income, expense)]
+        }
+    
+    group_key = 'account_id' if group_by == 'account' else 'category'
+    series = []
+    total_income = [0] * len(bucket_starts)
+    total_expense = [0] * len(bucket_starts)
+    for group in sorted(flows):
+        income, expense = flows[group]
+        for i in range(len(bucket_starts)):
+            total_income[i] += income[i]
+            total_expense[i] += expense[i]
+        series.append({group_key: group, **series_fields(income, expense)})
+    
+    return jsonify({
+        'interval': interval,
+        'group_by': group_by,
+        'start_date': start_date.strftime("%Y-%m-%d"),
+        'end_date': end_date.strftime("%Y-%m-%d"),
+        # Each point covers bucket_size intervals when the range was downsampled
+        'bucket_size': bucket_size,
+        'periods': [start.strftime("%Y-%m-%d") for start in bucket_starts],
+        'series': series,
+        'total': series_fields(total_income, total_expense)
+    })
+
 # Route to export transactions as CSV with improved error handling and debugging
 @app.route('/export_transactions', methods=['POST'])
 @csrf_protect
@@ -1322,14 +1351,7 @@ def export_transactions():
             
             logger.info(f"Requesting Plaid transactions from {plaid_start} to {plaid_end}")
             
-            transactions_request = TransactionsGetRequest(
-                access_token=access_token,
-                start_date=plaid_start, 
-                end_date=plaid_end
-            )
-            
-            response = client.transactions_get(transactions_request)
-            plaid_txs = response.get('transactions', [])
+            plaid_txs = fetch_plaid_transactions(access_token, plaid_start, plaid_end)
             
             logger.info(f"Received {len(plaid_txs)} transactions from Plaid")
             
@@ -1368,8 +1390,17 @@ def export_transactions():
                         category = tx.get('category')[0]
                         
                     merchant = tx.get('name', 'Unknown')
-                    amount = abs(float(tx.get('amount', 0)))
-                    is_debit = float(tx.get('amount', 0)) > 0
+                    amount_cents = to_cents(tx.get('amount', 0))
+                    is_debit = amount_cents > 0
+                    amount_cents = abs(amount_cents)
+                    
+                    # A rule run's category, or else the rule-derived one, unless saved by hand
+                    if 'category' not in saved_transactions.get(tx_id, {}):
+                        entry = get_ledger_entry(tx_id)
+                        if entry is not None and entry.get('applied'):
+                            category = entry['applied'][1]
+                        elif entry is not None and entry.get('rule_id'):
+                            category = entry['rule_category']
                     
                     if tx_id in saved_transactions:
                         saved_tx = saved_transactions[tx_id]
@@ -1385,8 +1416,8 @@ def export_transactions():
                                     continue
                             except Exception as e:
                                 logger.warning(f"Error parsing saved date for {tx_id}: {str(e)}")
-                        if 'amount' in saved_tx:
-                            amount = abs(float(saved_tx['amount']))
+                        if 'amount_cents' in saved_tx:
+                            amount_cents = saved_tx['amount_cents']
                         if 'is_debit' in saved_tx:
                             is_debit = saved_tx['is_debit']
                     
@@ -1396,7 +1427,7 @@ def export_transactions():
                     
                     transactions.append({
                         'date': tx_date.strftime("%Y-%m-%d"),
-                        'amount': amount,
+                        'amount_cents': amount_cents,
                         'type': 'Expense' if is_debit else 'Income',
                         'category': category,
                         'merchant': merchant,
@@ -1442,7 +1473,7 @@ def export_transactions():
 
                 transactions.append({
                     'date': tx_date.strftime("%Y-%m-%d"),
-                    'amount': abs(float(tx_data.get('amount', 0))),
+                    'amount_cents': tx_data.get('amount_cents', 0),
                     'type': 'Expense' if tx_data.get('is_debit', True) else 'Income',
                     'category': tx_data.get('category', 'Uncategorized'),
                     'merchant': tx_data.get('merchant', 'Unknown'),
@@ -1473,7 +1504,7 @@ def export_transactions():
     
     for tx in transactions:
         # Format amount (positive number regardless of type)
-        amount_str = f"{tx['amount']:.2f}"
+        amount_str = format_cents(tx['amount_cents'])
         
         # Properly escape all fields
         date = escape_csv_field(tx['date'])
@@ -1517,12 +1548,7 @@ def add_category():
         return jsonify({'error': str(e)}), 400
         
     # Load saved category preferences
-    categories_file = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
-    
-    categories = []
-    if os.path.exists(categories_file):
-        with open(categories_file, 'r') as f:
-            categories = json.load(f)
+    categories = load_categories()
     
     # Check if category already exists
     if any(c["name"] == new_category for c in categories):
@@ -1535,8 +1561,7 @@ def add_category():
     })
     
     # Save categories
-    with open(categories_file, 'w') as f:
-        json.dump(categories, f)
+    save_categories(categories)
         
     return jsonify({'message': 'Category added successfully', 'categories': categories})
 
@@ -1551,12 +1576,7 @@ def delete_category():
         return jsonify({'error': 'Category name is required'}), 400
         
     # Load saved category preferences
-    categories_file = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
-    
-    categories = []
-    if os.path.exists(categories_file):
-        with open(categories_file, 'r') as f:
-            categories = json.load(f)
+    categories = load_categories()
     
     # Find the category
     category_index = next((i for i, c in enumerate(categories) if c["name"] == category), None)
@@ -1567,11 +1587,7 @@ def delete_category():
     removed_category = categories.pop(category_index)
     
     # Save categories
-    with open(categories_file, 'w') as f:
-        json.dump(categories, f)
-    
-    # Also clear the counts cache to reflect this change
-    _category_counts_cache.clear()
+    save_categories(categories)
         
     return jsonify({
         'message': 'Category deleted successfully', 
@@ -1592,12 +1608,7 @@ def delete_subcategory():
         return jsonify({'error': 'Category and subcategory names are required'}), 400
         
     # Load saved category preferences
-    categories_file = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
-    
-    categories = []
-    if os.path.exists(categories_file):
-        with open(categories_file, 'r') as f:
-            categories = json.load(f)
+    categories = load_categories()
     
     # Find the category
     category_index = next((i for i, c in enumerate(categories) if c["name"] == category), None)
@@ -1612,8 +1623,7 @@ def delete_subcategory():
     categories[category_index]["subcategories"].remove(subcategory)
     
     # Save categories
-    with open(categories_file, 'w') as f:
-        json.dump(categories, f)
+    save_categories(categories)
         
     return jsonify({
         'message': 'Subcategory deleted successfully', 
@@ -1639,12 +1649,7 @@ def add_subcategory():
         return jsonify({'error': 'Category and subcategory names are required'}), 400
         
     # Load saved category preferences
-    categories_file = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
-    
-    categories = []
-    if os.path.exists(categories_file):
-        with open(categories_file, 'r') as f:
-            categories = json.load(f)
+    categories = load_categories()
     
     # Find the category
     category_index = next((i for i, c in enumerate(categories) if c["name"] == category), None)
@@ -1660,8 +1665,7 @@ def add_subcategory():
     categories[category_index]["subcategories"].sort()  # Keep alphabetical order
     
     # Save categories
-    with open(categories_file, 'w') as f:
-        json.dump(categories, f)
+    save_categories(categories)
         
     return jsonify({
         'message': 'Subcategory added successfully', 
@@ -1669,6 +1673,13 @@ def add_subcategory():
         'category': categories[category_index]
     })
 
+# Optional rule conditions: amount range, account and date window (YYYY-MM-DD)
+OPTIONAL_RULE_CONDITIONS = ('amount_min', 'amount_max', 'account_id', 'date_start', 'date_end')
+EDITABLE_RULE_FIELDS = (
+    'description', 'match_description', 'match_type', 'amount', 'match_amount',
+    'original_category', 'original_subcategory', 'category', 'subcategory', 'active'
+) + OPTIONAL_RULE_CONDITIONS
+
 # Rule management endpoints
 @app.route('/add_rule', methods=['POST'])
 @csrf_protect
@@ -1689,10 +1700,11 @@ def add_rule():
     # Load existing rules
     rules = load_rules()
     
-    # Add the new rule
-    rules[rule_id] = {
+    # Build the new rule; the optional conditions are only stored when given
+    rule = {
         'description': rule_data.get('description', ''),
         'match_description': rule_data.get('match_description', True),
+        'match_type': rule_data.get('match_type') or 'contains',
         'amount': rule_data.get('amount'),
         'match_amount': rule_data.get('match_amount', False),
         'original_category': rule_data.get('original_category', ''),
@@ -1700,43 +1712,47 @@ def add_rule():
         'category': rule_data.get('category'),
         'subcategory': rule_data.get('subcategory', ''),
         'active': True,
-        'created_at': datetime.datetime.now().isoformat(),
-        'last_applied': None,
-        'match_count': 0
+        'created_at': datetime.datetime.now().isoformat()
     }
+    for field in OPTIONAL_RULE_CONDITIONS:
+        if rule_data.get(field) not in (None, ''):
+            rule[field] = rule_data[field]
+    
+    try:
+        InputValidator.validate_rule(rule)
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Save rules
+    # Add the new rule
+    rules[rule_id] = rule
+    
+    # Save rules and recategorize the transactions they affect
     save_rules(rules)
+    sync_ledger_rules()
     
     # Apply rule to past transactions if requested
     if rule_data.get('apply_to_past', False):
         try:
-            # Create a modified version of the rule without original category constraints
-            # to make it apply to all matching transactions including edited ones
-            run_rule = rules[rule_id].copy()
-            run_rule['original_category'] = ''
-            run_rule['original_subcategory'] = ''
-            
-            affected_count = apply_rule_to_past_transactions(rule_id, run_rule)
+            # Original category constraints are ignored so the rule applies
+            # to all matching transactions including edited ones
+            affected_count = apply_rule_to_past_transactions(rule_id)
             logger.info(f"Rule {rule_id} applied to {affected_count} past transactions")
-            
-            # Clear transaction cache to ensure fresh data is loaded
-            _transaction_cache.clear()
         except Exception as e:
             logger.error(f"Error applying rule to past transactions: {str(e)}")
     
     return jsonify({
         'message': 'Rule created successfully', 
         'rule_id': rule_id, 
-        'rule': rules[rule_id]
+        'rule': get_rules_with_stats({rule_id: rules[rule_id]})[rule_id]
     })
 
 @app.route('/get_rules', methods=['GET'])
+@etag_conditional('rules', 'rule_stats')
 @api_error_handler
 def get_rules():
     """Get all transaction categorization rules"""
     rules = load_rules()
-    return jsonify({'rules': rules})
+    return jsonify({'rules': get_rules_with_stats(rules)})
 
 @app.route('/update_rule', methods=['POST'])
 @csrf_protect
@@ -1756,49 +1772,36 @@ def update_rule():
     if rule_id not in rules:
         return jsonify({'error': 'Rule not found'}), 404
     
+    # Validate the rule as it would be after the update
+    updated_rule = dict(rules[rule_id])
+    for field in EDITABLE_RULE_FIELDS:
+        if field in rule_data:
+            updated_rule[field] = rule_data[field]
+    try:
+        InputValidator.validate_rule(updated_rule)
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    
     # Update rule fields
-    if 'description' in rule_data:
-        rules[rule_id]['description'] = rule_data['description']
-    if 'match_description' in rule_data:
-        rules[rule_id]['match_description'] = rule_data['match_description']
-    if 'amount' in rule_data:
-        rules[rule_id]['amount'] = rule_data['amount']
-    if 'match_amount' in rule_data:
-        rules[rule_id]['match_amount'] = rule_data['match_amount']
-    if 'original_category' in rule_data:
-        rules[rule_id]['original_category'] = rule_data['original_category']
-    if 'original_subcategory' in rule_data:
-        rules[rule_id]['original_subcategory'] = rule_data['original_subcategory']
-    if 'category' in rule_data:
-        rules[rule_id]['category'] = rule_data['category']
-    if 'subcategory' in rule_data:
-        rules[rule_id]['subcategory'] = rule_data['subcategory']
-    if 'active' in rule_data:
-        rules[rule_id]['active'] = rule_data['active']
-    
-    # Save rules
+    rules[rule_id] = updated_rule
+    
+    # Save rules and recategorize the transactions they affect
     save_rules(rules)
+    sync_ledger_rules()
     
     # Apply rule to past transactions if requested
     if rule_data.get('apply_to_past', False):
         try:
-            # Create a modified version of the rule without original category constraints
-            # to make it apply to all matching transactions including edited ones
-            run_rule = rules[rule_id].copy()
-            run_rule['original_category'] = ''
-            run_rule['original_subcategory'] = ''
-            
-            affected_count = apply_rule_to_past_transactions(rule_id, run_rule)
+            # Original category constraints are ignored so the rule applies
+            # to all matching transactions including edited ones
+            affected_count = apply_rule_to_past_transactions(rule_id)
             logger.info(f"Rule {rule_id} applied to {affected_count} past transactions")
-            
-            # Clear transaction cache to ensure fresh data is loaded
-            _transaction_cache.clear()
         except Exception as e:
             logger.error(f"Error applying rule to past transactions: {str(e)}")
     
     return jsonify({
         'message': 'Rule updated successfully', 
-        'rule': rules[rule_id]
+        'rule': get_rules_with_stats({rule_id: rules[rule_id]})[rule_id]
     })
 
 @app.route('/delete_rule', methods=['POST'])
@@ -1825,8 +1828,10 @@ def delete_rule():
     # Remove rule
     del rules[rule_id]
     
-    # Save rules
+    # Save rules and drop the rule's usage statistics
     save_rules(rules)
+    forget_rule_stats(rule_id)
+    sync_ledger_rules()
     
     return jsonify({
         'message': 'Rule deleted successfully',
@@ -1854,91 +1859,61 @@ def toggle_rule():
     # Toggle active status
     rules[rule_id]['active'] = not rules[rule_id].get('active', True)
     
-    # Save rules
+    # Save rules and recategorize the transactions they affect
     save_rules(rules)
+    sync_ledger_rules()
     
     return jsonify({
         'message': f"Rule {rule_id} {'activated' if rules[rule_id]['active'] else 'deactivated'} successfully",
-        'rule': rules[rule_id]
+        'rule': get_rules_with_stats({rule_id: rules[rule_id]})[rule_id]
     })
 
+@app.route('/preview_rule', methods=['POST'])
+@csrf_protect
+@api_error_handler
+def preview_rule_route():
+    """Dry-run a rule: report what it would match and change without writing anything"""
+    rule_data = request.json or {}
+    
+    # Start from a saved rule when an ID is given, with any posted fields layered on top
+    rule = {}
+    rule_id = rule_data.get('id')
+    if rule_id:
+        rules = load_rules()
+        if rule_id not in rules:
+            return jsonify({'error': 'Rule not found'}), 404
+        rule = dict(rules[rule_id])
+    rule.update({k: v for k, v in rule_data.items() if k not in ('id', 'sample_size', 'ignore_original_category')})
+    
+    try:
+        InputValidator.validate_rule(rule)
+    except ValidationError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        sample_size = min(max(int(rule_data.get('sample_size', 20)), 1), 200)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid sample_size'}), 400
+    # A JSON boolean only: bool("false") would be True
+    ignore_original_category = rule_data.get('ignore_original_category', True)
+    if not isinstance(ignore_original_category, bool):
+        return jsonify({'error': 'ignore_original_category must be true or false'}), 400
+    
+    return jsonify(preview_rule(rule, ignore_original_category, sample_size))
+
+@app.route('/analyze_rules', methods=['GET'])
+@etag_conditional('transactions', 'rules', 'tokens', 'ledger', plaid_backed=True)
+@api_error_handler
+def analyze_rules_route():
+    """Report rules that are shadowed, conflict with each other, or match no transactions"""
+    return jsonify(analyze_rules())
+
 # Add route for the rules management page
 @app.route('/rules')
 @api_error_handler
 def rules_page():
     return render_template('rules.html')
 
-def apply_rule_to_past_transactions(rule_id, rule):
-    """Apply a rule to all past transactions that match"""
-    # Load saved transactions
-    transactions = load_saved_transactions()
-    modified_count = 0
-    
-    # Get rule criteria
-    rule_description = rule.get('description', '').lower().strip()
-    rule_amount = None
-    if rule.get('match_amount', False) and rule.get('amount') is not None:
-        try:
-            rule_amount = abs(float(rule.get('amount')))
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error converting rule amount: {str(e)}")
-            return 0
-    
-    # Apply to matching transactions
-    for tx_id, tx_data in transactions.items():
-        try:
-            # Skip deleted transactions
-            if tx_data.get('deleted', False):
-                continue
-                
-            # Get transaction fields for matching
-            tx_description = tx_data.get('merchant', '').lower().strip()
-            
-            # Skip if description doesn't match (when enabled)
-            if rule.get('match_description', True) and (not rule_description or rule_description not in tx_description):
-                continue
-            
-            # Check amount match if required
-            if rule.get('match_amount', False) and rule_amount is not None:
-                try:
-                    tx_amount = abs(float(tx_data.get('amount', 0)))
-                    if tx_amount != rule_amount:
-                        continue
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Error converting transaction amount for {tx_id}: {str(e)}")
-                    continue
-            
-            # When manually running rules, we intentionally ignore original_category 
-            # and original_subcategory to match all transactions with the specified 
-            # description and amount
-            
-            # Apply the rule
-            tx_data['category'] = rule.get('category')
-            tx_data['subcategory'] = rule.get('subcategory', '')
-            modified_count += 1
-        except Exception as e:
-            logger.error(f"Error applying rule to transaction {tx_id}: {str(e)}")
-            continue
-    
-    # Save transactions if any were modified
-    if modified_count > 0:
-        try:
-            save_transactions(transactions)
-            
-            # Update rule usage statistics
-            rules = load_rules()
-            if rule_id in rules:
-                rules[rule_id]['last_applied'] = datetime.datetime.now().isoformat()
-                rules[rule_id]['match_count'] = rules[rule_id].get('match_count', 0) + modified_count
-                save_rules(rules)
-                
-        except Exception as e:
-            logger.error(f"Error saving transactions after applying rule: {str(e)}")
-            return 0
-        
-    logger.info(f"Applied rule {rule_id} to {modified_count} past transactions")
-    return modified_count
-
 @app.route('/run_rule', methods=['POST'])
 @csrf_protect
 @api_error_handler
@@ -1967,16 +1942,8 @@ def run_rule():
             'affected_count': 0
         }), 200
     
-    # Create a modified version of the rule with original category/subcategory removed
-    run_rule = rule.copy()
-    run_rule['original_category'] = ''
-    run_rule['original_subcategory'] = ''
-    
-    # Apply rule to past transactions
-    affected_count = apply_rule_to_past_transactions(rule_id, run_rule)
-    
-    # Clear transaction cache
-    _transaction_cache.clear()
+    # Apply rule to past transactions, ignoring original category/subcategory
+    affected_count = apply_rule_to_past_transactions(rule_id)
     
     # Sync categories (this is a new step)
     try:
@@ -1998,34 +1965,9 @@ def run_all_rules():
     # Load rules
     rules = load_rules()
     
-    total_affected = 0
-    affected_by_rule = {}
-    
-    # Apply each active rule in order of specificity
-    sorted_rules = sorted(
-        rules.items(), 
-        key=lambda x: (
-            1 if x[1].get('original_category') else 0,
-            1 if x[1].get('original_subcategory') else 0,
-            1 if x[1].get('match_description', True) else 0,
-            1 if x[1].get('match_amount', False) else 0
-        ),
-        reverse=True
-    )
-    
-    for rule_id, rule in sorted_rules:
-        if rule.get('active', True):
-            # Create a modified version of the rule with original category/subcategory removed
-            run_rule = rule.copy()
-            run_rule['original_category'] = ''
-            run_rule['original_subcategory'] = ''
-            
-            affected_count = apply_rule_to_past_transactions(rule_id, run_rule)
-            total_affected += affected_count
-            affected_by_rule[rule_id] = affected_count
-    
-    # Clear transaction cache
-    _transaction_cache.clear()
+    # Apply all active rules in one pass over the transactions
+    affected_by_rule = apply_all_rules_to_past_transactions(rules)
+    total_affected = sum(affected_by_rule.values())
     
     # ADD THIS BLOCK: Sync categories after applying all rules
     try:
@@ -2059,12 +2001,7 @@ def rename_category():
         return jsonify({'error': str(e)}), 400
         
     # Validate new name - no duplicates
-    categories_file = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
-    
-    categories = []
-    if os.path.exists(categories_file):
-        with open(categories_file, 'r') as f:
-            categories = json.load(f)
+    categories = load_categories()
     
     # Check if new name already exists (case-insensitive)
     if any(c["name"].lower() == new_name.lower() for c in categories if c["name"].lower() != old_name.lower()):
@@ -2088,8 +2025,7 @@ def rename_category():
     categories[category_index] = updated_category
     
     # Save updated categories
-    with open(categories_file, 'w') as f:
-        json.dump(categories, f)
+    save_categories(categories)
     
     # Update all transactions that use this category
     updated_count = 0
@@ -2109,11 +2045,10 @@ def rename_category():
     # Save updated transactions
     if updated_count > 0:
         save_transactions(saved_transactions)
-        
-        # Invalidate caches
-        _transaction_cache.clear()
-        _category_counts_cache.clear()
-        
+    
+    # Categories given by rule runs are kept in the ledger
+    updated_count += rename_applied_category(old_name, new_name)
+    if updated_count > 0:
         logger.info(f"Renamed category '{old_name}' to '{new_name}' and updated {updated_count} transactions")
     
     return jsonify({
@@ -2136,12 +2071,7 @@ def rename_subcategory():
         return jsonify({'error': 'Category name, old and new subcategory names are required'}), 400
         
     # Load saved category preferences
-    categories_file = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
-    
-    categories = []
-    if os.path.exists(categories_file):
-        with open(categories_file, 'r') as f:
-            categories = json.load(f)
+    categories = load_categories()
     
     # Find the category
     category_index = next((i for i, c in enumerate(categories) if c["name"] == category_name), None)
@@ -2166,8 +2096,7 @@ def rename_subcategory():
     category["subcategories"][subcategory_index] = new_subcategory
     
     # Save updated categories
-    with open(categories_file, 'w') as f:
-        json.dump(categories, f)
+    save_categories(categories)
     
     # Update all transactions that use this subcategory
     updated_count = 0
@@ -2188,11 +2117,10 @@ def rename_subcategory():
     # Save updated transactions
     if updated_count > 0:
         save_transactions(saved_transactions)
-        
-        # Invalidate caches
-        _transaction_cache.clear()
-        _category_counts_cache.clear()
-        
+    
+    # Categories given by rule runs are kept in the ledger
+    updated_count += rename_applied_category(category_name, category_name, old_subcategory, new_subcategory)
+    if updated_count > 0:
         logger.info(f"Renamed subcategory '{old_subcategory}' to '{new_subcategory}' in category '{category_name}' and updated {updated_count} transactions")
     
     return jsonify({
@@ -2304,92 +2232,18 @@ def debug_info():
     return jsonify(info)
 
 @app.route('/get_category_counts', methods=['GET'])
+@etag_conditional('transactions', 'rules', 'categories', 'tokens', 'ledger', plaid_backed=True)
 @api_error_handler
 def get_category_counts():
     # Check cache first
-    cached_counts = _category_counts_cache.get('category_counts')
+    cache_key = generate_cache_key("category_counts", get_data_versions('transactions', 'rules', 'categories', 'tokens', 'ledger'))
+    cached_counts = _category_counts_cache.get(cache_key)
     if cached_counts:
         return jsonify(cached_counts)
     
-    # Initialize category counts
-    category_counts = {}
-    subcategory_counts = {}
-    
-    # Load all transactions
-    access_token = load_access_token()
-    saved_transactions = load_saved_transactions()
-    
-    # Process all transactions from Plaid API
-    if access_token:
-        try:
-            # Use a wide date range to get all transactions
-            start_date = datetime.datetime(2015, 1, 1).date()
-            end_date = datetime.datetime.now().date()
-            
-            transactions_request = TransactionsGetRequest(
-                access_token=access_token,
-                start_date=start_date,
-                end_date=end_date
-            )
-            response = client.transactions_get(transactions_request)
-            plaid_txs = response['transactions']
-            
-            # Count transactions by category
-            for tx in plaid_txs:
-                tx_id = getattr(tx, 'transaction_id', None)
-                
-                # Skip if manually deleted
-                if tx_id in saved_transactions and saved_transactions[tx_id].get('deleted', False):
-                    continue
-                
-                # Get category (use modified if available)
-                category = None
-                if tx_id in saved_transactions and 'category' in saved_transactions[tx_id]:
-                    category = saved_transactions[tx_id]['category']
-                else:
-                    tx_category = getattr(tx, 'category', [])
-                    category = tx_category[0] if tx_category else 'Uncategorized'
-                
-                # Get subcategory
-                subcategory = None
-                if tx_id in saved_transactions and 'subcategory' in saved_transactions[tx_id]:
-                    subcategory = saved_transactions[tx_id]['subcategory']
-                
-                # Count category
-                if category not in category_counts:
-                    category_counts[category] = 0
-                category_counts[category] += 1
-                
-                # Count subcategory
-                if subcategory:
-                    if category not in subcategory_counts:
-                        subcategory_counts[category] = {}
-                    if subcategory not in subcategory_counts[category]:
-                        subcategory_counts[category][subcategory] = 0
-                    subcategory_counts[category][subcategory] += 1
-                    
-        except Exception as e:
-            logger.error(f"Error processing transactions for category counts: {str(e)}")
-            logger.error(traceback.format_exc())
-    
-    # Add manual transactions
-    for tx_id, tx_data in saved_transactions.items():
-        if tx_data.get('manual', False) and not tx_data.get('deleted', False):
-            category = tx_data.get('category', 'Uncategorized')
-            subcategory = tx_data.get('subcategory')
-            
-            # Count category
-            if category not in category_counts:
-                category_counts[category] = 0
-            category_counts[category] += 1
-            
-            # Count subcategory
-            if subcategory:
-                if category not in subcategory_counts:
-                    subcategory_counts[category] = {}
-                if subcategory not in subcategory_counts[category]:
-                    subcategory_counts[category][subcategory] = 0
-                subcategory_counts[category][subcategory] += 1
+    # Counts are maintained by the aggregate cube over the full ledger
+    ensure_full_history_ingested()
+    category_counts, subcategory_counts = category_transaction_counts()
     
     # Prepare result
     result = {
@@ -2398,7 +2252,7 @@ def get_category_counts():
     }
     
     # Store in cache
-    _category_counts_cache.set('category_counts', result)
+    _category_counts_cache.set(cache_key, result)
     
     return jsonify(result)
 
@@ -2408,13 +2262,11 @@ def sync_transaction_categories_internal():
     Returns a tuple of (added_categories, added_subcategories)
     """
     # Load existing categories
-    categories_file = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
     categories = []
     
-    if os.path.exists(categories_file):
+    if os.path.exists(CATEGORIES_FILE):
         try:
-            with open(categories_file, 'r') as f:
-                categories = json.load(f)
+            categories = load_categories()
         except Exception as e:
             logger.error(f"Error reading categories file: {str(e)}")
             categories = []
@@ -2433,13 +2285,8 @@ def sync_transaction_categories_internal():
             start_date = datetime.datetime(2015, 1, 1).date()
             end_date = datetime.datetime.now().date()
             
-            transactions_request = TransactionsGetRequest(
-                access_token=access_token,
-                start_date=start_date,
-                end_date=end_date
-            )
-            response = client.transactions_get(transactions_request)
-            plaid_txs = response['transactions']
+            plaid_txs = fetch_plaid_transactions(access_token, start_date, end_date)
+            sync_ledger_rules()
             
             # Load saved transaction modifications
             saved_transactions = load_saved_transactions()
@@ -2452,11 +2299,17 @@ def sync_transaction_categories_internal():
                 if tx_id in saved_transactions and saved_transactions[tx_id].get('deleted', False):
                     continue
                 
-                # Get category (either from saved modifications or original)
+                # Get category as the transaction list shows it: saved, rule-run,
+                # rule-matched or original, in that order
                 category = None
                 subcategory = None
                 
-                if tx_id in saved_transactions and 'category' in saved_transactions[tx_id]:
+                entry = get_ledger_entry(tx_id) if tx_id else None
+                if entry is not None:
+                    effective = effective_transaction(entry, saved_transactions.get(tx_id, {}))
+                    category = effective['category']
+                    subcategory = effective['subcategory']
+                elif tx_id in saved_transactions and 'category' in saved_transactions[tx_id]:
                     category = saved_transactions[tx_id]['category']
                     subcategory = saved_transactions[tx_id].get('subcategory', '')
                 else:
@@ -2537,8 +2390,7 @@ def sync_transaction_categories_internal():
     # Save updated categories if changes were made
     if added_categories > 0 or added_subcategories > 0:
         try:
-            with open(categories_file, 'w') as f:
-                json.dump(categories, f)
+            save_categories(categories)
         except Exception as e:
             logger.error(f"Error saving updated categories: {str(e)}")
             raise
@@ -0,0 +1,77 @@
+"""
+Hit rates of plain LRU and TinyLFU admission on a synthetic request trace.
+
+Usage: python benchmarks/bench_cache_admission.py [--requests 200000] [--size 16] [--bump-every 0]
+
+Request logs are not kept, so the trace is shaped like the transaction
+list's traffic: half the requests go to 5 hot views, a fifth to 20 warm
+views and the rest are one-shot keys from paging and month scans. Keys
+embed a data version like the real cache keys do. With --bump-every N the
+version moves every N requests, and each policy runs twice: once dropping
+the memory tier on a bump, as bump_data_version does, and once leaving the
+unreachable entries in place.
+"""
+import os
+import sys
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def make_trace(rng, count):
+    trace = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.5:
+            trace.append(f"hot-{rng.randrange(5)}")
+        elif roll < 0.7:
+            trace.append(f"warm-{rng.randrange(20)}")
+        else:
+            trace.append(f"scan-{i}")
+    return trace
+
+def replay(cache, trace, bump_every, drop_on_bump):
+    """Replay the trace as get-then-set-on-miss. Returns (hit rate %, rejections)."""
+    version = 0
+    for i, view in enumerate(trace):
+        if bump_every and i and i % bump_every == 0:
+            version += 1
+            if drop_on_bump:
+                cache.drop_memory()
+        key = f"{version}|{view}"
+        if cache.get(key) is None:
+            cache.set(key, view)
+    stats = cache.get_stats()
+    return stats['hit_rate'], stats['admission_rejections']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200000)
+    parser.add_argument('--size', type=int, default=16, help='cache entries')
+    parser.add_argument('--bump-every', type=int, default=0, help='requests between data version bumps')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    from cache_utils import LRUCache
+
+    trace = make_trace(random.Random(args.seed), args.requests)
+    # Best possible: every repeat request is a hit, counting one miss per view and version
+    seen = set()
+    repeats = 0
+    for i, view in enumerate(trace):
+        key = (i // args.bump_every if args.bump_every else 0, view)
+        repeats += key in seen
+        seen.add(key)
+    print(f"{args.requests} requests, {args.size} entries, ceiling {repeats / len(trace) * 100:.1f}%")
+
+    variants = [(True, '')] if not args.bump_every else [(True, ', drop on bump'), (False, ', keep on bump')]
+    for admission in ('lru', 'tinylfu'):
+        for drop_on_bump, label in variants:
+            cache = LRUCache(max_size=args.size, ttl_seconds=3600, shards=1, admission=admission)
+            hit_rate, rejections = replay(cache, trace, args.bump_every, drop_on_bump)
+            print(f"{admission:>8}{label}: hit rate {hit_rate:.1f}%, {rejections} rejections")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Serial vs parallel run_bulk timings, to pick PARALLEL_MIN_ROWS for a machine.
+
+Usage: python benchmarks/bench_parallel_matching.py [--workers N] [--rows 1000,10000,...]
+
+The first parallel run includes starting the worker pool; it is timed
+separately so the per-size numbers show the steady state with a reused pool.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ['amazon', 'uber', 'lyft', 'starbucks', 'shell', 'target', 'walmart', 'costco',
+         'netflix', 'spotify', 'apple', 'google', 'delta', 'chevron', 'kroger']
+
+def make_rules(rng, count, amounts):
+    return {
+        str(i): {
+            'description': f"{rng.choice(WORDS)} {rng.randint(0, 500)}",
+            'match_amount': rng.random() < 0.2,
+            'amount': rng.choice(amounts),
+            'original_category': rng.choice(['', 'Food']),
+            'category': 'Bench'
+        }
+        for i in range(count)
+    }
+
+def make_rows(rng, count, amounts, amount_to_cents):
+    rows = []
+    for _ in range(count):
+        description = ' '.join(f"{rng.choice(WORDS)} {rng.randint(0, 500)}" for _ in range(2))
+        rows.append((description, amount_to_cents(rng.choice(amounts)), rng.choice(['Food', 'Travel']), ''))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=0, help='worker processes (default: CPU count)')
+    parser.add_argument('--rules', type=int, default=1000)
+    parser.add_argument('--rows', default='1000,10000,50000,200000')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.workers:
+        os.environ['RULES_PARALLEL_MAX_WORKERS'] = str(args.workers)
+    logging.disable(logging.CRITICAL)
+    import rule_utils
+
+    rng = random.Random(args.seed)
+    amounts = [round(rng.uniform(1, 200), 2) for _ in range(300)]
+    compiled = rule_utils.CompiledRuleSet(make_rules(rng, args.rules, amounts))
+
+    print(f"{os.cpu_count()} CPUs, {rule_utils.PARALLEL_MAX_WORKERS} workers, "
+          f"start method {rule_utils.PARALLEL_START_METHOD}, chunk {rule_utils.PARALLEL_CHUNK_ROWS} rows")
+
+    warmup = make_rows(rng, rule_utils.PARALLEL_CHUNK_ROWS, amounts, rule_utils.amount_to_cents)
+    start = time.perf_counter()
+    rule_utils.run_bulk(compiled, warmup, parallel=True)
+    print(f"pool start + first chunk: {time.perf_counter() - start:.3f}s")
+
+    for count in (int(n) for n in args.rows.split(',')):
+        rows = make_rows(rng, count, amounts, rule_utils.amount_to_cents)
+        start = time.perf_counter()
+        serial = rule_utils.run_bulk(compiled, rows, parallel=False)
+        serial_time = time.perf_counter() - start
+        start = time.perf_counter()
+        parallel = rule_utils.run_bulk(compiled, rows, parallel=True)
+        parallel_time = time.perf_counter() - start
+        assert serial == parallel, f"parallel results differ from serial at {count} rows"
+        print(f"{count:>8} rows: serial {serial_time:.3f}s  parallel {parallel_time:.3f}s  "
+              f"speedup {serial_time / parallel_time:.2f}x")
+
+if __name__ == '__main__':
+    main()
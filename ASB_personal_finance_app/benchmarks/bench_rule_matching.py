@@ -0,0 +1,113 @@
+"""
+Compiled rule matching against the rule-by-rule scan it replaced.
+
+Usage: python benchmarks/bench_rule_matching.py [--rules 1000] [--transactions 100000] [--sample 2000]
+
+Every transaction is matched with CompiledRuleSet. The scan checks all
+rules for each transaction and is too slow to run over the full set, so it
+runs on a sample; its results are compared with the compiled ones and its
+time is extrapolated to the full count.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ton', 'vel', 'zu', 'bri', 'dan', 'fo', 'gre', 'hal', 'jin', 'nor', 'pe', 'sto']
+SUFFIXES = ['market', 'cafe', 'fuel', 'pharmacy', 'books', 'grill', 'hardware', 'cinema']
+CATEGORIES = ['Food', 'Travel', 'Shopping', 'Bills']
+ACCOUNTS = ['acc-1', 'acc-2', 'acc-3']
+
+def make_merchants(rng, count):
+    """Distinct synthetic merchant names such as 'kalomi grill'."""
+    merchants = set()
+    while len(merchants) < count:
+        name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        merchants.add(f"{name} {rng.choice(SUFFIXES)}")
+    return sorted(merchants)
+
+def make_rules(rng, count, merchants, amounts, match_types):
+    rules = {}
+    for i, merchant in enumerate(rng.sample(merchants, count)):
+        rule = {'description': merchant, 'category': rng.choice(CATEGORIES)}
+        kind = rng.random()
+        if kind < 0.02:
+            rule.update(match_type='regex', description=rf"^{merchant.split()[0]} .*#\d+$")
+        elif kind < 0.2:
+            rule['match_type'] = rng.choice(match_types[1:5])
+            if rule['match_type'] in ('starts_with', 'tokens'):
+                rule['description'] = merchant.split()[0]
+        if rng.random() < 0.2:
+            rule.update(match_amount=True, amount=rng.choice(amounts))
+        if rng.random() < 0.01:
+            rule.update(match_description=False, match_amount=True, amount=rng.choice(amounts))
+        if rng.random() < 0.3:
+            rule['original_category'] = rng.choice(CATEGORIES)
+        if rng.random() < 0.05:
+            rule['account_id'] = rng.choice(ACCOUNTS)
+        rules[str(i)] = rule
+    return rules
+
+def make_transactions(rng, count, merchants, amounts, normalize_merchant, amount_to_cents):
+    transactions = []
+    for _ in range(count):
+        raw = f"{rng.choice(merchants).upper()} #{rng.randint(1, 999)}"
+        date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        transactions.append((normalize_merchant(raw), amount_to_cents(rng.choice(amounts)),
+                             rng.choice(CATEGORIES), '', rng.choice(ACCOUNTS), date, raw))
+    return transactions
+
+def scan(compiled_rules, rows):
+    """First-match rule ids found by checking every rule in specificity order."""
+    results = []
+    for row in rows:
+        match = next((c for c in compiled_rules.ordered if c.active and c.matches(*row)), None)
+        results.append(match.rule_id if match else None)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rules', type=int, default=1000)
+    parser.add_argument('--transactions', type=int, default=100000)
+    parser.add_argument('--sample', type=int, default=2000, help='transactions to run the full scan on')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    from merchant_utils import normalize_merchant
+    from rule_utils import CompiledRuleSet, MATCH_TYPES, amount_to_cents, run_bulk
+
+    rng = random.Random(args.seed)
+    amounts = [round(rng.uniform(1, 200), 2) for _ in range(300)]
+    # Twice as many merchants as rules, so roughly half the transactions have a rule
+    merchants = make_merchants(rng, args.rules * 2)
+    rules = make_rules(rng, args.rules, merchants, amounts, MATCH_TYPES)
+    transactions = make_transactions(rng, args.transactions, merchants, amounts, normalize_merchant,
+                                     amount_to_cents)
+
+    start = time.perf_counter()
+    compiled_rules = CompiledRuleSet(rules)
+    compile_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = run_bulk(compiled_rules, transactions, parallel=False)
+    match_time = time.perf_counter() - start
+
+    sample = min(args.sample, len(transactions))
+    start = time.perf_counter()
+    scanned = scan(compiled_rules, transactions[:sample])
+    scan_time = (time.perf_counter() - start) * len(transactions) / max(sample, 1)
+
+    assert scanned == compiled[:sample], "compiled matching differs from the rule-by-rule scan"
+    matched = sum(1 for rule_id in compiled if rule_id is not None)
+    print(f"{len(rules)} rules x {len(transactions)} transactions, {matched} matched")
+    print(f"compile {compile_time:.3f}s, compiled match {match_time:.3f}s")
+    print(f"rule-by-rule scan {scan_time:.1f}s (extrapolated from {sample}), "
+          f"speedup {scan_time / (compile_time + match_time):.0f}x")
+
+if __name__ == '__main__':
+    main()
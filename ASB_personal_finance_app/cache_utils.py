@@ -0,0 +1,678 @@
+import os
+import sys
+import time
+import heapq
+import pickle
+import sqlite3
+import logging
+import itertools
+import weakref
+from collections import OrderedDict
+from threading import Lock, Thread, Event
+
+logger = logging.getLogger(__name__)
+
+# Bump when the shape of cached values changes so old persisted entries are ignored
+CACHE_SCHEMA_VERSION = 1
+
+# Large containers are sized from a sample of their items instead of a full walk
+SIZE_SAMPLE_ITEMS = 64
+SIZE_MAX_DEPTH = 6
+
+def estimate_size(obj, _depth=0):
+    """
+    Approximate the memory footprint of a value in bytes.
+
+    Walks dicts, lists, tuples and sets recursively. Containers with more than
+    SIZE_SAMPLE_ITEMS items are extrapolated from a sample, so the cost stays
+    bounded even for full-history transaction lists.
+    """
+    size = sys.getsizeof(obj)
+    if _depth >= SIZE_MAX_DEPTH:
+        return size
+
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool)) or obj is None:
+        return size
+
+    if isinstance(obj, dict):
+        items = obj.items()
+        count = len(obj)
+        if count == 0:
+            return size
+        sample = items if count <= SIZE_SAMPLE_ITEMS else list(items)[:SIZE_SAMPLE_ITEMS]
+        sampled = sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in sample)
+        return size + sampled * count // len(sample)
+
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        count = len(obj)
+        if count == 0:
+            return size
+        if count <= SIZE_SAMPLE_ITEMS:
+            sample = list(obj)
+        elif isinstance(obj, (list, tuple)):
+            step = count // SIZE_SAMPLE_ITEMS
+            sample = obj[::step][:SIZE_SAMPLE_ITEMS]
+        else:
+            sample = [item for _, item in zip(range(SIZE_SAMPLE_ITEMS), obj)]
+        sampled = sum(estimate_size(item, _depth + 1) for item in sample)
+        return size + sampled * count // len(sample)
+
+    if hasattr(obj, '__dict__'):
+        return size + estimate_size(vars(obj), _depth + 1)
+
+    return size
+
+class _CacheEntry:
+    """A cached value together with its size and expiry deadline."""
+    __slots__ = ('value', 'size', 'expires_at')
+
+    def __init__(self, value, size, expires_at):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+class FrequencySketch:
+    """
+    Count-min sketch of recent key popularity for TinyLFU-style admission.
+
+    Keeps DEPTH rows of small saturating counters (max 15), so memory is a few
+    bytes per tracked slot regardless of how many distinct keys are seen.
+    Every sample_size increments all counters are halved, letting frequencies
+    age out and newly popular keys compete with old ones.
+    """
+    DEPTH = 4
+    MAX_COUNT = 15
+    SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+
+    def __init__(self, capacity):
+        width = 16
+        while width < max(capacity, 1) * 4:
+            width <<= 1
+        self.mask = width - 1
+        self.rows = [bytearray(width) for _ in range(self.DEPTH)]
+        self.sample_size = max(capacity, 1) * 10
+        self.additions = 0
+
+    def _indexes(self, key):
+        h = hash(key)
+        return [((h ^ seed) * 0x01000193 >> 7) & self.mask for seed in self.SEEDS]
+
+    def increment(self, key):
+        """Record one access to key."""
+        for row, index in zip(self.rows, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key):
+        """Estimated recent access count for key."""
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def _age(self):
+        """Halve every counter so old popularity decays."""
+        for row in self.rows:
+            for i, count in enumerate(row):
+                if count:
+                    row[i] = count >> 1
+        self.additions //= 2
+
+class _CacheShard:
+    """One independently locked partition of an LRUCache."""
+    __slots__ = ('entries', 'deadlines', 'sketch', 'lock', 'bytes_used', 'hits', 'misses',
+                 'evictions', 'expirations', 'bytes_reclaimed', 'rejections')
+
+    def __init__(self, sketch=None):
+        self.entries = OrderedDict()
+        # Access frequencies used by the admission policy, if any
+        self.sketch = sketch
+        # Min-heap of (expires_at, sequence, key); stale items are skipped when popped
+        self.deadlines = []
+        self.lock = Lock()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bytes_reclaimed = 0
+        self.rejections = 0
+
+class LRUCache:
+    """
+    Thread-safe LRU cache with entry and byte budgets and TTL support.
+
+    Keys are spread over independently locked shards so concurrent readers of
+    different keys do not serialize on one lock. Each shard enforces its share
+    of max_size and max_bytes; a value larger than a shard's byte budget is
+    not cached at all.
+
+    An optional PersistentCache can sit underneath as a second tier: sets are
+    written through to it under the given namespace, and memory misses are
+    served from it so entries survive restarts.
+
+    admission='tinylfu' adds a frequency-based admission policy: when the
+    shard is full, a new key is only admitted if it has been requested more
+    often recently than the entry it would evict. One-shot keys from scans
+    then cannot push out hot entries.
+    """
+    def __init__(self, max_size=1000, ttl_seconds=300, max_bytes=None, shards=8,
+                 persistent=None, namespace=None, admission=None):
+        if admission not in (None, 'lru', 'tinylfu'):
+            raise ValueError(f"Unknown admission policy: {admission}")
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.persistent = persistent
+        self.namespace = namespace
+        self.admission = admission or 'lru'
+
+        shard_count = max(1, min(shards, max_size))
+        self._shard_max_size = -(-max_size // shard_count)  # Ceiling division
+        self._shards = [
+            _CacheShard(FrequencySketch(self._shard_max_size) if self.admission == 'tinylfu' else None)
+            for _ in range(shard_count)
+        ]
+        self._shard_max_bytes = max_bytes // shard_count if max_bytes else None
+        self._sequence = itertools.count()
+
+    def _shard_for(self, key):
+        """Pick the shard responsible for a key."""
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _persistent_key(self, key):
+        """Key under which an entry is stored in the persistent tier."""
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        """Get value from cache if not expired."""
+        shard = self._shard_for(key)
+        with shard.lock:
+            if shard.sketch is not None:
+                shard.sketch.increment(key)
+
+            entry = shard.entries.get(key)
+            if entry is not None and entry.expires_at <= time.time():
+                self._remove(shard, key)
+                shard.expirations += 1
+                shard.bytes_reclaimed += entry.size
+                entry = None
+
+            if entry is not None:
+                # Move to end (most recently used)
+                shard.entries.move_to_end(key)
+                shard.hits += 1
+                return entry.value
+
+            shard.misses += 1
+
+        if self.persistent is None:
+            return None
+
+        # Fall back to the persistent tier outside the shard lock
+        stored = self.persistent.get(self._persistent_key(key))
+        if stored is None:
+            return None
+        value, expires_at = stored
+        self._store(key, value, expires_at)
+        return value
+
+    def set(self, key, value):
+        """Store value in cache with LRU eviction."""
+        expires_at = time.time() + self.ttl_seconds
+        self._store(key, value, expires_at)
+        if self.persistent is not None:
+            self.persistent.set(self._persistent_key(key), value, expires_at)
+
+    def _store(self, key, value, expires_at):
+        """Place a value in the memory tier, evicting to stay within budget."""
+        size = estimate_size(value)
+        shard = self._shard_for(key)
+
+        with shard.lock:
+            # Remove if already exists
+            replacing = self._remove(shard, key) is not None
+
+            if self._shard_max_bytes is not None and size > self._shard_max_bytes:
+                logger.warning(f"Not caching {key}: {size} bytes exceeds the per-shard budget of {self._shard_max_bytes} bytes")
+                return
+
+            if not replacing and not self._admit(shard, key, size):
+                shard.rejections += 1
+                logger.debug(f"Admission policy rejected {key}")
+                return
+
+            # Add to cache
+            shard.entries[key] = _CacheEntry(value, size, expires_at)
+            shard.bytes_used += size
+            heapq.heappush(shard.deadlines, (expires_at, next(self._sequence), key))
+            self._track(key)
+
+            # Drop stale deadlines once replaced or evicted keys dominate the heap
+            if len(shard.deadlines) > 2 * len(shard.entries) + 64:
+                shard.deadlines = [(e.expires_at, next(self._sequence), k) for k, e in shard.entries.items()]
+                heapq.heapify(shard.deadlines)
+
+            # Evict oldest while over either budget
+            while shard.entries and (
+                len(shard.entries) > self._shard_max_size or
+                (self._shard_max_bytes is not None and shard.bytes_used > self._shard_max_bytes)
+            ):
+                oldest_key = next(iter(shard.entries))
+                self._remove(shard, oldest_key)
+                shard.evictions += 1
+                logger.debug(f"Evicted {oldest_key} from cache (size limit)")
+
+    def _admit(self, shard, key, size):
+        """Decide whether a new key may enter a shard. The caller holds the shard lock."""
+        if shard.sketch is None or not shard.entries:
+            return True
+        full = len(shard.entries) >= self._shard_max_size or (
+            self._shard_max_bytes is not None and shard.bytes_used + size > self._shard_max_bytes
+        )
+        if not full:
+            return True
+        victim_key = next(iter(shard.entries))
+        return shard.sketch.estimate(key) > shard.sketch.estimate(victim_key)
+
+    def delete(self, key):
+        """Remove key from cache."""
+        shard = self._shard_for(key)
+        with shard.lock:
+            self._remove(shard, key)
+        if self.persistent is not None:
+            self.persistent.delete(self._persistent_key(key))
+
+    def clear(self):
+        """Clear all cache entries."""
+        for shard in self._shards:
+            with shard.lock:
+                for key in list(shard.entries):
+                    self._remove(shard, key)
+                shard.deadlines = []
+        if self.persistent is not None:
+            self.persistent.delete_prefix(self._persistent_key(''))
+        stats = self.get_stats()
+        logger.info(f"Cache cleared. Stats: {stats['hits']} hits, {stats['misses']} misses")
+
+    def drop_memory(self):
+        """
+        Drop every entry from the memory tier, leaving the persistent tier alone.
+
+        For caches whose keys embed data versions: once a version moves, no
+        key built from the old one is requested again. Left in place, such
+        entries would keep their slots and their TinyLFU frequencies, and the
+        new keys could not be admitted until the sketch aged. Returns the
+        number of entries dropped.
+        """
+        dropped = 0
+        for shard in self._shards:
+            with shard.lock:
+                for key in list(shard.entries):
+                    self._remove(shard, key)
+                    dropped += 1
+                shard.deadlines = []
+        return dropped
+
+    def sweep_expired(self, now=None):
+        """
+        Reclaim entries whose TTL has passed without waiting for them to be read.
+
+        Pops only the due deadlines from each shard's heap, so the cost is
+        proportional to the number of expired entries. Returns the number of
+        bytes reclaimed.
+        """
+        now = time.time() if now is None else now
+        reclaimed = 0
+        for shard in self._shards:
+            with shard.lock:
+                while shard.deadlines and shard.deadlines[0][0] <= now:
+                    expires_at, _, key = heapq.heappop(shard.deadlines)
+                    entry = shard.entries.get(key)
+                    # Skip deadlines left behind by entries that were replaced or removed
+                    if entry is None or entry.expires_at != expires_at:
+                        continue
+                    self._remove(shard, key)
+                    shard.expirations += 1
+                    shard.bytes_reclaimed += entry.size
+                    reclaimed += entry.size
+        return reclaimed
+
+    def _remove(self, shard, key):
+        """Remove key from a shard. The caller must hold the shard lock."""
+        entry = shard.entries.pop(key, None)
+        if entry is None:
+            return None
+        shard.bytes_used -= entry.size
+        self._untrack(key)
+        return entry
+
+    def _track(self, key):
+        """Hook called when a key is added. The caller holds the shard lock."""
+        pass
+
+    def _untrack(self, key):
+        """Hook called when a key is removed. The caller holds the shard lock."""
+        pass
+
+    def get_stats(self):
+        """Get cache statistics."""
+        size = hits = misses = evictions = expirations = bytes_used = bytes_reclaimed = rejections = 0
+        for shard in self._shards:
+            with shard.lock:
+                size += len(shard.entries)
+                hits += shard.hits
+                misses += shard.misses
+                evictions += shard.evictions
+                expirations += shard.expirations
+                bytes_used += shard.bytes_used
+                bytes_reclaimed += shard.bytes_reclaimed
+                rejections += shard.rejections
+
+        total_requests = hits + misses
+        hit_rate = (hits / total_requests * 100) if total_requests > 0 else 0
+        return {
+            'size': size,
+            'max_size': self.max_size,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hit_rate,
+            'evictions': evictions,
+            'expirations': expirations,
+            'bytes_reclaimed': bytes_reclaimed,
+            'bytes_used': bytes_used,
+            'max_bytes': self.max_bytes,
+            'admission': self.admission,
+            'admission_rejections': rejections
+        }
+
+class KeyedLRUCache(LRUCache):
+    """
+    LRU cache with support for multiple keys per cache entry.
+
+    Composite keys are indexed by their primary key, so deleting everything
+    stored under one primary key touches only those entries.
+    """
+    def __init__(self, max_size=1000, ttl_seconds=300, max_bytes=None, shards=8,
+                 persistent=None, namespace=None, admission=None):
+        super().__init__(max_size, ttl_seconds, max_bytes, shards, persistent, namespace, admission)
+        self._primary_index = {}
+        self._index_lock = Lock()
+
+    def get(self, primary_key, secondary_key=None):
+        """Get value with optional secondary key."""
+        if secondary_key is None:
+            return super().get(primary_key)
+
+        composite_key = f"{primary_key}:{secondary_key}"
+        return super().get(composite_key)
+
+    def set(self, primary_key, value, secondary_key=None):
+        """Set value with optional secondary key."""
+        if secondary_key is None:
+            return super().set(primary_key, value)
+
+        composite_key = f"{primary_key}:{secondary_key}"
+        return super().set(composite_key, value)
+
+    def _track(self, key):
+        primary_key = str(key).split(':', 1)[0]
+        with self._index_lock:
+            self._primary_index.setdefault(primary_key, set()).add(key)
+
+    def _untrack(self, key):
+        primary_key = str(key).split(':', 1)[0]
+        with self._index_lock:
+            keys = self._primary_index.get(primary_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._primary_index[primary_key]
+
+    def delete_primary(self, primary_key):
+        """Delete every entry stored under a primary key."""
+        with self._index_lock:
+            keys_to_delete = list(self._primary_index.get(str(primary_key), ()))
+
+        deleted = 0
+        for key in keys_to_delete:
+            shard = self._shard_for(key)
+            with shard.lock:
+                if self._remove(shard, key) is not None:
+                    deleted += 1
+        if self.persistent is not None:
+            self.persistent.delete_prefix(self._persistent_key(f"{primary_key}:"))
+            self.persistent.delete(self._persistent_key(primary_key))
+        return deleted
+
+    def delete_pattern(self, pattern):
+        """
+        Delete all keys matching pattern.
+
+        A pattern that is a primary key is resolved through the index; any
+        other substring falls back to scanning the indexed primary keys.
+        """
+        with self._index_lock:
+            if pattern in self._primary_index:
+                primaries = [pattern]
+            else:
+                primaries = list(self._primary_index)
+            candidates = [k for p in primaries for k in self._primary_index.get(p, ()) if pattern in str(k)]
+
+        deleted = 0
+        for key in candidates:
+            shard = self._shard_for(key)
+            with shard.lock:
+                if self._remove(shard, key) is not None:
+                    deleted += 1
+        if self.persistent is not None:
+            self.persistent.delete_matching(self._persistent_key(''), pattern)
+        return deleted
+
+class PersistentCache:
+    """
+    SQLite-backed key/value store used as a second tier under LRUCache.
+
+    Values are pickled with their absolute expiry time. Keys are prefixed with
+    CACHE_SCHEMA_VERSION so entries written by an older layout are never read
+    back, and the file is capped at max_bytes by dropping the entries closest
+    to expiry first. Failures are logged and treated as misses so a damaged
+    cache file can never break a request.
+    """
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, schema_version=CACHE_SCHEMA_VERSION):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.prefix = f"v{schema_version}:"
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.bytes_reclaimed = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_entries (expires_at)")
+            # Entries from other schema versions can never be read again
+            self.conn.execute("DELETE FROM cache_entries WHERE substr(key, 1, ?) != ?", (len(self.prefix), self.prefix))
+
+    def get(self, key):
+        """Return (value, expires_at) for a live entry, or None."""
+        try:
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT value, expires_at FROM cache_entries WHERE key = ?", (self.prefix + key,)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                if row[1] <= time.time():
+                    with self.conn:
+                        self.conn.execute("DELETE FROM cache_entries WHERE key = ?", (self.prefix + key,))
+                    self.expirations += 1
+                    self.misses += 1
+                    return None
+                self.hits += 1
+            return pickle.loads(row[0]), row[1]
+        except Exception as e:
+            logger.error(f"Error reading persistent cache entry {key}: {str(e)}")
+            return None
+
+    def set(self, key, value, expires_at):
+        """Store a value until expires_at, evicting to stay under max_bytes."""
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            logger.warning(f"Value for {key} cannot be persisted: {str(e)}")
+            return
+        if len(blob) > self.max_bytes:
+            logger.warning(f"Not persisting {key}: {len(blob)} bytes exceeds the {self.max_bytes} byte budget")
+            return
+
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO cache_entries (key, value, size, expires_at) VALUES (?, ?, ?, ?)",
+                    (self.prefix + key, blob, len(blob), expires_at)
+                )
+                self._enforce_budget()
+        except Exception as e:
+            logger.error(f"Error writing persistent cache entry {key}: {str(e)}")
+
+    def _delete_expired(self, now):
+        """Delete expired rows and return the bytes they held. Caller holds the lock."""
+        count, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries WHERE expires_at <= ?", (now,)
+        ).fetchone()
+        if count:
+            self.conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+            self.expirations += count
+            self.bytes_reclaimed += size
+        return size
+
+    def sweep_expired(self, now=None):
+        """Delete expired rows using the expiry index. Returns the bytes reclaimed."""
+        now = time.time() if now is None else now
+        try:
+            with self.lock, self.conn:
+                return self._delete_expired(now)
+        except Exception as e:
+            logger.error(f"Error sweeping persistent cache: {str(e)}")
+            return 0
+
+    def _enforce_budget(self):
+        """Drop expired entries, then the soonest-expiring ones, until under budget. Caller holds the lock."""
+        self._delete_expired(time.time())
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.conn.execute("SELECT key, size FROM cache_entries ORDER BY expires_at").fetchall():
+            self.conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def delete(self, key):
+        """Remove one entry."""
+        self._execute_delete("DELETE FROM cache_entries WHERE key = ?", (self.prefix + key,))
+
+    def delete_prefix(self, key_prefix):
+        """Remove every entry whose key starts with key_prefix."""
+        full_prefix = self.prefix + key_prefix
+        self._execute_delete(
+            "DELETE FROM cache_entries WHERE substr(key, 1, ?) = ?", (len(full_prefix), full_prefix)
+        )
+
+    def delete_matching(self, key_prefix, pattern):
+        """Remove entries under key_prefix whose key contains pattern."""
+        full_prefix = self.prefix + key_prefix
+        self._execute_delete(
+            "DELETE FROM cache_entries WHERE substr(key, 1, ?) = ? AND instr(substr(key, ?), ?) > 0",
+            (len(full_prefix), full_prefix, len(full_prefix) + 1, pattern)
+        )
+
+    def _execute_delete(self, sql, params):
+        try:
+            with self.lock, self.conn:
+                self.conn.execute(sql, params)
+        except Exception as e:
+            logger.error(f"Error deleting from persistent cache: {str(e)}")
+
+    def get_stats(self):
+        """Get cache statistics."""
+        with self.lock:
+            try:
+                size, bytes_used = self.conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+                ).fetchone()
+            except Exception as e:
+                logger.error(f"Error reading persistent cache statistics: {str(e)}")
+                size, bytes_used = 0, 0
+            total_requests = self.hits + self.misses
+            hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+            return {
+                'size': size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': hit_rate,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'bytes_reclaimed': self.bytes_reclaimed,
+                'bytes_used': bytes_used,
+                'max_bytes': self.max_bytes
+            }
+
+class CacheExpirySweeper(Thread):
+    """
+    Daemon thread that periodically reclaims expired entries from caches.
+
+    Without it, expired values (including large transaction lists) stay in
+    memory until their key is read again or LRU pushes them out. Caches are
+    held weakly so registering one never keeps it alive.
+    """
+    def __init__(self, interval_seconds=30):
+        super().__init__(name='cache-expiry-sweeper', daemon=True)
+        self.interval_seconds = interval_seconds
+        self._caches = weakref.WeakSet()
+        self._stop_event = Event()
+
+    def register(self, cache):
+        """Add a cache (anything with sweep_expired) to the sweep."""
+        self._caches.add(cache)
+
+    def sweep(self):
+        """Sweep every registered cache once and return the bytes reclaimed."""
+        reclaimed = 0
+        for cache in list(self._caches):
+            try:
+                reclaimed += cache.sweep_expired()
+            except Exception as e:
+                logger.error(f"Error sweeping expired cache entries: {str(e)}")
+        if reclaimed:
+            logger.debug(f"Cache sweep reclaimed {reclaimed} bytes")
+        return reclaimed
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            self.sweep()
+
+    def stop(self):
+        self._stop_event.set()
+
+def start_expiry_sweeper(caches, interval_seconds=30):
+    """Start a sweeper for the given caches. Returns None when interval_seconds is not positive."""
+    if not interval_seconds or interval_seconds <= 0:
+        return None
+    sweeper = CacheExpirySweeper(interval_seconds)
+    for cache in caches:
+        if cache is not None:
+            sweeper.register(cache)
+    sweeper.start()
+    return sweeper
@@ -2,9 +2,13 @@ import os
 import json
 import time
 import logging
+import atexit
 import datetime
-from collections import OrderedDict
-from threading import Lock
+from threading import Lock, Thread, Event
+from cache_utils import LRUCache, KeyedLRUCache, PersistentCache, start_expiry_sweeper
+from metrics_utils import record_persistence_write
+from rule_utils import CompiledRuleSet, amount_to_cents
+from merchant_utils import get_normalizer_statistics
 
 logger = logging.getLogger(__name__)
 
@@ -12,131 +16,145 @@ logger = logging.getLogger(__name__)
 TOKEN_FILE = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'tokens.json')
 TRANSACTIONS_FILE = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'transactions.json')
 RULES_FILE = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'rules.json')
+CATEGORIES_FILE = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'categories.json')
+RULE_STATS_FILE = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'rule_stats.json')
+LEDGER_FILE = os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'ledger.json')
 
-class LRUCache:
+# Size above which loading transactions.json logs a warning
+TRANSACTIONS_FILE_WARN_BYTES = 10 * 1024 * 1024
+
+# On-disk cache tier shared by the response and report caches (set PERSISTENT_CACHE_ENABLED=0 to disable)
+PERSISTENT_CACHE_FILE = os.environ.get(
+    'PERSISTENT_CACHE_FILE',
+    os.path.join(os.getcwd(), 'ASB_personal_finance_app', 'logs_and_json', 'cache.sqlite3')
+)
+PERSISTENT_CACHE_ENABLED = os.environ.get('PERSISTENT_CACHE_ENABLED', '1') != '0'
+
+# Seconds between background sweeps of expired cache entries (0 disables sweeping)
+CACHE_SWEEP_INTERVAL = float(os.environ.get('CACHE_SWEEP_INTERVAL', '30'))
+
+# Seconds between background flushes of rule hit statistics (0 flushes only at request end and exit)
+RULE_STATS_FLUSH_INTERVAL = float(os.environ.get('RULE_STATS_FLUSH_INTERVAL', '60'))
+
+# Usage fields kept in the rule statistics store rather than in the rule definitions
+RULE_STAT_FIELDS = ('match_count', 'last_applied')
+
+class DataVersionRegistry:
     """
-    Thread-safe LRU cache with size limits and TTL support.
+    One version counter per data domain (transactions, rules, rule_stats,
+    categories, tokens, ledger).
+    
+    Every save bumps its domain and cache keys embed the versions they were
+    computed from, so a write makes stale entries unreachable immediately and
+    they simply age out. Counters are seeded from the data files' modification
+    times, which keeps versions distinct across restarts for the persistent
+    cache tier.
     """
-    def __init__(self, max_size=1000, ttl_seconds=300):
-        self.max_size = max_size
-        self.ttl_seconds = ttl_seconds
-        self.cache = OrderedDict()
-        self.timestamps = {}
+    def __init__(self, domain_files):
         self.lock = Lock()
-        self.hits = 0
-        self.misses = 0
-    
-    def get(self, key):
-        """Get value from cache if not expired."""
-        with self.lock:
-            if key not in self.cache:
-                self.misses += 1
-                return None
-            
-            # Check expiration
-            if self._is_expired(key):
-                self._remove(key)
-                self.misses += 1
-                return None
-            
-            # Move to end (most recently used)
-            self.cache.move_to_end(key)
-            self.hits += 1
-            return self.cache[key]
-    
-    def set(self, key, value):
-        """Store value in cache with LRU eviction."""
-        with self.lock:
-            # Remove if already exists
-            if key in self.cache:
-                self._remove(key)
-            
-            # Add to cache
-            self.cache[key] = value
-            self.timestamps[key] = time.time()
-            
-            # Evict oldest if over size limit
-            while len(self.cache) > self.max_size:
-                oldest_key = next(iter(self.cache))
-                self._remove(oldest_key)
-                logger.debug(f"Evicted {oldest_key} from cache (size limit)")
+        self.versions = {}
+        for domain, path in domain_files.items():
+            try:
+                self.versions[domain] = os.stat(path).st_mtime_ns
+            except OSError:
+                self.versions[domain] = 0
     
-    def delete(self, key):
-        """Remove key from cache."""
+    def get(self, domain):
         with self.lock:
-            self._remove(key)
+            return self.versions[domain]
     
-    def clear(self):
-        """Clear all cache entries."""
+    def snapshot(self, *domains):
+        """Get the current versions of several domains as one consistent tuple."""
         with self.lock:
-            self.cache.clear()
-            self.timestamps.clear()
-            logger.info(f"Cache cleared. Stats: {self.hits} hits, {self.misses} misses")
-    
-    def _is_expired(self, key):
-        """Check if cache entry is expired."""
-        if key not in self.timestamps:
-            return True
-        return time.time() - self.timestamps[key] > self.ttl_seconds
+            return tuple(f"{domain}={self.versions[domain]}" for domain in domains)
     
-    def _remove(self, key):
-        """Remove key from cache and timestamps."""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.timestamps:
-            del self.timestamps[key]
-    
-    def get_stats(self):
-        """Get cache statistics."""
+    def bump(self, domain):
+        """Advance a domain's version and return the new value."""
         with self.lock:
-            total_requests = self.hits + self.misses
-            hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
-            return {
-                'size': len(self.cache),
-                'max_size': self.max_size,
-                'hits': self.hits,
-                'misses': self.misses,
-                'hit_rate': hit_rate
-            }
-
-class KeyedLRUCache(LRUCache):
-    """
-    LRU cache with support for multiple keys per cache entry.
+            # Never move backwards relative to the seeded file times
+            self.versions[domain] = max(self.versions[domain] + 1, time.time_ns())
+            return self.versions[domain]
+
+_data_versions = DataVersionRegistry({
+    'transactions': TRANSACTIONS_FILE,
+    'rules': RULES_FILE,
+    'rule_stats': RULE_STATS_FILE,
+    'categories': CATEGORIES_FILE,
+    'tokens': TOKEN_FILE,
+    'ledger': LEDGER_FILE
+})
+
+def get_data_version(domain):
+    """Get the current version of a data domain."""
+    return _data_versions.get(domain)
+
+def get_data_versions(*domains):
+    """Get the current versions of several data domains, for embedding in cache keys."""
+    return _data_versions.snapshot(*domains)
+
+def bump_data_version(domain):
+    """Mark a data domain as changed, invalidating every cache key built from it."""
+    version = _data_versions.bump(domain)
+    # Entries keyed on the old version are unreachable now; free their slots for the new keys
+    for cache, domains in _version_keyed_caches:
+        if domain in domains:
+            cache.drop_memory()
+    return version
+
+class PlaidRecord(dict):
     """
-    def __init__(self, max_size=1000, ttl_seconds=300):
-        super().__init__(max_size, ttl_seconds)
-    
-    def get(self, primary_key, secondary_key=None):
-        """Get value with optional secondary key."""
-        if secondary_key is None:
-            return super().get(primary_key)
-        
-        composite_key = f"{primary_key}:{secondary_key}"
-        return super().get(composite_key)
+    Plain, picklable copy of a Plaid model object.
     
-    def set(self, primary_key, value, secondary_key=None):
-        """Set value with optional secondary key."""
-        if secondary_key is None:
-            return super().set(primary_key, value)
-        
-        composite_key = f"{primary_key}:{secondary_key}"
-        return super().set(composite_key, value)
+    Supports both tx['field'] and tx.field access like the Plaid models do,
+    so cached responses can be used wherever live responses were.
+    """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
     
-    def delete_pattern(self, pattern):
-        """Delete all keys matching pattern."""
-        with self.lock:
-            keys_to_delete = [k for k in self.cache if pattern in k]
-            for key in keys_to_delete:
-                self._remove(key)
-            return len(keys_to_delete)
+    def to_dict(self):
+        return dict(self)
+
+def _open_persistent_cache():
+    """Open the on-disk cache tier, or return None if it is disabled or unusable."""
+    if not PERSISTENT_CACHE_ENABLED:
+        return None
+    try:
+        return PersistentCache(PERSISTENT_CACHE_FILE, max_bytes=512 * MB)
+    except Exception as e:
+        logger.error(f"Persistent cache unavailable, continuing with memory caches only: {str(e)}")
+        return None
 
 # Initialize caches with appropriate sizes and TTLs
-_access_token_cache = LRUCache(max_size=10, ttl_seconds=3600)  # 1 hour
-_saved_transactions_cache = LRUCache(max_size=100, ttl_seconds=600)  # 10 minutes
-_account_names_cache = LRUCache(max_size=50, ttl_seconds=1800)  # 30 minutes
-_transaction_cache = KeyedLRUCache(max_size=500, ttl_seconds=300)  # 5 minutes
-_category_counts_cache = LRUCache(max_size=50, ttl_seconds=300)  # 5 minutes
-_rules_cache = LRUCache(max_size=100, ttl_seconds=600)  # 10 minutes
+# Byte budgets bound memory use; full-history results can be very large
+MB = 1024 * 1024
+_persistent_cache = _open_persistent_cache()
+_access_token_cache = LRUCache(max_size=10, ttl_seconds=3600, max_bytes=1 * MB, shards=1)  # 1 hour
+_saved_transactions_cache = LRUCache(max_size=100, ttl_seconds=600, max_bytes=64 * MB, shards=1)  # 10 minutes
+_account_names_cache = LRUCache(max_size=50, ttl_seconds=1800, max_bytes=4 * MB, shards=2)  # 30 minutes
+# TinyLFU admission keeps one-shot keys from month scans and deep paging from evicting the hot default view
+_transaction_cache = KeyedLRUCache(max_size=500, ttl_seconds=300, max_bytes=256 * MB, shards=4,
+                                   persistent=_persistent_cache, namespace='transactions',
+                                   admission='tinylfu')  # 5 minutes
+_category_counts_cache = LRUCache(max_size=50, ttl_seconds=300, max_bytes=8 * MB, shards=2,
+                                  persistent=_persistent_cache, namespace='category_counts')  # 5 minutes
+_rules_cache = LRUCache(max_size=100, ttl_seconds=600, max_bytes=16 * MB, shards=1)  # 10 minutes
+_plaid_transactions_cache = LRUCache(max_size=50, ttl_seconds=900, max_bytes=256 * MB, shards=2,
+                                     persistent=_persistent_cache, namespace='plaid_transactions')  # 15 minutes
+
+# Caches whose keys embed these data versions (see app.get_transactions and get_category_counts)
+_version_keyed_caches = [
+    (_transaction_cache, ('transactions', 'rules', 'tokens', 'ledger')),
+    (_category_counts_cache, ('transactions', 'rules', 'categories', 'tokens', 'ledger'))
+]
+
+# Reclaim expired entries in the background instead of waiting for them to be read
+_cache_sweeper = start_expiry_sweeper([
+    _access_token_cache, _saved_transactions_cache, _account_names_cache, _transaction_cache,
+    _category_counts_cache, _rules_cache, _plaid_transactions_cache, _persistent_cache
+], CACHE_SWEEP_INTERVAL)
 
 # Add cache statistics endpoint
 def get_cache_statistics():
@@ -147,7 +165,10 @@ def get_cache_statistics():
         'account_names': _account_names_cache.get_stats(),
         'transactions': _transaction_cache.get_stats(),
         'category_counts': _category_counts_cache.get_stats(),
-        'rules': _rules_cache.get_stats()
+        'rules': _rules_cache.get_stats(),
+        'plaid_transactions': _plaid_transactions_cache.get_stats(),
+        'merchant_normalizer': get_normalizer_statistics(),
+        **({'persistent': _persistent_cache.get_stats()} if _persistent_cache else {})
     }
 
 def load_access_token():
@@ -174,10 +195,13 @@ def save_access_token(access_token):
     Save the Plaid access token to cache and file.
     """
     _access_token_cache.set('access_token', access_token)
+    bump_data_version('tokens')
     try:
         os.makedirs(os.path.dirname(TOKEN_FILE), exist_ok=True)
+        payload = json.dumps({'access_token': access_token})
         with open(TOKEN_FILE, 'w') as f:
-            json.dump({'access_token': access_token}, f)
+            f.write(payload)
+        record_persistence_write('tokens', len(payload))
         return True
     except Exception as e:
         logger.error(f"Error saving access token: {str(e)}")
@@ -191,11 +215,11 @@ def load_saved_transactions():
         
     if os.path.exists(TRANSACTIONS_FILE):
         try:
-            # Validate file size (prevent DoS)
+            # The file only holds what this app wrote, so a large one is still loaded:
+            # returning nothing here would drop every edit on the next save
             file_size = os.path.getsize(TRANSACTIONS_FILE)
-            if file_size > 10 * 1024 * 1024:  # 10MB limit
-                logger.error(f"Transaction file too large: {file_size} bytes")
-                return {}
+            if file_size > TRANSACTIONS_FILE_WARN_BYTES:
+                logger.warning(f"Transaction file is unusually large: {file_size} bytes")
             
             with open(TRANSACTIONS_FILE, 'r') as f:
                 transactions = json.load(f)
@@ -210,6 +234,14 @@ def load_saved_transactions():
                 if not isinstance(tx_data, dict):
                     logger.warning(f"Removing invalid transaction: {tx_id}")
                     del transactions[tx_id]
+                elif 'amount' in tx_data:
+                    # Older files stored dollar floats; amounts are now integer cents
+                    amount = tx_data.pop('amount')
+                    try:
+                        tx_data['amount_cents'] = amount_to_cents(amount)
+                    except (ValueError, TypeError):
+                        logger.warning(f"Invalid amount {amount} in transaction {tx_id}; using 0")
+                        tx_data['amount_cents'] = 0
                     
             _saved_transactions_cache.set('saved_transactions', transactions)
             return transactions
@@ -232,16 +264,19 @@ def save_transactions(transactions):
         return False
     
     _saved_transactions_cache.set('saved_transactions', transactions)
+    bump_data_version('transactions')
     try:
         os.makedirs(os.path.dirname(TRANSACTIONS_FILE), exist_ok=True)
         
         # Write to temp file first
         temp_file = TRANSACTIONS_FILE + '.tmp'
+        payload = json.dumps(transactions)
         with open(temp_file, 'w') as f:
-            json.dump(transactions, f)
+            f.write(payload)
         
         # Atomic rename
         os.replace(temp_file, TRANSACTIONS_FILE)
+        record_persistence_write('transactions', len(payload))
         return True
     except Exception as e:
         logger.error(f"Error saving transactions: {str(e)}")
@@ -269,196 +304,228 @@ def load_rules():
 def save_rules(rules):
     """
     Save transaction categorization rules to cache and file.
+    
+    Only the rule definitions are written; usage statistics live in the
+    rule statistics store, which is loaded first so the usage fields older
+    rules.json files carried are not stripped before it has read them.
     """
+    _rule_stats.load()
     _rules_cache.set('rules', rules)  # Use 'rules' as key, rules as value
+    bump_data_version('rules')
     try:
         os.makedirs(os.path.dirname(RULES_FILE), exist_ok=True)
+        definitions = {
+            rule_id: {k: v for k, v in rule.items() if k not in RULE_STAT_FIELDS}
+            for rule_id, rule in rules.items()
+        }
+        payload = json.dumps(definitions)
         with open(RULES_FILE, 'w') as f:
-            json.dump(rules, f)
+            f.write(payload)
+        record_persistence_write('rules', len(payload))
         return True
     except Exception as e:
         logger.error(f"Error saving rules: {str(e)}")
         return False
 
-def apply_rules_to_transaction(tx_data, rules=None, original_category=None, original_subcategory=None):
+def start_periodic_flush(flush, interval_seconds, name):
+    """Call flush every interval_seconds from a daemon thread. Returns None when interval_seconds is not positive."""
+    if not interval_seconds or interval_seconds <= 0:
+        return None
+    stop_event = Event()
+    
+    def run():
+        while not stop_event.wait(interval_seconds):
+            flush()
+    
+    thread = Thread(target=run, name=name, daemon=True)
+    thread.stop_event = stop_event
+    thread.start()
+    return thread
+
+class RuleStatsStore:
     """
-    Apply matching rules to a transaction. Returns True if a rule was applied.
+    In-memory rule hit counters that are written to disk in batches.
     
-    Args:
-        tx_data (dict): Transaction data to categorize
-        rules (dict, optional): Rules dictionary, loaded if not provided
-        original_category (str, optional): Original transaction category for selective matching
-        original_subcategory (str, optional): Original transaction subcategory for selective matching
-        
-    Returns:
-        bool: True if a rule was applied, False otherwise
+    Matching a rule only updates memory. The counters are flushed to
+    rule_stats.json, separate from the rule definitions, by a background
+    thread, at the end of write requests and at exit. Reads therefore never
+    write to disk. On first use without a stats file, the store is seeded
+    from the usage fields older rules.json files carried.
     """
-    if rules is None:
-        rules = load_rules()
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.stats = None
+        self.dirty = False
     
-    if not rules or not tx_data:
-        return False
+    def _ensure_loaded(self):
+        """Load counters from file on first use. Caller must hold the lock."""
+        if self.stats is not None:
+            return
+        self.stats = {}
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.stats = json.load(f)
+            elif os.path.exists(RULES_FILE):
+                with open(RULES_FILE, 'r') as f:
+                    for rule_id, rule in json.load(f).items():
+                        if rule.get('match_count') or rule.get('last_applied'):
+                            self.stats[rule_id] = {
+                                'match_count': rule.get('match_count', 0),
+                                'last_applied': rule.get('last_applied')
+                            }
+                self.dirty = bool(self.stats)
+        except Exception as e:
+            logger.error(f"Error loading rule statistics: {str(e)}")
     
-    # Get transaction fields for matching
-    tx_description = tx_data.get('merchant', '').lower().strip()
-    try:
-        tx_amount = abs(float(tx_data.get('amount', 0)))
-    except (ValueError, TypeError):
-        logger.warning(f"Invalid amount in transaction: {tx_data.get('amount')}")
-        tx_amount = 0
+    def load(self):
+        """Load the counters now, writing any seeded from rules.json straight to disk."""
+        with self.lock:
+            if self.stats is not None:
+                return
+            self._ensure_loaded()
+            seeded = self.dirty
+        if seeded:
+            self.flush()
     
-    # If no original category is provided, use the current category as original
-    if original_category is None:
-        original_category = tx_data.get('category', '')
+    def record(self, rule_id, count=1, when=None):
+        """Add count matches for a rule."""
+        if count <= 0:
+            return
+        with self.lock:
+            self._ensure_loaded()
+            entry = self.stats.setdefault(rule_id, {'match_count': 0, 'last_applied': None})
+            entry['match_count'] = entry.get('match_count', 0) + count
+            entry['last_applied'] = when or datetime.datetime.now().isoformat()
+            self.dirty = True
+        bump_data_version('rule_stats')
     
-    if original_subcategory is None:
-        original_subcategory = tx_data.get('subcategory', '')
+    def forget(self, rule_id):
+        """Drop the counters of a deleted rule."""
+        with self.lock:
+            self._ensure_loaded()
+            if self.stats.pop(rule_id, None) is not None:
+                self.dirty = True
+        bump_data_version('rule_stats')
     
-    # Sort rules by specificity (more specific rules first)
-    sorted_rules = sorted(
-        rules.items(), 
-        key=lambda x: (
-            1 if x[1].get('original_category') else 0,
-            1 if x[1].get('original_subcategory') else 0,
-            1 if x[1].get('match_description', True) else 0,
-            1 if x[1].get('match_amount', False) else 0
-        ),
-        reverse=True
-    )
+    def overlay(self, rules):
+        """Return a copy of rules with each rule's usage fields filled in from the store."""
+        with self.lock:
+            self._ensure_loaded()
+            result = {}
+            for rule_id, rule in rules.items():
+                entry = self.stats.get(rule_id, {})
+                result[rule_id] = {
+                    **rule,
+                    'match_count': entry.get('match_count', 0),
+                    'last_applied': entry.get('last_applied')
+                }
+            return result
     
-    for rule_id, rule in sorted_rules:
-        try:
-            # Skip inactive rules
-            if not rule.get('active', True):
-                continue
-            
-            # Check original category match (if specified in rule)
-            if rule.get('original_category') and rule.get('original_category') != original_category:
-                continue
-            
-            # Check original subcategory match (if specified in rule)
-            if rule.get('original_subcategory') and rule.get('original_subcategory') != original_subcategory:
-                continue
-                
-            # Check description match (if enabled)
-            if rule.get('match_description', True):
-                rule_description = rule.get('description', '').lower().strip()
-                if not rule_description or rule_description not in tx_description:
-                    continue
-            
-            # Check amount match (if enabled)
-            if rule.get('match_amount', False):
-                try:
-                    rule_amount = abs(float(rule.get('amount', 0)))
-                    if rule_amount != tx_amount:
-                        continue
-                except (ValueError, TypeError):
-                    logger.warning(f"Invalid amount in rule {rule_id}: {rule.get('amount')}")
-                    continue
-                    
-            # We have a match - apply the rule
-            tx_data['category'] = rule.get('category', 'Uncategorized')
-            tx_data['subcategory'] = rule.get('subcategory', '')
-            
-            # Update rule stats
-            now = datetime.datetime.now().isoformat()
-            rules[rule_id]['last_applied'] = now
-            rules[rule_id]['match_count'] = rules[rule_id].get('match_count', 0) + 1
+    def flush(self):
+        """Write the counters to disk if they changed. Returns True if a write happened."""
+        with self.lock:
+            if not self.dirty:
+                return False
             try:
-                save_rules(rules)
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                payload = json.dumps(self.stats)
+                temp_file = self.path + '.tmp'
+                with open(temp_file, 'w') as f:
+                    f.write(payload)
+                os.replace(temp_file, self.path)
+                self.dirty = False
             except Exception as e:
-                logger.error(f"Error updating rule stats: {str(e)}")
-                
-            return True
-        except Exception as e:
-            logger.error(f"Error applying rule {rule_id}: {str(e)}")
-            continue
-        
-    return False
-
-def apply_rule_to_past_transactions(rule_id, rule, ignore_original_category=True):
-    """Apply a rule to all past transactions that match"""
-    # Load saved transactions
-    transactions = load_saved_transactions()
-    modified_count = 0
-    
-    # Get rule criteria
-    rule_description = rule.get('description', '').lower().strip()
-    rule_amount = None
-    if rule.get('match_amount', False) and rule.get('amount') is not None:
-        try:
-            rule_amount = abs(float(rule.get('amount')))
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error converting rule amount: {str(e)}")
-            return 0
-    
-    # Get original category criteria
-    original_category = rule.get('original_category', '')
-    original_subcategory = rule.get('original_subcategory', '')
+                logger.error(f"Error saving rule statistics: {str(e)}")
+                return False
+        record_persistence_write('rule_stats', len(payload))
+        return True
     
-    # Apply to matching transactions
-    for tx_id, tx_data in transactions.items():
-        try:
-            # Skip deleted transactions
-            if tx_data.get('deleted', False):
-                continue
-                
-            # Check original category match (if specified and not ignoring)
-            # When manually running rules, we ignore original_category to match all transactions
-            if not ignore_original_category and original_category:
-                tx_category = tx_data.get('category', '')
-                if tx_category != original_category:
-                    continue
-                    
-            # Check original subcategory match (if specified and not ignoring)
-            if not ignore_original_category and original_subcategory:
-                tx_subcategory = tx_data.get('subcategory', '')
-                if tx_subcategory != original_subcategory:
-                    continue
-                
-            # Get transaction fields for matching
-            tx_description = tx_data.get('merchant', '').lower().strip()
-            
-            # Skip if description doesn't match (when enabled)
-            if rule.get('match_description', True) and (not rule_description or rule_description not in tx_description):
-                continue
-            
-            # Check amount match if required
-            if rule.get('match_amount', False) and rule_amount is not None:
-                try:
-                    tx_amount = abs(float(tx_data.get('amount', 0)))
-                    if tx_amount != rule_amount:
-                        continue
-                except (ValueError, TypeError) as e:
-                    logger.error(f"Error converting transaction amount for {tx_id}: {str(e)}")
-                    continue
-            
-            # Apply the rule
-            tx_data['category'] = rule.get('category')
-            tx_data['subcategory'] = rule.get('subcategory', '')
-            modified_count += 1
-        except Exception as e:
-            logger.error(f"Error applying rule to transaction {tx_id}: {str(e)}")
-            continue
+    def start_flusher(self, interval_seconds):
+        """Flush periodically from a daemon thread. Returns None when interval_seconds is not positive."""
+        return start_periodic_flush(self.flush, interval_seconds, 'rule-stats-flusher')
+
+_rule_stats = RuleStatsStore(RULE_STATS_FILE)
+_rule_stats_flusher = _rule_stats.start_flusher(RULE_STATS_FLUSH_INTERVAL)
+atexit.register(_rule_stats.flush)
+
+def record_rule_match(rule_id, count=1):
+    """Count matches for a rule in memory; they reach disk on the next flush."""
+    _rule_stats.record(rule_id, count)
+
+def forget_rule_stats(rule_id):
+    """Drop the usage statistics of a deleted rule."""
+    _rule_stats.forget(rule_id)
+
+def get_rules_with_stats(rules=None):
+    """Get a copy of the rules with match_count and last_applied from the statistics store."""
+    if rules is None:
+        rules = load_rules()
+    return _rule_stats.overlay(rules)
+
+def flush_rule_stats():
+    """Write pending rule statistics to disk."""
+    return _rule_stats.flush()
+
+def load_categories():
+    """
+    Load the category list from file.
     
-    # Save transactions if any were modified
-    if modified_count > 0:
-        try:
-            save_transactions(transactions)
-            
-            # Update rule usage statistics
-            rules = load_rules()
-            if rule_id in rules:
-                rules[rule_id]['last_applied'] = datetime.datetime.now().isoformat()
-                rules[rule_id]['match_count'] = rules[rule_id].get('match_count', 0) + modified_count
-                save_rules(rules)
-                
-        except Exception as e:
-            logger.error(f"Error saving transactions after applying rule: {str(e)}")
-            return 0
-        
-    logger.info(f"Applied rule {rule_id} to {modified_count} past transactions")
-    return modified_count
+    Read errors are raised rather than swallowed so that callers never
+    overwrite an unreadable file with an empty list.
+    """
+    if not os.path.exists(CATEGORIES_FILE):
+        return []
+    with open(CATEGORIES_FILE, 'r') as f:
+        return json.load(f)
+
+def save_categories(categories):
+    """
+    Save the category list to file, replacing it atomically.
+    """
+    bump_data_version('categories')
+    os.makedirs(os.path.dirname(CATEGORIES_FILE), exist_ok=True)
+    payload = json.dumps(categories)
+    temp_file = CATEGORIES_FILE + '.tmp'
+    with open(temp_file, 'w') as f:
+        f.write(payload)
+    os.replace(temp_file, CATEGORIES_FILE)
+    record_persistence_write('categories', len(payload))
+    return True
+
+# Compiled rule set for the current rules version, rebuilt only when the rules change
+_compiled_rules_lock = Lock()
+_compiled_rules_state = {'version': None, 'rules': None, 'compiled': None}
+
+def get_compiled_rules(rules=None):
+    """
+    Return the CompiledRuleSet for a rules dict, loading the rules if not provided.
+
+    The compiled set is reused until the rules version changes or a
+    different rules dict is passed in.
+    """
+    if rules is None:
+        rules = load_rules()
+    version = get_data_version('rules')
+    with _compiled_rules_lock:
+        state = _compiled_rules_state
+        if state['rules'] is rules and state['version'] == version:
+            return state['compiled']
+    compiled = CompiledRuleSet(rules)
+    with _compiled_rules_lock:
+        _compiled_rules_state.update(version=version, rules=rules, compiled=compiled)
+    return compiled
+
+def transaction_iso_date(tx_data):
+    """A transaction's date as YYYY-MM-DD for rule date windows, or None if it has no usable date."""
+    raw_date = tx_data.get('raw_date') or tx_data.get('date')
+    if not raw_date:
+        return None
+    try:
+        return parse_date(raw_date).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
 
 def parse_date(date_str):
     """
@@ -485,6 +552,13 @@ def parse_date(date_str):
     if not date_str:
         raise ValueError("Empty date string")
     
+    # Stored dates are ISO; parse them without walking the format list
+    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
+        try:
+            return datetime.date.fromisoformat(date_str)
+        except ValueError:
+            pass
+    
     # Try different formats
     formats = [
         # ISO format variations
@@ -0,0 +1,892 @@
+import os
+import json
+import atexit
+import logging
+from threading import Lock
+from data_utils import (
+    load_saved_transactions, save_transactions, load_rules, get_compiled_rules, get_data_version,
+    bump_data_version, record_rule_match, transaction_iso_date, start_periodic_flush, RULE_STAT_FIELDS,
+    LEDGER_FILE
+)
+from metrics_utils import record_persistence_write
+from rule_utils import CompiledRule, CompiledRuleSet, run_bulk, find_rule_conflicts
+from merchant_utils import normalize_merchant
+from money_utils import to_cents, cents_to_amount
+
+logger = logging.getLogger(__name__)
+
+# Bump when the entry layout changes; older ledgers are discarded and rebuilt from Plaid
+LEDGER_SCHEMA_VERSION = 4
+
+# Seconds between background writes of ledger changes (0 writes only at write-request end and exit)
+LEDGER_FLUSH_INTERVAL = float(os.environ.get('LEDGER_FLUSH_INTERVAL', '60'))
+
+def _plaid_field(tx, name, default=None):
+    """Read a field from a Plaid record or model object."""
+    value = tx.get(name, default) if isinstance(tx, dict) else getattr(tx, name, default)
+    return default if value is None else value
+
+def _rule_inputs(entry, mods):
+    """
+    The fields rules are matched on, after saved modifications are applied.
+
+    Returns [merchant, amount in cents, category, subcategory,
+    has_saved_category, account_id, date]. Rules never apply automatically
+    to a transaction whose category was set by hand or by running a rule.
+    """
+    return [
+        mods.get('merchant', entry['merchant']),
+        mods.get('amount_cents', entry['amount_cents']),
+        entry['category'],
+        mods.get('subcategory', entry['subcategory']),
+        'category' in mods or bool(entry.get('applied')),
+        mods.get('account_id', entry['account_id']),
+        mods.get('date', entry['raw_date'])
+    ]
+
+def _current_category(entry, mods):
+    """The (category, subcategory) a transaction currently shows, as get_transactions builds it."""
+    if 'category' in mods:
+        return mods['category'], mods.get('subcategory', '')
+    if entry.get('applied'):
+        return entry['applied'][1], entry['applied'][2]
+    if entry.get('rule_id'):
+        return entry['rule_category'], entry['rule_subcategory']
+    return entry['category'], mods.get('subcategory', entry['subcategory'])
+
+def _rule_definitions(rules):
+    """Rule definitions without usage statistics, for detecting which rules changed."""
+    return {
+        rule_id: {k: v for k, v in rule.items() if k not in RULE_STAT_FIELDS}
+        for rule_id, rule in rules.items()
+    }
+
+class TransactionLedger:
+    """
+    Plaid-origin transactions with their rule-derived categories.
+
+    Transactions are categorized when they are ingested from Plaid, and each
+    entry records the rule that matched and the rules version it was computed
+    under. Reads just look the result up. Categories set by running a rule
+    over past transactions are kept on the entry as 'applied'
+    ([rule_id, category, subcategory]) rather than as saved modifications,
+    and survive the ledger being rebuilt. When the rules change, only the
+    entries whose match could change are recomputed: those whose matching
+    rule changed, plus those the changed rules can now match, found through
+    the merchant and amount indexes.
+
+    Changes are kept in memory and written to ledger.json in batches, like
+    rule statistics: by a background thread, at the end of write requests
+    and at exit. GET requests that ingest from Plaid or catch up with rule
+    changes therefore never write to disk. The ledger can be rebuilt from
+    Plaid; only rule-run categories cannot, and those come from write
+    requests.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        self.entries = None
+        self.rules_version = None
+        self.rule_definitions = {}
+        # Normalized effective merchant -> tx ids, and amount in cents -> tx ids
+        self.merchant_index = {}
+        self.amount_index = {}
+        # Entries added or recomputed since listeners were last told
+        self.changed_ids = set()
+        # Applied categories from a discarded ledger, restored when their transaction is ingested again
+        self.carried_applied = {}
+        # Changes not yet written to disk; see flush()
+        self.dirty = False
+
+    def _ensure_loaded(self):
+        """Load the ledger from file on first use. Caller must hold the lock."""
+        if self.entries is not None:
+            return
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                self.carried_applied = data.get('carried_applied', {})
+                if data.get('schema_version') == LEDGER_SCHEMA_VERSION:
+                    self.entries = data.get('entries', {})
+                    self.rules_version = data.get('rules_version')
+                    self.rule_definitions = data.get('rule_definitions', {})
+                else:
+                    logger.info("Transaction ledger format changed; rebuilding it from Plaid")
+                    for tx_id, entry in data.get('entries', {}).items():
+                        if isinstance(entry, dict) and entry.get('applied'):
+                            self.carried_applied[tx_id] = entry['applied']
+            except Exception as e:
+                logger.error(f"Error loading transaction ledger: {str(e)}")
+        for tx_id, entry in self.entries.items():
+            self._index(tx_id, entry)
+
+    def _index(self, tx_id, entry):
+        merchant_key = normalize_merchant(entry['inputs'][0])
+        self.merchant_index.setdefault(merchant_key, set()).add(tx_id)
+        self.amount_index.setdefault(entry['inputs'][1], set()).add(tx_id)
+
+    def _unindex(self, tx_id, entry):
+        merchant_key = normalize_merchant(entry['inputs'][0])
+        ids = self.merchant_index.get(merchant_key)
+        if ids is not None:
+            ids.discard(tx_id)
+            if not ids:
+                del self.merchant_index[merchant_key]
+        cents = entry['inputs'][1]
+        ids = self.amount_index.get(cents)
+        if ids is not None:
+            ids.discard(tx_id)
+            if not ids:
+                del self.amount_index[cents]
+
+    @staticmethod
+    def _match_row(entry):
+        """The normalized first-match row for an entry, or None if its category was set by hand."""
+        merchant, cents, category, subcategory, has_saved_category, account_id, tx_date = entry['inputs']
+        if has_saved_category:
+            return None
+        return (normalize_merchant(merchant), cents, category, subcategory, account_id, tx_date, merchant or '')
+
+    @staticmethod
+    def _set_match(entry, compiled, rules_version):
+        """Store an entry's matching rule. Returns True if its rule changed."""
+        previous_rule_id = entry.get('rule_id')
+        entry['rules_version'] = rules_version
+        if compiled is None:
+            entry['rule_id'] = None
+            entry['rule_category'] = None
+            entry['rule_subcategory'] = None
+        else:
+            entry['rule_id'] = compiled.rule_id
+            entry['rule_category'] = compiled.rule.get('category', 'Uncategorized')
+            entry['rule_subcategory'] = compiled.rule.get('subcategory', '')
+
+        if entry['rule_id'] != previous_rule_id:
+            if entry['rule_id'] is not None:
+                record_rule_match(entry['rule_id'])
+            return True
+        return False
+
+    def _categorize(self, tx_id, entry, compiled_rules, rules_version):
+        """Recompute one entry's rule match. Returns True if its rule changed."""
+        self.changed_ids.add(tx_id)
+        row = self._match_row(entry)
+        compiled = compiled_rules.match(*row) if row is not None else None
+        return self._set_match(entry, compiled, rules_version)
+
+    def _categorize_many(self, tx_ids, compiled_rules, rules_version):
+        """Recompute the rule match of many entries, in worker processes when there are enough."""
+        self.changed_ids.update(tx_ids)
+        matchable_ids = []
+        rows = []
+        for tx_id in tx_ids:
+            row = self._match_row(self.entries[tx_id])
+            if row is None:
+                self._set_match(self.entries[tx_id], None, rules_version)
+            else:
+                matchable_ids.append(tx_id)
+                rows.append(row)
+        for tx_id, rule_id in zip(matchable_ids, run_bulk(compiled_rules, rows)):
+            compiled = compiled_rules.get(rule_id) if rule_id is not None else None
+            self._set_match(self.entries[tx_id], compiled, rules_version)
+
+    def _set_inputs(self, tx_id, entry, inputs):
+        """Replace an entry's effective inputs, keeping the indexes in step."""
+        self.changed_ids.add(tx_id)
+        if 'inputs' in entry:
+            self._unindex(tx_id, entry)
+        entry['inputs'] = list(inputs)
+        self._index(tx_id, entry)
+
+    def _sync_rules(self, rules):
+        """
+        Bring every entry up to the current rules version. Caller must hold the lock.
+
+        Returns the number of entries recomputed.
+        """
+        rules_version = get_data_version('rules')
+        if self.rules_version == rules_version:
+            return 0
+
+        compiled_rules = get_compiled_rules(rules)
+        definitions = _rule_definitions(rules)
+        changed_ids = {
+            rule_id for rule_id in set(definitions) | set(self.rule_definitions)
+            if definitions.get(rule_id) != self.rule_definitions.get(rule_id)
+        }
+
+        if self.rules_version is None:
+            affected = set(self.entries)
+        else:
+            # Entries whose matching rule changed or went away
+            affected = {tx_id for tx_id, entry in self.entries.items() if entry.get('rule_id') in changed_ids}
+
+            # Entries the changed rules can now match, found through the indexes
+            changed = CompiledRuleSet({rule_id: rules[rule_id] for rule_id in changed_ids if rule_id in rules})
+            if changed.unconditional:
+                affected = set(self.entries)
+            else:
+                if changed.pattern_ranks:
+                    for merchant_key, tx_ids in self.merchant_index.items():
+                        if any(changed.ordered[rank].matches_description(merchant_key)
+                               for rank in changed.description_candidates(merchant_key)):
+                            affected.update(tx_ids)
+                # Regex rules run on the raw merchant, which the index does not hold
+                if changed.regex_ranks:
+                    for tx_id, entry in self.entries.items():
+                        if any(changed.ordered[rank].matches_description('', entry['inputs'][0] or '')
+                               for rank in changed.regex_ranks):
+                            affected.add(tx_id)
+                for cents in changed.amount_index:
+                    affected.update(self.amount_index.get(cents, ()))
+
+        self._categorize_many(affected, compiled_rules, rules_version)
+
+        self.rules_version = rules_version
+        self.rule_definitions = definitions
+        logger.info(f"Ledger recomputed {len(affected)} of {len(self.entries)} transactions for {len(changed_ids)} changed rules")
+        return len(affected)
+
+    def flush(self):
+        """Write the ledger to disk if it changed. Returns True if a write happened."""
+        with self.lock:
+            if not self.dirty:
+                return False
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                payload = json.dumps({
+                    'schema_version': LEDGER_SCHEMA_VERSION,
+                    'rules_version': self.rules_version,
+                    'rule_definitions': self.rule_definitions,
+                    'carried_applied': self.carried_applied,
+                    'entries': self.entries
+                })
+                temp_file = self.path + '.tmp'
+                with open(temp_file, 'w') as f:
+                    f.write(payload)
+                os.replace(temp_file, self.path)
+                self.dirty = False
+            except Exception as e:
+                logger.error(f"Error saving transaction ledger: {str(e)}")
+                return False
+        record_persistence_write('ledger', len(payload))
+        return True
+
+    def ingest(self, plaid_txs, start_date=None, end_date=None):
+        """
+        Add or update Plaid transactions and categorize any that are new or changed.
+
+        When start_date and end_date are given, plaid_txs is taken to be the
+        complete response for that range: entries dated in the range that
+        it no longer contains are removed. Plaid replaces a pending
+        transaction with a posted one under a new ID, and an unlinked item's
+        transactions stop being returned. Returns the number of entries that
+        were added, recomputed or removed.
+        """
+        rules = load_rules()
+        modifications = load_saved_transactions()
+        with self.lock:
+            self._ensure_loaded()
+            changed = self._sync_rules(rules)
+            compiled_rules = get_compiled_rules(rules)
+            rules_version = self.rules_version
+
+            updated_ids = []
+            seen_ids = set()
+            for tx in plaid_txs:
+                if tx is None:
+                    continue
+                tx_id = _plaid_field(tx, 'transaction_id')
+                if not tx_id:
+                    continue
+                seen_ids.add(tx_id)
+
+                tx_date = _plaid_field(tx, 'date')
+                raw_cents = to_cents(_plaid_field(tx, 'amount', 0))
+                category = _plaid_field(tx, 'category') or ['Uncategorized']
+                record = {
+                    'raw_date': tx_date.strftime("%Y-%m-%d") if hasattr(tx_date, 'strftime') else str(tx_date),
+                    'amount_cents': abs(raw_cents),
+                    'is_debit': raw_cents > 0,
+                    'merchant': _plaid_field(tx, 'name', 'Unknown'),
+                    'category': category[0],
+                    'subcategory': '',
+                    'account_id': _plaid_field(tx, 'account_id', '')
+                }
+
+                entry = self.entries.get(tx_id)
+                if entry is not None and all(entry.get(k) == v for k, v in record.items()):
+                    continue
+
+                if entry is None and tx_id in self.carried_applied:
+                    record['applied'] = self.carried_applied.pop(tx_id)
+                entry = self.entries.setdefault(tx_id, {})
+                entry.update(record)
+                self._set_inputs(tx_id, entry, _rule_inputs(entry, modifications.get(tx_id, {})))
+                updated_ids.append(tx_id)
+
+            self._categorize_many(updated_ids, compiled_rules, rules_version)
+            updated = len(updated_ids)
+            if start_date is not None and end_date is not None:
+                updated += self._remove_missing(seen_ids, str(start_date), str(end_date))
+            if updated or changed:
+                self.dirty = True
+            return updated
+
+    def _remove_missing(self, seen_ids, start_iso, end_iso):
+        """Remove entries dated start_iso..end_iso that are not in seen_ids. Caller must hold the lock."""
+        removed_ids = [
+            tx_id for tx_id, entry in self.entries.items()
+            if tx_id not in seen_ids and start_iso <= entry['raw_date'] <= end_iso
+        ]
+        for tx_id in removed_ids:
+            self._unindex(tx_id, self.entries.pop(tx_id))
+            self.changed_ids.add(tx_id)
+        if removed_ids:
+            logger.info(f"Removed {len(removed_ids)} ledger transactions Plaid no longer returns")
+        return len(removed_ids)
+
+    def refresh(self, tx_ids):
+        """Recompute entries after their saved modifications changed."""
+        modifications = load_saved_transactions()
+        rules = load_rules()
+        with self.lock:
+            self._ensure_loaded()
+            changed = self._sync_rules(rules)
+            compiled_rules = get_compiled_rules(rules)
+            refreshed = 0
+            for tx_id in tx_ids:
+                entry = self.entries.get(tx_id)
+                if entry is None:
+                    continue
+                inputs = list(_rule_inputs(entry, modifications.get(tx_id, {})))
+                if inputs == entry.get('inputs'):
+                    continue
+                self._set_inputs(tx_id, entry, inputs)
+                self._categorize(tx_id, entry, compiled_rules, self.rules_version)
+                refreshed += 1
+            if refreshed or changed:
+                self.dirty = True
+            return refreshed
+
+    def apply_categories(self, applied, modifications):
+        """
+        Record the categories a rule run gave to entries, as {tx_id: [rule_id, category, subcategory]}.
+
+        modifications must already have any hand-set category of those
+        entries removed. Returns the number of entries updated.
+        """
+        rules = load_rules()
+        with self.lock:
+            self._ensure_loaded()
+            self._sync_rules(rules)
+            compiled_rules = get_compiled_rules(rules)
+            updated = 0
+            for tx_id, result in applied.items():
+                entry = self.entries.get(tx_id)
+                if entry is None:
+                    continue
+                entry['applied'] = list(result)
+                self.changed_ids.add(tx_id)
+                inputs = _rule_inputs(entry, modifications.get(tx_id, {}))
+                if inputs != entry.get('inputs'):
+                    self._set_inputs(tx_id, entry, inputs)
+                    self._categorize(tx_id, entry, compiled_rules, self.rules_version)
+                updated += 1
+            if applied:
+                self.dirty = True
+            return updated
+
+    def rename_applied(self, category, new_category, subcategory=None, new_subcategory=None):
+        """
+        Rename a category, or a subcategory within it, in applied rule-run categories.
+
+        Names are compared case-insensitively. Returns the number of entries renamed.
+        """
+        with self.lock:
+            self._ensure_loaded()
+            renamed = 0
+            for tx_id, entry in self.entries.items():
+                applied = entry.get('applied')
+                if not applied or (applied[1] or '').lower() != category.lower():
+                    continue
+                if subcategory is None:
+                    applied[1] = new_category
+                elif (applied[2] or '').lower() == subcategory.lower():
+                    applied[2] = new_subcategory
+                else:
+                    continue
+                self.changed_ids.add(tx_id)
+                renamed += 1
+            if renamed:
+                self.dirty = True
+            return renamed
+
+    def sync_rules(self):
+        """Recompute the entries affected by rule changes since the last sync."""
+        rules = load_rules()
+        with self.lock:
+            self._ensure_loaded()
+            changed = self._sync_rules(rules)
+            if changed:
+                self.dirty = True
+            return changed
+
+    def find_matches(self, compiled, modifications, ignore_original_category=True):
+        """
+        Find the entries a rule matches without changing anything.
+
+        Candidates come from the merchant index for description rules and
+        from the amount index for amount-only rules, so only the matching
+        rows are touched. Regex rules run on the raw merchant and check
+        every entry. Returns a list of plain transaction dicts that
+        include the current category.
+        """
+        with self.lock:
+            self._ensure_loaded()
+            if compiled.match_description:
+                if not compiled.description:
+                    return []
+                if compiled.match_type == 'exact':
+                    candidate_ids = set(self.merchant_index.get(compiled.description, ()))
+                elif compiled.match_type == 'regex':
+                    candidate_ids = set(self.entries)
+                else:
+                    candidate_ids = set()
+                    for merchant_key, tx_ids in self.merchant_index.items():
+                        if compiled.matches_description(merchant_key):
+                            candidate_ids.update(tx_ids)
+            elif compiled.match_amount and compiled.amount_given:
+                candidate_ids = set(self.amount_index.get(compiled.amount_cents, ()))
+            else:
+                candidate_ids = set(self.entries)
+
+            matches = []
+            for tx_id in candidate_ids:
+                entry = self.entries[tx_id]
+                mods = modifications.get(tx_id, {})
+                if mods.get('deleted', False):
+                    continue
+                merchant, cents, account_id, tx_date = (entry['inputs'][i] for i in (0, 1, 5, 6))
+                if not compiled.matches_past(normalize_merchant(merchant), cents, account_id, tx_date, merchant or ''):
+                    continue
+                category, subcategory = _current_category(entry, mods)
+                if not ignore_original_category:
+                    if compiled.original_category and category != compiled.original_category:
+                        continue
+                    if compiled.original_subcategory and subcategory != compiled.original_subcategory:
+                        continue
+                matches.append({
+                    'id': tx_id,
+                    'raw_date': tx_date,
+                    'merchant': merchant,
+                    'amount': cents_to_amount(cents),
+                    'account_id': account_id,
+                    'category': category,
+                    'subcategory': subcategory,
+                    'manual': False
+                })
+            return matches
+
+    def past_rows(self, modifications):
+        """
+        Match rows for every entry that is not deleted, for running rules over past transactions.
+
+        Returns parallel lists of tx ids and (merchant, cents, account_id, date,
+        raw merchant) rows.
+        """
+        with self.lock:
+            self._ensure_loaded()
+            tx_ids = []
+            rows = []
+            for tx_id, entry in self.entries.items():
+                if modifications.get(tx_id, {}).get('deleted', False):
+                    continue
+                merchant, cents, account_id, tx_date = (entry['inputs'][i] for i in (0, 1, 5, 6))
+                tx_ids.append(tx_id)
+                rows.append((normalize_merchant(merchant), cents, account_id, tx_date, merchant or ''))
+            return tx_ids, rows
+
+    def analysis_rows(self, modifications):
+        """
+        First-match rows for every entry that is not deleted, for rule analysis.
+
+        Entries whose category was set by hand or by a rule run are
+        included: which rules their merchant, amount, account and date
+        match does not depend on how the category was set.
+        """
+        with self.lock:
+            self._ensure_loaded()
+            rows = []
+            for tx_id, entry in self.entries.items():
+                if modifications.get(tx_id, {}).get('deleted', False):
+                    continue
+                merchant, cents, category, subcategory, _, account_id, tx_date = entry['inputs']
+                rows.append((normalize_merchant(merchant), cents, category, subcategory, account_id, tx_date, merchant or ''))
+            return rows
+
+    def get(self, tx_id):
+        """Return the ledger entry for a transaction, or None."""
+        with self.lock:
+            self._ensure_loaded()
+            return self.entries.get(tx_id)
+
+    def has_all(self, tx_ids):
+        """True if every one of tx_ids (empty IDs aside) has an entry."""
+        with self.lock:
+            self._ensure_loaded()
+            return all(tx_id in self.entries for tx_id in tx_ids if tx_id)
+
+    def snapshot(self):
+        """A shallow copy of all entries by transaction ID."""
+        with self.lock:
+            self._ensure_loaded()
+            return dict(self.entries)
+
+    def take_changed(self):
+        """Return and clear the IDs of entries changed since the last call."""
+        with self.lock:
+            changed, self.changed_ids = self.changed_ids, set()
+            return changed
+
+_ledger = TransactionLedger(LEDGER_FILE)
+_ledger_flusher = start_periodic_flush(_ledger.flush, LEDGER_FLUSH_INTERVAL, 'ledger-flusher')
+atexit.register(_ledger.flush)
+
+def flush_ledger():
+    """Write pending ledger changes to disk."""
+    return _ledger.flush()
+
+# Callables told the IDs of ledger entries that were added or recomputed
+_ledger_listeners = []
+
+def add_ledger_listener(callback):
+    """Register callback(tx_ids), called after ledger entries are added or recomputed."""
+    _ledger_listeners.append(callback)
+
+def _publish_ledger_changes():
+    changed = _ledger.take_changed()
+    if not changed:
+        return
+    # Rule-derived categories live only in the ledger, so responses built from it key on this version
+    bump_data_version('ledger')
+    for callback in _ledger_listeners:
+        try:
+            callback(changed)
+        except Exception as e:
+            logger.error(f"Error notifying ledger listener: {str(e)}")
+
+def ingest_plaid_transactions(plaid_txs, start_date=None, end_date=None):
+    """
+    Add fetched Plaid transactions to the ledger, categorizing new and changed ones.
+
+    Pass the request's start_date and end_date only when plaid_txs is the
+    complete response for that range; entries in the range it lacks are removed.
+    """
+    try:
+        return _ledger.ingest(plaid_txs, start_date, end_date)
+    except Exception as e:
+        logger.error(f"Error ingesting transactions into the ledger: {str(e)}")
+        return 0
+    finally:
+        _publish_ledger_changes()
+
+def refresh_ledger_transactions(tx_ids):
+    """Recategorize ledger entries whose saved modifications changed."""
+    try:
+        return _ledger.refresh(tx_ids)
+    except Exception as e:
+        logger.error(f"Error refreshing ledger transactions: {str(e)}")
+        return 0
+    finally:
+        _publish_ledger_changes()
+
+def sync_ledger_rules():
+    """Recompute ledger entries affected by rule changes."""
+    try:
+        return _ledger.sync_rules()
+    except Exception as e:
+        logger.error(f"Error syncing ledger with rules: {str(e)}")
+        return 0
+    finally:
+        _publish_ledger_changes()
+
+def _save_rule_results(transactions, plaid_results, manual_results):
+    """
+    Store the categories a rule run gave to transactions.
+
+    Manual transactions keep their category in transactions.json. Plaid
+    transactions keep it in the ledger, so a broad rule does not write a
+    modification for every transaction it matches; a category set by hand
+    on them is dropped, as the rule run replaces it. Results are
+    {tx_id: [rule_id, category, subcategory]}.
+    """
+    modified = False
+    for tx_id, (_, category, subcategory) in manual_results.items():
+        transactions[tx_id]['category'] = category
+        transactions[tx_id]['subcategory'] = subcategory
+        modified = True
+    for tx_id in plaid_results:
+        mods = transactions.get(tx_id)
+        if mods and ('category' in mods or 'subcategory' in mods):
+            mods.pop('category', None)
+            mods.pop('subcategory', None)
+            if not mods:
+                del transactions[tx_id]
+            modified = True
+    if modified:
+        save_transactions(transactions)
+    try:
+        _ledger.apply_categories(plaid_results, transactions)
+    finally:
+        _publish_ledger_changes()
+
+def rename_applied_category(category, new_category, subcategory=None, new_subcategory=None):
+    """Rename a category or subcategory in the categories rule runs gave to Plaid transactions."""
+    try:
+        return _ledger.rename_applied(category, new_category, subcategory, new_subcategory)
+    except Exception as e:
+        logger.error(f"Error renaming categories in the ledger: {str(e)}")
+        return 0
+    finally:
+        _publish_ledger_changes()
+
+def get_ledger_entry(tx_id):
+    """Return the ledger entry for a transaction, or None if it was never ingested."""
+    return _ledger.get(tx_id)
+
+def ledger_has_transactions(tx_ids):
+    """True if the ledger holds an entry for every one of tx_ids."""
+    return _ledger.has_all(tx_ids)
+
+def get_ledger_entries():
+    """Return a shallow copy of every ledger entry by transaction ID."""
+    return _ledger.snapshot()
+
+def effective_transaction(entry, mods):
+    """
+    A ledger entry as the transaction list shows it, with saved modifications applied.
+
+    Returns a dict of date (ISO string), amount_cents, is_debit, category,
+    subcategory and account_id.
+    """
+    category, subcategory = _current_category(entry, mods)
+    return {
+        'date': mods.get('date', entry['raw_date']),
+        'amount_cents': mods.get('amount_cents', entry['amount_cents']),
+        'is_debit': mods.get('is_debit', entry['is_debit']),
+        'category': category,
+        'subcategory': subcategory,
+        'account_id': mods.get('account_id', entry['account_id'])
+    }
+
+def _find_manual_matches(compiled, modifications, ignore_original_category=True):
+    """
+    Find the manual transactions a rule matches.
+
+    Manual transactions are not in the ledger; there are few enough to check
+    directly. Returns dicts in the same shape as TransactionLedger.find_matches.
+    """
+    matches = []
+    for tx_id, tx_data in modifications.items():
+        if not tx_data.get('manual', False) or tx_data.get('deleted', False):
+            continue
+        cents = tx_data.get('amount_cents', 0)
+        if not compiled.matches_past(normalize_merchant(tx_data.get('merchant')), cents,
+                                     tx_data.get('account_id'), transaction_iso_date(tx_data),
+                                     tx_data.get('merchant') or ''):
+            continue
+        category = tx_data.get('category', 'Uncategorized')
+        subcategory = tx_data.get('subcategory', '')
+        if not ignore_original_category:
+            if compiled.original_category and category != compiled.original_category:
+                continue
+            if compiled.original_subcategory and subcategory != compiled.original_subcategory:
+                continue
+        matches.append({
+            'id': tx_id,
+            'raw_date': tx_data.get('date', ''),
+            'merchant': tx_data.get('merchant', 'Unknown'),
+            'amount': cents_to_amount(cents),
+            'account_id': tx_data.get('account_id', ''),
+            'category': category,
+            'subcategory': subcategory,
+            'manual': True
+        })
+    return matches
+
+def preview_rule(rule, ignore_original_category=True, sample_size=20):
+    """
+    Dry-run a rule against the ledger and manual transactions.
+
+    Nothing is written. Returns the number of matching transactions, how
+    many would change category, a sample of the matches (newest first) and
+    the category changes grouped by from/to category.
+    """
+    compiled = CompiledRule('preview', rule)
+    if compiled.match_amount and compiled.amount_given and compiled.amount_cents is None:
+        matches = []
+    else:
+        modifications = load_saved_transactions()
+        matches = _ledger.find_matches(compiled, modifications, ignore_original_category)
+        matches.extend(_find_manual_matches(compiled, modifications, ignore_original_category))
+
+    new_category = rule.get('category')
+    new_subcategory = rule.get('subcategory', '')
+    changes = {}
+    for tx in matches:
+        tx['new_category'] = new_category
+        tx['new_subcategory'] = new_subcategory
+        tx['changed'] = (tx['category'], tx['subcategory']) != (new_category, new_subcategory)
+        if tx['changed']:
+            key = (tx['category'], tx['subcategory'])
+            changes[key] = changes.get(key, 0) + 1
+
+    matches.sort(key=lambda tx: str(tx['raw_date']), reverse=True)
+    return {
+        'match_count': len(matches),
+        'change_count': sum(changes.values()),
+        'sample': matches[:sample_size],
+        'category_changes': [
+            {
+                'from_category': category,
+                'from_subcategory': subcategory,
+                'to_category': new_category,
+                'to_subcategory': new_subcategory,
+                'count': count
+            }
+            for (category, subcategory), count in sorted(changes.items(), key=lambda item: -item[1])
+        ]
+    }
+
+
+def analyze_rules(rules=None):
+    """
+    Find dead and conflicting rules across the ledger and manual transactions.
+
+    Every transaction that is not deleted is checked, including those
+    categorized by hand or by a rule run, so rules in use are never
+    reported as dead. Original-category conditions are checked against
+    the Plaid category for Plaid entries and the saved one for manual
+    transactions. See find_rule_conflicts for the report layout.
+    """
+    if rules is None:
+        rules = load_rules()
+    sync_ledger_rules()
+    modifications = load_saved_transactions()
+    rows = _ledger.analysis_rows(modifications)
+    for tx_data in modifications.values():
+        if not tx_data.get('manual', False) or tx_data.get('deleted', False):
+            continue
+        rows.append((
+            normalize_merchant(tx_data.get('merchant')), tx_data.get('amount_cents', 0),
+            tx_data.get('category', ''), tx_data.get('subcategory', ''),
+            tx_data.get('account_id'), transaction_iso_date(tx_data), tx_data.get('merchant') or ''
+        ))
+    return find_rule_conflicts(get_compiled_rules(rules), rows)
+
+def apply_rule_to_past_transactions(rule_id, rule=None, ignore_original_category=True):
+    """
+    Apply a rule to every past transaction that matches, Plaid and manual.
+
+    The rule is taken from the compiled rule set unless one is passed in.
+    Plaid transactions are found through the ledger's merchant and amount
+    indexes, so only the matching rows are touched. Matching transactions
+    get the rule's category (see _save_rule_results), which also takes them
+    out of automatic rule categorization. When manually running rules,
+    original_category and original_subcategory are ignored so the rule
+    matches every transaction with the specified description and amount.
+    """
+    if rule is None:
+        compiled = get_compiled_rules().get(rule_id)
+        if compiled is None:
+            logger.error(f"Rule {rule_id} not found")
+            return 0
+    else:
+        compiled = CompiledRule(rule_id, rule)
+    rule = compiled.rule
+
+    # An amount that was given but cannot be parsed means nothing can match
+    if compiled.match_amount and compiled.amount_given and compiled.amount_cents is None:
+        logger.error(f"Error converting rule amount: {rule.get('amount')}")
+        return 0
+
+    transactions = load_saved_transactions()
+    matches = _ledger.find_matches(compiled, transactions, ignore_original_category)
+    matches.extend(_find_manual_matches(compiled, transactions, ignore_original_category))
+
+    result = [rule_id, rule.get('category'), rule.get('subcategory', '')]
+    plaid_results = {tx['id']: result for tx in matches if not tx['manual']}
+    manual_results = {tx['id']: result for tx in matches if tx['manual']}
+    modified_count = len(matches)
+
+    if modified_count > 0:
+        try:
+            _save_rule_results(transactions, plaid_results, manual_results)
+            record_rule_match(rule_id, modified_count)
+        except Exception as e:
+            logger.error(f"Error saving transactions after applying rule: {str(e)}")
+            return 0
+
+    logger.info(f"Applied rule {rule_id} to {modified_count} past transactions")
+    return modified_count
+
+def apply_all_rules_to_past_transactions(rules=None):
+    """
+    Run every active rule against all past transactions in a single pass.
+
+    Covers the Plaid transactions in the ledger as well as manual ones.
+    Equivalent to running each active rule in specificity order with
+    apply_rule_to_past_transactions: a transaction ends up with the category
+    of the last rule that matches it, and every rule counts all of its
+    matches. Transactions are saved once and rule statistics recorded once.
+
+    Returns:
+        dict: Number of transactions each active rule matched, in specificity order
+    """
+    compiled_rules = get_compiled_rules(rules)
+    affected_by_rule = {compiled.rule_id: 0 for compiled in compiled_rules.active}
+    if not affected_by_rule:
+        return affected_by_rule
+
+    transactions = load_saved_transactions()
+    tx_ids, rows = _ledger.past_rows(transactions)
+    plaid_count = len(tx_ids)
+    for tx_id, tx_data in transactions.items():
+        if not tx_data.get('manual', False) or tx_data.get('deleted', False):
+            continue
+        tx_ids.append(tx_id)
+        rows.append((
+            normalize_merchant(tx_data.get('merchant')), tx_data.get('amount_cents', 0),
+            tx_data.get('account_id'), transaction_iso_date(tx_data), tx_data.get('merchant') or ''
+        ))
+
+    # Large ledgers are matched in worker processes
+    rules_by_id = compiled_rules.by_id
+    plaid_results = {}
+    manual_results = {}
+    for position, (tx_id, matched) in enumerate(zip(tx_ids, run_bulk(compiled_rules, rows, match_all=True))):
+        if not matched:
+            continue
+        for rule_id in matched:
+            affected_by_rule[rule_id] += 1
+
+        # The least specific matching rule would have been applied last
+        winner = rules_by_id[matched[-1]].rule
+        results = plaid_results if position < plaid_count else manual_results
+        results[tx_id] = [matched[-1], winner.get('category'), winner.get('subcategory', '')]
+    modified_count = len(plaid_results) + len(manual_results)
+
+    if modified_count > 0:
+        try:
+            _save_rule_results(transactions, plaid_results, manual_results)
+            for rule_id, count in affected_by_rule.items():
+                record_rule_match(rule_id, count)
+        except Exception as e:
+            logger.error(f"Error saving transactions after applying rules: {str(e)}")
+            return {rule_id: 0 for rule_id in affected_by_rule}
+
+    logger.info(f"Applied {len(affected_by_rule)} rules to {modified_count} past transactions in one pass")
+    return affected_by_rule
@@ -0,0 +1,55 @@
+import os
+import re
+from functools import lru_cache
+
+# Upper bound on memoized merchant names (raw name -> normalized name)
+MERCHANT_CACHE_SIZE = int(os.environ.get('MERCHANT_CACHE_SIZE', '65536'))
+
+# Card processor and aggregator prefixes such as "SQ *", "TST* ", "PAYPAL *"
+_STAR_PREFIX = re.compile(r'^(?:sq|sqc|tst|sp|pp|py|pypl|paypal|in|ic|dd|gg|tsp|bt|cke|fsp|lsp|par)\s?\*\s*')
+# Bank descriptor prefixes such as "POS DEBIT", "CHECKCARD 0412", "PURCHASE AUTHORIZED ON 04/12"
+_WORD_PREFIX = re.compile(
+    r'^(?:pos(?: debit| purchase)?|debit card purchase|debit purchase|checkcard(?: \d{4})?'
+    r'|ach (?:debit|credit)|recurring (?:payment|debit)|purchase authorized on \d{1,2}/\d{1,2})\s+'
+)
+_WEB_NOISE = re.compile(r'\bwww\.|\.(?:com|net|org)\b')
+_DATES = re.compile(r'\b\d{1,2}/\d{1,2}(?:/\d{2,4})?\b')
+# Store and terminal numbers ("#1234", "store 88", "no. 5"), long digit runs and
+# reference codes mixing letters and digits ("2K4JH1")
+_STORE_NUMBERS = re.compile(
+    r'(?:#\s?|\bno\.?\s?|\bstore\s?)\d+|\b[a-z]*\d{3,}[a-z0-9]*\b'
+    r'|\b(?=[a-z0-9]{5,}\b)(?=[a-z]*\d[a-z]*\d)[a-z0-9]*[a-z][a-z0-9]*\b'
+)
+_NON_WORD = re.compile(r'[^a-z0-9&]+')
+
+@lru_cache(maxsize=MERCHANT_CACHE_SIZE)
+def normalize_merchant(raw_name):
+    """
+    Reduce a raw merchant descriptor to a stable name for matching, search and grouping.
+
+    Lowercases, strips processor and bank prefixes, web suffixes, dates,
+    store numbers and reference codes, then collapses punctuation and
+    whitespace. "SQ *BLUE BOTTLE #123" and "Blue Bottle" both become
+    "blue bottle". If nothing is left, the lowered name is returned.
+    Results are memoized per raw name in a bounded LRU cache.
+    """
+    lowered = (raw_name or '').lower().strip()
+    name = _WORD_PREFIX.sub('', lowered)
+    name = _STAR_PREFIX.sub('', name)
+    name = _WEB_NOISE.sub(' ', name).replace("'", '')
+    name = _DATES.sub(' ', name)
+    name = _STORE_NUMBERS.sub(' ', name)
+    name = ' '.join(_NON_WORD.sub(' ', name).split())
+    return name or lowered
+
+def get_normalizer_statistics():
+    """Hit and size statistics of the normalizer's memo cache, in the cache stats format."""
+    info = normalize_merchant.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'size': info.currsize,
+        'max_size': info.maxsize,
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / lookups if lookups else 0
+    }
@@ -0,0 +1,180 @@
+import time
+import logging
+from threading import Lock
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from fast cache hits up to slow full-history Plaid pulls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape_label(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    """Render a {name="value",...} label block."""
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.extend(f'{name}="{_escape_label(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    """Render a sample value the way Prometheus expects."""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+class Counter:
+    """Monotonically increasing counter with optional labels."""
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount=1, **labels):
+        """Increment the counter for a label combination."""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        """Render the counter in Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = Lock()
+
+    def observe(self, value, **labels):
+        """Record one observation for a label combination."""
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self):
+        """Render the histogram in Prometheus text format."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key, [('le', '+Inf')])
+                lines.append(f"{self.name}_bucket{labels} {state['count']}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {state['sum']}")
+                lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+# Metrics shared across the application
+REQUEST_LATENCY = Histogram(
+    'finance_app_request_duration_seconds', 'HTTP request latency by route',
+    ('route', 'method', 'status')
+)
+PLAID_CALLS = Counter(
+    'finance_app_plaid_calls_total', 'Plaid API calls by operation and outcome',
+    ('operation', 'outcome')
+)
+PLAID_LATENCY = Histogram(
+    'finance_app_plaid_call_duration_seconds', 'Plaid API call latency by operation',
+    ('operation',)
+)
+PERSISTENCE_WRITES = Counter(
+    'finance_app_persistence_writes_total', 'Writes to the JSON data files by store',
+    ('store',)
+)
+PERSISTENCE_BYTES = Counter(
+    'finance_app_persistence_written_bytes_total', 'Bytes written to the JSON data files by store',
+    ('store',)
+)
+
+_METRICS = [REQUEST_LATENCY, PLAID_CALLS, PLAID_LATENCY, PERSISTENCE_WRITES, PERSISTENCE_BYTES]
+
+def record_persistence_write(store, byte_count):
+    """Count one write of byte_count bytes to a data file."""
+    PERSISTENCE_WRITES.inc(store=store)
+    PERSISTENCE_BYTES.inc(byte_count, store=store)
+
+class InstrumentedPlaidClient:
+    """
+    Proxy around the Plaid client that counts and times every API call.
+
+    Attribute access is forwarded unchanged; callables are wrapped so each call
+    records its operation name, latency and success or error outcome.
+    """
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def instrumented(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'success'
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                outcome = 'error'
+                raise
+            finally:
+                PLAID_LATENCY.observe(time.perf_counter() - start, operation=name)
+                PLAID_CALLS.inc(operation=name, outcome=outcome)
+        return instrumented
+
+    def __bool__(self):
+        return bool(self._client)
+
+def render_cache_metrics(cache_stats):
+    """Render get_cache_statistics() output as Prometheus metrics."""
+    series = [
+        ('finance_app_cache_hits_total', 'counter', 'Cache hits', 'hits'),
+        ('finance_app_cache_misses_total', 'counter', 'Cache misses', 'misses'),
+        ('finance_app_cache_evictions_total', 'counter', 'Cache evictions due to size or byte limits', 'evictions'),
+        ('finance_app_cache_expirations_total', 'counter', 'Cache entries dropped after their TTL', 'expirations'),
+        ('finance_app_cache_reclaimed_bytes_total', 'counter', 'Approximate bytes freed by expiring entries', 'bytes_reclaimed'),
+        ('finance_app_cache_admission_rejections_total', 'counter', 'New keys refused by the admission policy', 'admission_rejections'),
+        ('finance_app_cache_entries', 'gauge', 'Entries currently held in the cache', 'size'),
+        ('finance_app_cache_bytes', 'gauge', 'Approximate bytes currently held in the cache', 'bytes_used'),
+    ]
+    lines = []
+    for name, metric_type, documentation, field in series:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for cache_name, stats in sorted(cache_stats.items()):
+            lines.append(f'{name}{{cache="{_escape_label(cache_name)}"}} {_format_value(stats.get(field, 0) or 0)}')
+    return lines
+
+def render_metrics(cache_stats=None):
+    """Render every registered metric in Prometheus text exposition format."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    if cache_stats:
+        lines.extend(render_cache_metrics(cache_stats))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,31 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+def to_cents(value):
+    """
+    Convert a dollar amount (number or string such as "$1,234.50") to integer cents.
+
+    Rounds half up on the decimal value the user wrote, so "1.005" is 101
+    cents rather than whatever the nearest float happens to be. Keeps the
+    sign. Raises ValueError for anything that is not a finite amount.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount: {value}")
+    if isinstance(value, str):
+        value = value.strip().replace('$', '').replace(',', '')
+    try:
+        amount = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value}")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount: {value}")
+    return int((amount * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+def cents_to_amount(cents):
+    """Integer cents as a dollar number for JSON responses."""
+    return cents / 100
+
+def format_cents(cents):
+    """Integer cents as an exact "1234.56" string (sign kept) for exports."""
+    sign = '-' if cents < 0 else ''
+    dollars, remainder = divmod(abs(cents), 100)
+    return f"{sign}{dollars}.{remainder:02d}"
@@ -7,11 +7,15 @@ from plaid.model.item_public_token_exchange_request import ItemPublicTokenExchan
 from plaid.model.transactions_get_request import TransactionsGetRequest
 from plaid.model.accounts_get_request import AccountsGetRequest
 from plaid_client import client  # Assumes plaid_client.py defines the Plaid client
+from metrics_utils import InstrumentedPlaidClient
 import logging
 import uuid
 
 logger = logging.getLogger(__name__)
 
+# Count and time every Plaid API call
+client = InstrumentedPlaidClient(client)
+
 def create_link_token():
     """
     Create a Plaid Link token for connecting a bank account.
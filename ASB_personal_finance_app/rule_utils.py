@@ -0,0 +1,521 @@
+import os
+import re
+import atexit
+import pickle
+import hashlib
+import logging
+import datetime
+import multiprocessing
+from collections import deque
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
+from merchant_utils import normalize_merchant
+from money_utils import to_cents
+
+logger = logging.getLogger(__name__)
+
+# Bulk matching switches to worker processes at this many rows (0 disables parallel runs).
+# Measured break-even with benchmarks/bench_parallel_matching.py; re-measure per machine.
+PARALLEL_MIN_ROWS = int(os.environ.get('RULES_PARALLEL_MIN_ROWS', '50000'))
+PARALLEL_CHUNK_ROWS = int(os.environ.get('RULES_PARALLEL_CHUNK_ROWS', '10000'))
+PARALLEL_MAX_WORKERS = int(os.environ.get('RULES_PARALLEL_MAX_WORKERS', '0')) or os.cpu_count() or 1
+# Worker start method: forkserver avoids forking the threaded web process, spawn is the fallback
+PARALLEL_START_METHOD = os.environ.get('RULES_PARALLEL_START_METHOD') or (
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+def rule_specificity(rule):
+    """
+    Sort key for rules: more specific rules are tried first.
+
+    Rules with an original category, an original subcategory, a description
+    match and an amount match rank above rules without them, in that order.
+    """
+    return (
+        1 if rule.get('original_category') else 0,
+        1 if rule.get('original_subcategory') else 0,
+        1 if rule.get('match_description', True) else 0,
+        1 if rule.get('match_amount', False) else 0
+    )
+
+# How a rule's description is compared with the merchant name
+MATCH_TYPES = ('contains', 'starts_with', 'ends_with', 'exact', 'tokens', 'regex')
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+
+def tokenize(text):
+    """Split lowered text into alphanumeric words."""
+    return TOKEN_PATTERN.findall(text)
+
+def parse_rule_date(value):
+    """Normalize a YYYY-MM-DD rule date, returning None when unset. Raises ValueError if invalid."""
+    if value in (None, ''):
+        return None
+    return datetime.datetime.strptime(str(value).strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+
+def amount_to_cents(amount):
+    """Convert an amount to absolute integer cents. Raises ValueError if invalid."""
+    return abs(to_cents(amount))
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton that finds every pattern occurring in a text in one pass.
+
+    Matching cost is proportional to the text length plus the number of
+    matches, independent of how many patterns were compiled in.
+    """
+    def __init__(self, patterns):
+        # Trie as parallel lists: outgoing edges, failure link and pattern ids ending here
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern_id, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = next_node
+            self.output[node].append(pattern_id)
+
+        # Breadth-first pass to fill failure links and merge outputs along them
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                if self.fail[child] == child:
+                    self.fail[child] = 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def find_all(self, text):
+        """Return the set of pattern ids that occur anywhere in text."""
+        found = set()
+        goto, fail, output = self.goto, self.fail, self.output
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+class CompiledRule:
+    """
+    One rule with its match fields normalized up front.
+
+    The description is run through normalize_merchant, so it compares against
+    normalized transaction merchants, and is tokenized for token-set rules.
+    Regex rules are instead searched (case-insensitively) in the raw
+    merchant name callers pass as raw_description, since normalization
+    strips the digits, punctuation and prefixes a pattern may rely on. Amounts are parsed into
+    integer cents (None when the amount is invalid). Optional conditions
+    narrow a match further: amount_min/amount_max, account_id and a
+    date_start/date_end window. A rule whose conditions cannot be parsed
+    never matches. The original rule dict is kept on the rule attribute so
+    callers can read the target category.
+    """
+    __slots__ = (
+        'rule_id', 'rule', 'active', 'valid', 'description', 'match_description', 'match_type',
+        'tokens', 'regex', 'index_key', 'match_amount', 'amount_given', 'amount_cents',
+        'min_cents', 'max_cents', 'account_id', 'date_start', 'date_end',
+        'original_category', 'original_subcategory'
+    )
+
+    def __init__(self, rule_id, rule):
+        self.rule_id = rule_id
+        self.rule = rule
+        self.active = bool(rule.get('active', True))
+        self.valid = True
+        self.match_type = rule.get('match_type') or 'contains'
+        if self.match_type == 'regex':
+            self.description = (rule.get('description') or '').lower().strip()
+        else:
+            self.description = normalize_merchant(rule.get('description')) if rule.get('description') else ''
+        self.match_description = bool(rule.get('match_description', True))
+        self.match_amount = bool(rule.get('match_amount', False))
+        self.original_category = rule.get('original_category') or ''
+        self.original_subcategory = rule.get('original_subcategory') or ''
+        self.account_id = rule.get('account_id') or ''
+        self.amount_given = rule.get('amount') is not None
+        try:
+            self.amount_cents = amount_to_cents(rule.get('amount', 0))
+        except (ValueError, TypeError):
+            self.amount_cents = None
+
+        # The substring every matching merchant must contain, used to index the rule
+        self.tokens = None
+        self.regex = None
+        self.index_key = self.description
+        if self.match_type not in MATCH_TYPES:
+            self.valid = False
+        elif self.match_type == 'tokens':
+            self.tokens = frozenset(tokenize(self.description))
+            self.index_key = max(self.tokens, key=len) if self.tokens else ''
+        elif self.match_type == 'regex':
+            self.index_key = ''
+            try:
+                self.regex = re.compile((rule.get('description') or '').strip(), re.IGNORECASE)
+            except re.error:
+                self.valid = False
+
+        try:
+            self.min_cents = None if rule.get('amount_min') in (None, '') else amount_to_cents(rule['amount_min'])
+            self.max_cents = None if rule.get('amount_max') in (None, '') else amount_to_cents(rule['amount_max'])
+            self.date_start = parse_rule_date(rule.get('date_start'))
+            self.date_end = parse_rule_date(rule.get('date_end'))
+        except (ValueError, TypeError):
+            self.min_cents = self.max_cents = self.date_start = self.date_end = None
+            self.valid = False
+
+    def matches_description(self, tx_description, raw_description=None):
+        """
+        Check a normalized merchant name against the description condition.
+
+        Regex rules search raw_description, the merchant as it was
+        recorded, falling back to the normalized name when it is None.
+        """
+        if not self.match_description:
+            return True
+        if not self.description:
+            return False
+        match_type = self.match_type
+        if match_type == 'contains':
+            return self.description in tx_description
+        if match_type == 'starts_with':
+            return tx_description.startswith(self.description)
+        if match_type == 'ends_with':
+            return tx_description.endswith(self.description)
+        if match_type == 'exact':
+            return tx_description == self.description
+        if match_type == 'tokens':
+            return bool(self.tokens) and self.tokens.issubset(tokenize(tx_description))
+        if match_type == 'regex':
+            text = tx_description if raw_description is None else raw_description
+            return self.regex is not None and self.regex.search(text) is not None
+        return False
+
+    def _matches_extra(self, tx_cents, account_id, tx_date):
+        """Check the amount range, account and date window conditions."""
+        if not self.valid:
+            return False
+        if self.min_cents is not None and (tx_cents is None or tx_cents < self.min_cents):
+            return False
+        if self.max_cents is not None and (tx_cents is None or tx_cents > self.max_cents):
+            return False
+        if self.account_id and account_id != self.account_id:
+            return False
+        if self.date_start and (not tx_date or tx_date < self.date_start):
+            return False
+        if self.date_end and (not tx_date or tx_date > self.date_end):
+            return False
+        return True
+
+    def matches(self, tx_description, tx_cents, original_category=None, original_subcategory=None,
+                account_id=None, tx_date=None, raw_description=None):
+        """
+        Check a normalized transaction against this rule.
+
+        Passing None for original_category/original_subcategory skips those
+        constraints. tx_date is an ISO YYYY-MM-DD string.
+        """
+        if original_category is not None and self.original_category and self.original_category != original_category:
+            return False
+        if original_subcategory is not None and self.original_subcategory and self.original_subcategory != original_subcategory:
+            return False
+        if not self.matches_description(tx_description, raw_description):
+            return False
+        if self.match_amount and (self.amount_cents is None or self.amount_cents != tx_cents):
+            return False
+        return self._matches_extra(tx_cents, account_id, tx_date)
+
+    def matches_past(self, tx_description, tx_cents, account_id=None, tx_date=None, raw_description=None):
+        """
+        Check a normalized transaction the way rules are run against past transactions.
+
+        Original category constraints are ignored, and a rule that matches on
+        amount without giving one only checks the description.
+        """
+        if not self.matches_description(tx_description, raw_description):
+            return False
+        if self.match_amount and self.amount_given and (self.amount_cents is None or self.amount_cents != tx_cents):
+            return False
+        return self._matches_extra(tx_cents, account_id, tx_date)
+
+class CompiledRuleSet:
+    """
+    Rules compiled once per rules version for fast first-match lookups.
+
+    Rules are held in specificity order with their match fields normalized.
+    Active description rules are compiled into one Aho-Corasick automaton
+    over the substring each one requires. For a token-set rule that is its
+    longest token. Regex rules are always candidates, and amount-only rules
+    are indexed by integer cents. A lookup gathers the candidate rules from
+    these indexes plus rules that match on neither, then checks them in
+    specificity order. The result is the same first match the rule-by-rule
+    scan would find.
+    """
+    def __init__(self, rules):
+        # Stable sort keeps insertion order among equally specific rules
+        ranked = sorted(rules.items(), key=lambda item: rule_specificity(item[1]), reverse=True)
+        self.ordered = [CompiledRule(rule_id, rule) for rule_id, rule in ranked]
+        self.by_id = {compiled.rule_id: compiled for compiled in self.ordered}
+        self.active = [compiled for compiled in self.ordered if compiled.active]
+
+        patterns = []
+        self.pattern_ranks = []
+        self.regex_ranks = []
+        self.amount_index = {}
+        self.unconditional = []
+        self.past_unconditional = []
+        for rank, compiled in enumerate(self.ordered):
+            if not compiled.active:
+                continue
+            if not compiled.valid:
+                logger.warning(f"Rule {compiled.rule_id} has invalid conditions and will not match")
+                continue
+            if compiled.match_amount and compiled.amount_given and compiled.amount_cents is None:
+                logger.warning(f"Invalid amount in rule {compiled.rule_id}: {compiled.rule.get('amount')}")
+            if compiled.match_description:
+                if compiled.match_type == 'regex':
+                    self.regex_ranks.append(rank)
+                elif compiled.index_key:
+                    patterns.append(compiled.index_key)
+                    self.pattern_ranks.append(rank)
+                continue
+            if compiled.match_amount and compiled.amount_cents is not None:
+                self.amount_index.setdefault(compiled.amount_cents, []).append(rank)
+            if not compiled.match_amount:
+                self.unconditional.append(rank)
+            if not compiled.match_amount or not compiled.amount_given:
+                self.past_unconditional.append(rank)
+
+        self.automaton = AhoCorasick(patterns)
+
+    def get(self, rule_id):
+        """Return the CompiledRule for a rule id, or None."""
+        return self.by_id.get(rule_id)
+
+    def description_candidates(self, tx_description):
+        """Ranks of description rules whose indexed substring occurs in the merchant, plus regex rules."""
+        ranks = {self.pattern_ranks[i] for i in self.automaton.find_all(tx_description)}
+        ranks.update(self.regex_ranks)
+        return ranks
+
+    def candidates(self, tx_description, tx_cents):
+        """Ranks of rules whose description and amount conditions could match, best first."""
+        ranks = self.description_candidates(tx_description)
+        ranks.update(self.amount_index.get(tx_cents, ()))
+        ranks.update(self.unconditional)
+        return sorted(ranks)
+
+    def match(self, tx_description, tx_cents, original_category='', original_subcategory='',
+              account_id=None, tx_date=None, raw_description=None):
+        """Return the first matching CompiledRule in specificity order, or None."""
+        for rank in self.candidates(tx_description, tx_cents):
+            compiled = self.ordered[rank]
+            if compiled.matches(tx_description, tx_cents, original_category, original_subcategory, account_id, tx_date,
+                                raw_description):
+                return compiled
+        return None
+
+    def match_each(self, tx_description, tx_cents, original_category='', original_subcategory='',
+                   account_id=None, tx_date=None, raw_description=None):
+        """Return every rule match() would accept, in specificity order; the first one is the one that fires."""
+        return [
+            self.ordered[rank] for rank in self.candidates(tx_description, tx_cents)
+            if self.ordered[rank].matches(tx_description, tx_cents, original_category, original_subcategory,
+                                          account_id, tx_date, raw_description)
+        ]
+
+    def match_all(self, tx_description, tx_cents, account_id=None, tx_date=None, raw_description=None):
+        """
+        Return every active rule that matches when run against past transactions.
+
+        Rules come back in specificity order, so the last one is the rule
+        whose category a sequential run of all rules would leave in place.
+        """
+        ranks = self.description_candidates(tx_description)
+        ranks.update(self.amount_index.get(tx_cents, ()))
+        ranks.update(self.past_unconditional)
+        return [
+            self.ordered[rank] for rank in sorted(ranks)
+            if self.ordered[rank].matches_past(tx_description, tx_cents, account_id, tx_date, raw_description)
+        ]
+
+def find_rule_conflicts(compiled_rules, rows, max_overlaps=100):
+    """
+    Report rules that can never fire, overlap with conflicting targets, or match nothing.
+
+    rows are argument tuples for CompiledRuleSet.match(). Every rule a row
+    satisfies is collected; the first in specificity order is the one that
+    fires. A rule that matches transactions but never fires is fully
+    shadowed by the rules that fired instead. Two rules overlap when they
+    both match a transaction but set different categories.
+    """
+    matched = {}
+    fired = {}
+    shadowed_by = {}
+    overlaps = {}
+    for row in rows:
+        hits = compiled_rules.match_each(*row)
+        if not hits:
+            continue
+        winner = hits[0]
+        fired[winner.rule_id] = fired.get(winner.rule_id, 0) + 1
+        for compiled in hits:
+            matched[compiled.rule_id] = matched.get(compiled.rule_id, 0) + 1
+        for compiled in hits[1:]:
+            by = shadowed_by.setdefault(compiled.rule_id, {})
+            by[winner.rule_id] = by.get(winner.rule_id, 0) + 1
+        for i, first in enumerate(hits):
+            first_target = (first.rule.get('category'), first.rule.get('subcategory', ''))
+            for second in hits[i + 1:]:
+                if (second.rule.get('category'), second.rule.get('subcategory', '')) != first_target:
+                    pair = (first.rule_id, second.rule_id)
+                    overlaps[pair] = overlaps.get(pair, 0) + 1
+
+    usable = [compiled for compiled in compiled_rules.active if compiled.valid]
+    shadowed = []
+    zero_match = []
+    for compiled in usable:
+        if compiled.rule_id not in matched:
+            zero_match.append(compiled.rule_id)
+        elif compiled.rule_id not in fired:
+            shadowed.append({
+                'rule_id': compiled.rule_id,
+                'match_count': matched[compiled.rule_id],
+                'shadowed_by': [
+                    {'rule_id': rule_id, 'count': count}
+                    for rule_id, count in sorted(shadowed_by[compiled.rule_id].items(), key=lambda item: -item[1])
+                ]
+            })
+
+    overlap_list = []
+    for (first_id, second_id), count in sorted(overlaps.items(), key=lambda item: -item[1])[:max_overlaps]:
+        first = compiled_rules.get(first_id)
+        second = compiled_rules.get(second_id)
+        overlap_list.append({
+            'rule_id': first_id,
+            'other_rule_id': second_id,
+            'shared_count': count,
+            'category': first.rule.get('category'),
+            'subcategory': first.rule.get('subcategory', ''),
+            'other_category': second.rule.get('category'),
+            'other_subcategory': second.rule.get('subcategory', '')
+        })
+
+    return {
+        'transactions_analyzed': len(rows),
+        'rules_analyzed': len(usable),
+        'shadowed': shadowed,
+        'overlaps': overlap_list,
+        'overlap_count': len(overlaps),
+        'zero_match': zero_match,
+        'invalid': [compiled.rule_id for compiled in compiled_rules.active if not compiled.valid]
+    }
+
+# Compiled rule set a worker process last received, and the digest of its pickle
+_worker_rules = None
+_worker_rules_key = None
+
+def _match_rows(compiled_rules, rows):
+    """First-match rule id (or None) for each row of CompiledRuleSet.match() arguments."""
+    results = []
+    for row in rows:
+        compiled = compiled_rules.match(*row)
+        results.append(compiled.rule_id if compiled else None)
+    return results
+
+def _match_all_rows(compiled_rules, rows):
+    """Ids of every rule matching each row of CompiledRuleSet.match_all() arguments, in specificity order."""
+    return [tuple(compiled.rule_id for compiled in compiled_rules.match_all(*row)) for row in rows]
+
+def _worker_run(task):
+    """Match one chunk in a worker, unpickling the rule set only when it differs from the last one."""
+    global _worker_rules, _worker_rules_key
+    key, payload, rows, match_all = task
+    if key != _worker_rules_key:
+        _worker_rules = pickle.loads(payload)
+        _worker_rules_key = key
+    return (_match_all_rows if match_all else _match_rows)(_worker_rules, rows)
+
+# One worker pool for the life of the process, started on first parallel run
+_pool = None
+_pool_lock = Lock()
+
+def _get_pool():
+    """Return the shared worker pool, starting it with PARALLEL_START_METHOD on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context(PARALLEL_START_METHOD)
+            if PARALLEL_START_METHOD == 'forkserver':
+                context.set_forkserver_preload(['rule_utils'])
+            _pool = ProcessPoolExecutor(max_workers=PARALLEL_MAX_WORKERS, mp_context=context)
+        return _pool
+
+def _discard_pool():
+    """Shut the pool down, e.g. after a worker died; the next parallel run starts a new one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+atexit.register(_discard_pool)
+
+def run_bulk(compiled_rules, rows, match_all=False, parallel=None):
+    """
+    Match many normalized transactions against a compiled rule set.
+
+    rows are argument tuples for CompiledRuleSet.match() (description,
+    cents, original category, original subcategory, account id, date, raw
+    description), or for CompiledRuleSet.match_all() (description, cents,
+    account id, date, raw description) with match_all=True. Results come
+    back in row order.
+
+    Large inputs are split into chunks and matched in a worker pool that is
+    started once (with PARALLEL_START_METHOD) and reused. The compiled set
+    is pickled once per call and sent with every chunk, keyed by its digest,
+    so each worker unpickles a given rule set only once. By default the
+    parallel path is used only when there are at least PARALLEL_MIN_ROWS
+    rows and more than one CPU. Below that, pickling and inter-process
+    transfer cost more than they save. The 50k default is the break-even
+    measured by benchmarks/bench_parallel_matching.py with 2 workers on a
+    single-CPU machine. Multi-core machines have not been measured and
+    likely break even lower; run the benchmark there and set
+    RULES_PARALLEL_MIN_ROWS from it. If the pool cannot be used, the rows
+    are matched serially.
+    """
+    serial = _match_all_rows if match_all else _match_rows
+    if parallel is None:
+        parallel = PARALLEL_MIN_ROWS > 0 and len(rows) >= PARALLEL_MIN_ROWS and PARALLEL_MAX_WORKERS > 1
+    if not parallel or not rows:
+        return serial(compiled_rules, rows)
+
+    try:
+        payload = pickle.dumps(compiled_rules, protocol=pickle.HIGHEST_PROTOCOL)
+        key = hashlib.sha1(payload).hexdigest()
+        tasks = [
+            (key, payload, rows[i:i + PARALLEL_CHUNK_ROWS], match_all)
+            for i in range(0, len(rows), PARALLEL_CHUNK_ROWS)
+        ]
+        results = []
+        for chunk_result in _get_pool().map(_worker_run, tasks):
+            results.extend(chunk_result)
+        return results
+    except Exception as e:
+        logger.error(f"Parallel rule matching failed, falling back to serial: {str(e)}")
+        _discard_pool()
+        return serial(compiled_rules, rows)
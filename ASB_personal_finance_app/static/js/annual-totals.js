@@ -233,18 +233,8 @@ function displayAnnualTotals(categoryTotals, years) {
         years.forEach(year => {
             const td = document.createElement('td');
 
-            // Check for zero value
-            let value = 0;
-
-            if (row[year]) {
-                if (typeof row[year] === 'string' && row[year].startsWith('$')) {
-                    // If it's already a string with $ sign, parse it first
-                    value = parseFloat(row[year].replace(/[\$,]/g, ''));
-                } else {
-                    // Otherwise use the value directly
-                    value = parseFloat(row[year]);
-                }
-            }
+            // Totals arrive as signed numbers; show their magnitude
+            const value = Math.abs(Number(row[year]) || 0);
 
             // Display dash for zero, otherwise format as currency
             td.textContent = (value === 0) ? "–" : formatCurrency(value);
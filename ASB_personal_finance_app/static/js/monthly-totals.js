@@ -220,8 +220,12 @@ function loadMonthlyTotals() {
     loadingIndicator.style.display = 'block';
     monthlyTable.style.display = 'none';
 
-    // Fetch transactions for the specified date range
-    fetch('/get_transactions')
+    // Totals are aggregated on the server for the whole range
+    const startMonth = `${startParts[1]}-${startParts[0].padStart(2, '0')}`;
+    const endMonth = `${endParts[1]}-${endParts[0].padStart(2, '0')}`;
+    const params = new URLSearchParams({ start_month: startMonth, end_month: endMonth });
+
+    fetch(`/get_monthly_totals?${params.toString()}`)
         .then(response => response.json())
         .then(data => {
             if (data.error) {
@@ -229,11 +233,7 @@ function loadMonthlyTotals() {
                 return;
             }
 
-            // Filter transactions based on the date range
-            const transactions = data.transactions || [];
-
-            // Calculate monthly totals
-            const monthlyData = calculateMonthlyCategoryTotals(transactions, startDate, endDate);
+            const monthlyData = buildMonthlyTable(data.rows || [], data.months || []);
 
             // Display the data
             displayMonthlyTotals(monthlyData.monthlyTable, monthlyData.months);
@@ -249,140 +249,32 @@ function loadMonthlyTotals() {
 }
 
 /**
- * Processes transaction data and calculates monthly category totals
+ * Formats the server's month x category totals for display
  * 
- * @param {Array} transactions - List of transaction objects
- * @param {Date} startDate - Start date of the range to include
- * @param {Date} endDate - End date of the range to include
- * @returns {Object} Object containing monthly totals and month list
+ * @param {Array} rows - Rows of {category, totals} with one signed total per month
+ * @param {Array} monthKeys - Months in YYYY-MM format, in column order
+ * @returns {Object} Object containing the display table and month headers
  */
-function calculateMonthlyCategoryTotals(transactions, startDate, endDate) {
-    // Initialize structures using objects instead of repeatedly searching arrays
-    const monthlyTotals = {};
-    const allCategories = new Set();
-    const months = new Set();
-
-    // First, collect all categories from all transactions (not just filtered ones)
-    // This ensures we display all categories even if they have no transactions in the selected range
-    transactions.forEach(tx => {
-        if (tx.category) {
-            allCategories.add(tx.category);
-        }
-    });
-
-    // If we don't have any categories yet, try to get them from the server
-    if (allCategories.size === 0) {
-        // This is an async call but we'll continue with empty categories
-        // and let the server populate them later if needed
-        fetch('/get_categories')
-            .then(response => response.json())
-            .then(data => {
-                if (data.categories && data.categories.length > 0) {
-                    data.categories.forEach(category => allCategories.add(category));
-                }
-            })
-            .catch(err => ErrorUtils.handleError(err, 'Failed to fetch categories'));
-    }
-
-    // Generate all months in the date range
-    const start = new Date(startDate.getFullYear(), startDate.getMonth(), 1);
-    const end = new Date(endDate.getFullYear(), endDate.getMonth(), 1);
-
-    // Add each month in the range to the months set
-    let current = new Date(start);
-    while (current <= end) {
-        const year = current.getFullYear();
-        const month = String(current.getMonth() + 1).padStart(2, '0');
-        const monthKey = `${year}-${month}`;
-        months.add(monthKey);
-
-        // Initialize each month in the totals object
-        monthlyTotals[monthKey] = {};
-
-        // Pre-initialize zero amounts for all categories in this month
-        allCategories.forEach(category => {
-            monthlyTotals[monthKey][category] = 0;
-        });
-
-        // Move to next month
-        current.setMonth(current.getMonth() + 1);
-    }
+function buildMonthlyTable(rows, monthKeys) {
+    const monthNames = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
 
-    // Process each transaction - Single pass through all transactions
-    transactions.forEach(tx => {
-        // Skip transactions without dates
-        if (!tx.raw_date) return;
-
-        try {
-            // Extract month-year
-            let monthYear;
-            let txDate;
-
-            if (typeof tx.raw_date === 'string') {
-                // Parse date string in format YYYY-MM-DD
-                const match = tx.raw_date.match(/^(\d{4})-(\d{2})/);
-                if (match) {
-                    monthYear = `${match[1]}-${match[2]}`; // YYYY-MM format
-                    txDate = new Date(tx.raw_date);
-                } else {
-                    console.warn(`Couldn't parse date: ${tx.raw_date}`);
-                    return;
-                }
-            } else {
-                // Assume it's a Date object
-                txDate = new Date(tx.raw_date);
-                if (isNaN(txDate.getTime())) {
-                    console.warn(`Invalid date: ${tx.raw_date}`);
-                    return;
-                }
-
-                const year = txDate.getFullYear();
-                const month = String(txDate.getMonth() + 1).padStart(2, '0');
-                monthYear = `${year}-${month}`;
-            }
-
-            // Skip if month is not in our range
-            if (!months.has(monthYear)) return;
-
-            // Skip if no category
-            if (!tx.category) return;
-
-            // Add amount (negative for expenses, positive for income)
-            const amount = tx.is_debit ? -tx.amount : tx.amount;
-            monthlyTotals[monthYear][tx.category] += amount;
-        } catch (err) {
-            ErrorUtils.handleError(err, 'Failed to process transaction');
-        }
+    // Format month for display (e.g., "Jan 2023")
+    const displayMonths = monthKeys.map(monthKey => {
+        const [year, month] = monthKey.split('-');
+        return `${monthNames[parseInt(month) - 1]} ${year}`;
     });
 
-    // Convert to array format for display - Use sorted months and categories for consistency
-    const sortedMonths = Array.from(months).sort();
-    const sortedCategories = Array.from(allCategories).sort();
+    const monthlyTable = rows.map(row => {
+        const tableRow = { category: row.category };
 
-    const monthlyTable = sortedCategories.map(category => {
-        const row = { category };
-
-        sortedMonths.forEach(monthKey => {
-            // Format month for display (e.g., "Jan 2023")
-            const [year, month] = monthKey.split('-');
-            const monthNames = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
-            const monthDisplay = `${monthNames[parseInt(month) - 1]} ${year}`;
-
-            // Get amount (default to 0)
-            const amount = monthlyTotals[monthKey]?.[category] || 0;
+        displayMonths.forEach((monthDisplay, index) => {
+            const amount = row.totals[index] || 0;
 
             // Display dash for zero amounts, otherwise format as currency
-            row[monthDisplay] = amount === 0 ? "–" : formatCurrency(Math.abs(amount));
+            tableRow[monthDisplay] = amount === 0 ? "–" : formatCurrency(Math.abs(amount));
         });
 
-        return row;
-    });
-
-    // Convert month keys to display format
-    const displayMonths = sortedMonths.map(monthKey => {
-        const [year, month] = monthKey.split('-');
-        const monthNames = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
-        return `${monthNames[parseInt(month) - 1]} ${year}`;
+        return tableRow;
     });
 
     return {
@@ -0,0 +1,46 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+# The app modules import each other as top-level modules from the app directory
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+# Keep tests away from the on-disk response cache
+os.environ.setdefault('PERSISTENT_CACHE_ENABLED', '0')
+
+@pytest.fixture
+def isolated_data(monkeypatch):
+    """
+    Point every data file, the ledger and the aggregate cube at a scratch directory.
+
+    The directory is created under logs_and_json because save_transactions
+    refuses paths outside the app directory. It is removed afterwards.
+    """
+    import data_utils
+    import ledger_utils
+    import aggregate_utils
+
+    data_dir = tempfile.mkdtemp(prefix='test-', dir=os.path.join(APP_DIR, 'logs_and_json'))
+    for name, filename in [('TOKEN_FILE', 'tokens.json'), ('TRANSACTIONS_FILE', 'transactions.json'),
+                           ('RULES_FILE', 'rules.json'), ('CATEGORIES_FILE', 'categories.json'),
+                           ('RULE_STATS_FILE', 'rule_stats.json')]:
+        monkeypatch.setattr(data_utils, name, os.path.join(data_dir, filename))
+    monkeypatch.setattr(data_utils, '_rule_stats', data_utils.RuleStatsStore(os.path.join(data_dir, 'rule_stats.json')))
+    for cache in (data_utils._saved_transactions_cache, data_utils._rules_cache, data_utils._transaction_cache,
+                  data_utils._category_counts_cache, data_utils._plaid_transactions_cache):
+        cache.clear()
+
+    cube = aggregate_utils.AggregateCube()
+    monkeypatch.setattr(ledger_utils, '_ledger', ledger_utils.TransactionLedger(os.path.join(data_dir, 'ledger.json')))
+    monkeypatch.setattr(ledger_utils, '_ledger_listeners', [cube.mark_changed])
+    monkeypatch.setattr(aggregate_utils, '_cube', cube)
+    try:
+        yield data_dir
+    finally:
+        for cache in (data_utils._saved_transactions_cache, data_utils._rules_cache):
+            cache.clear()
+        shutil.rmtree(data_dir, ignore_errors=True)
@@ -0,0 +1,147 @@
+"""
+The aggregate cube must report the same annual and LTM totals as the
+per-request computation it replaced.
+
+reference_annual_totals is the old get_annual_totals loop without the
+Flask plumbing, working in cents. It differs in two deliberate ways. The
+old loop took the sign of an unmodified Plaid amount as is_debit but then
+negated the signed amount, so credits came out negative. Here the amount
+is made absolute before the sign is applied, as it already was for
+modified transactions. The old LTM column also stopped the day before
+today; the LTM window (rolling_window) runs through today, so the
+reference does too.
+"""
+import random
+import datetime
+
+import pytest
+
+import aggregate_utils
+from data_utils import PlaidRecord, parse_date, save_transactions, save_rules
+from ledger_utils import ingest_plaid_transactions
+from money_utils import to_cents
+
+def reference_annual_totals(plaid_txs, saved_transactions, start_year, end_year, today):
+    """Signed cents by year (and 'LTM') and category, debits negative."""
+    ltm_start = datetime.date(today.year - 1, today.month, 1)
+    totals = {}
+
+    def add(year_key, category, cents):
+        year_totals = totals.setdefault(year_key, {})
+        year_totals[category] = year_totals.get(category, 0) + cents
+
+    for tx in plaid_txs:
+        mods = saved_transactions.get(tx.transaction_id, {})
+        if mods.get('deleted', False):
+            continue
+        tx_date = parse_date(mods['date']) if 'date' in mods else tx.date
+        if tx_date.year < start_year or tx_date.year > end_year:
+            continue
+        category = mods['category'] if 'category' in mods else (tx.category[0] if tx.category else 'Uncategorized')
+        plaid_cents = to_cents(tx.amount)
+        cents = mods.get('amount_cents', abs(plaid_cents))
+        is_debit = mods.get('is_debit', plaid_cents > 0)
+        signed = -cents if is_debit else cents
+        add(tx_date.year, category, signed)
+        if ltm_start <= tx_date <= today:
+            add('LTM', category, signed)
+
+    for tx_data in saved_transactions.values():
+        if not tx_data.get('manual', False) or tx_data.get('deleted', False):
+            continue
+        tx_date = parse_date(tx_data['date'])
+        if tx_date.year < start_year or tx_date.year > end_year:
+            continue
+        category = tx_data.get('category', 'Uncategorized')
+        cents = tx_data.get('amount_cents', 0)
+        signed = -cents if tx_data.get('is_debit', True) else cents
+        add(tx_date.year, category, signed)
+        if ltm_start <= tx_date <= today:
+            add('LTM', category, signed)
+
+    return totals
+
+def random_history(rng, today, count):
+    """
+    Plaid records plus saved edits, deletions and manual transactions.
+
+    Dates run up to and including today, and one in twenty rows is dated
+    today so the end of the LTM window is always exercised.
+    """
+    def past(max_days):
+        if rng.random() < 0.05:
+            return today
+        return today - datetime.timedelta(days=rng.randint(1, max_days))
+
+    plaid_txs = [
+        PlaidRecord({
+            'transaction_id': f"tx-{i}",
+            'name': rng.choice(['Coffee Shop', 'Grocer', 'Payroll', 'Fuel Stop']),
+            'amount': round(rng.uniform(-300, 300), 2),
+            'date': past(2500),
+            'category': [rng.choice(['Food', 'Travel', 'Income', 'Shopping'])] if rng.random() < 0.95 else None,
+            'account_id': rng.choice(['acc-1', 'acc-2'])
+        })
+        for i in range(count)
+    ]
+
+    saved_transactions = {}
+    for tx in rng.sample(plaid_txs, count // 5):
+        mods = {}
+        if rng.random() < 0.5:
+            mods['category'] = rng.choice(['Food', 'Gifts'])
+        if rng.random() < 0.4:
+            mods['amount_cents'] = rng.randint(1, 50000)
+        if rng.random() < 0.4:
+            mods['is_debit'] = rng.random() < 0.5
+        if rng.random() < 0.3:
+            mods['date'] = past(2500).isoformat()
+        if rng.random() < 0.2:
+            mods = {'deleted': True}
+        if mods:
+            saved_transactions[tx.transaction_id] = mods
+    for i in range(count // 20):
+        saved_transactions[f"manual-{i}"] = {
+            'manual': True,
+            'merchant': 'Cash',
+            'amount_cents': rng.randint(1, 20000),
+            'is_debit': rng.random() < 0.8,
+            'category': rng.choice(['Food', 'Cash']),
+            'date': past(1500).isoformat(),
+            'deleted': rng.random() < 0.1
+        }
+    return plaid_txs, saved_transactions
+
+@pytest.mark.parametrize('seed', range(3))
+def test_cube_matches_reference_annual_totals(isolated_data, seed):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    plaid_txs, saved_transactions = random_history(rng, today, 3000)
+    save_rules({})
+    save_transactions(saved_transactions)
+    ingest_plaid_transactions(plaid_txs)
+
+    start_year, end_year = today.year - 4, today.year
+    expected = reference_annual_totals(plaid_txs, saved_transactions, start_year, end_year, today)
+    expected_ltm = {category: cents for category, cents in expected.pop('LTM', {}).items() if cents}
+
+    assert aggregate_utils.annual_category_totals(start_year, end_year) == expected
+    assert aggregate_utils.window_category_totals(*aggregate_utils.rolling_window('LTM', today)) == expected_ltm
+
+def test_cube_follows_edits(isolated_data):
+    rng = random.Random(7)
+    today = datetime.date.today()
+    plaid_txs, saved_transactions = random_history(rng, today, 500)
+    save_rules({})
+    save_transactions(saved_transactions)
+    ingest_plaid_transactions(plaid_txs)
+    aggregate_utils.annual_category_totals()
+
+    edited = dict(saved_transactions)
+    for tx in rng.sample(plaid_txs, 50):
+        edited[tx.transaction_id] = {'category': 'Edited', 'amount_cents': 1234, 'is_debit': True}
+    save_transactions(edited)
+
+    expected = reference_annual_totals(plaid_txs, edited, 1900, 2100, today)
+    expected.pop('LTM', None)
+    assert aggregate_utils.annual_category_totals() == expected
@@ -0,0 +1,47 @@
+import data_utils
+from cache_utils import LRUCache
+
+def fill_with_hot_entries(cache, version, reads=8):
+    """
+    Fill the cache with entries read often enough to win admission, without aging the sketch.
+
+    Keys are (data version, view) tuples of ints, which hash the same in every run.
+    """
+    for i in range(cache.max_size):
+        key = (version, i)
+        cache.set(key, i)
+        for _ in range(reads):
+            cache.get(key)
+
+def test_tinylfu_rejects_a_cold_key_when_full():
+    cache = LRUCache(max_size=4, shards=1, admission='tinylfu')
+    fill_with_hot_entries(cache, 1)
+    cache.get((1, 99))
+    cache.set((1, 99), 'x')
+    assert cache.get((1, 99)) is None
+    assert cache.get_stats()['admission_rejections'] == 1
+
+def test_drop_memory_lets_new_version_keys_in():
+    cache = LRUCache(max_size=4, shards=1, admission='tinylfu')
+    fill_with_hot_entries(cache, 1)
+
+    # Without dropping, the unreachable version-1 entries keep out the new key
+    cache.get((2, 0))
+    cache.set((2, 0), 0)
+    assert cache.get((2, 0)) is None
+
+    assert cache.drop_memory() == 4
+    cache.set((2, 0), 0)
+    assert cache.get((2, 0)) == 0
+
+def test_version_bump_drops_version_keyed_caches(monkeypatch):
+    cache = LRUCache(max_size=4, shards=1, admission='tinylfu')
+    other = LRUCache(max_size=4, shards=1)
+    monkeypatch.setattr(data_utils, '_version_keyed_caches', [(cache, ('transactions', 'ledger')),
+                                                              (other, ('categories',))])
+    cache.set('a', 1)
+    other.set('b', 2)
+
+    data_utils.bump_data_version('ledger')
+    assert cache.get('a') is None
+    assert other.get('b') == 2
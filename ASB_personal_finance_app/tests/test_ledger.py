@@ -0,0 +1,60 @@
+import os
+import datetime
+
+from data_utils import PlaidRecord, get_data_version, save_rules, save_transactions
+from ledger_utils import (
+    TransactionLedger, apply_all_rules_to_past_transactions, apply_rule_to_past_transactions, flush_ledger,
+    get_ledger_entry, ingest_plaid_transactions, rename_applied_category
+)
+
+def plaid_txs():
+    return [
+        PlaidRecord({
+            'transaction_id': f"tx-{i}",
+            'name': name,
+            'amount': 4.5,
+            'date': datetime.date(2024, 3, i + 1),
+            'category': ['Food'],
+            'account_id': 'acc-1'
+        })
+        for i, name in enumerate(['SQ *BLUE BOTTLE 1234', 'Blue Bottle Coffee', 'Grocer'])
+    ]
+
+def test_rule_run_moves_the_ledger_version(isolated_data):
+    save_rules({})
+    save_transactions({})
+    ingest_plaid_transactions(plaid_txs())
+    save_rules({'r1': {'description': 'blue bottle', 'category': 'Coffee', 'active': False}})
+
+    version = get_data_version('ledger')
+    assert apply_rule_to_past_transactions('r1', {'description': 'blue bottle', 'category': 'Coffee'}) == 2
+    assert get_ledger_entry('tx-0')['applied'][1] == 'Coffee'
+    assert get_data_version('ledger') != version
+
+    version = get_data_version('ledger')
+    assert rename_applied_category('coffee', 'Cafes') == 2
+    assert get_data_version('ledger') != version
+
+def test_run_all_moves_the_ledger_version(isolated_data):
+    save_rules({})
+    save_transactions({})
+    ingest_plaid_transactions(plaid_txs())
+    rules = {'r1': {'description': 'grocer', 'category': 'Groceries'}}
+
+    version = get_data_version('ledger')
+    apply_all_rules_to_past_transactions(rules)
+    assert get_ledger_entry('tx-2')['applied'][1] == 'Groceries'
+    assert get_data_version('ledger') != version
+
+def test_ledger_changes_reach_disk_only_on_flush(isolated_data):
+    save_rules({})
+    save_transactions({})
+    ledger_path = os.path.join(isolated_data, 'ledger.json')
+
+    ingest_plaid_transactions(plaid_txs())
+    assert not os.path.exists(ledger_path)
+
+    assert flush_ledger()
+    assert not flush_ledger()
+    reloaded = TransactionLedger(ledger_path)
+    assert sorted(reloaded.snapshot()) == ['tx-0', 'tx-1', 'tx-2']
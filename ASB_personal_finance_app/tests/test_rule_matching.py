@@ -0,0 +1,125 @@
+"""
+CompiledRuleSet must give the same answers as checking every rule in turn.
+
+The reference scan walks the rules in specificity order and asks each
+CompiledRule whether it matches, which is what rule matching did before the
+Aho-Corasick and amount indexes were added.
+"""
+import random
+
+import pytest
+
+import rule_utils
+from merchant_utils import normalize_merchant
+from rule_utils import CompiledRuleSet, run_bulk
+
+MERCHANTS = [
+    'SQ *BLUE BOTTLE COFFEE 1234', 'AMAZON MKTPLACE PMTS', 'Amazon.com*2K4', 'UBER   *TRIP HELP.UBER.COM',
+    'Uber Eats', 'STARBUCKS STORE 00123', 'SHELL OIL 5744', 'TARGET T-0812', 'Netflix.com', 'SPOTIFY USA',
+    'APPLE.COM/BILL', 'DELTA AIR 0062', 'Chevron 0091', 'KROGER #512', 'PAYPAL *STEAM GAMES', 'Costco Whse 0455',
+]
+WORDS = ['amazon', 'uber', 'eats', 'starbucks', 'shell', 'target', 'netflix', 'spotify', 'apple', 'delta',
+         'chevron', 'kroger', 'steam', 'costco', 'coffee', 'blue', 'bottle', 'oil', 'store', 'games']
+REGEXES = [r'^sq \*', r'\d{4}', r'amazon\.com', r'(uber|lyft)', r'store \d+$', r'[', r'help\.']
+CATEGORIES = ['Food', 'Travel', 'Shopping', '']
+SUBCATEGORIES = ['Coffee', 'Fuel', '']
+ACCOUNTS = ['acc-1', 'acc-2']
+AMOUNTS = ['4.50', '12.00', '19.99', '60.25', '100']
+
+def random_rule(rng):
+    rule = {'category': rng.choice(CATEGORIES[:-1]), 'match_description': rng.random() < 0.85}
+    match_type = rng.choice(rule_utils.MATCH_TYPES + ('bogus',)) if rng.random() < 0.6 else None
+    if match_type:
+        rule['match_type'] = match_type
+    if match_type == 'regex':
+        rule['description'] = rng.choice(REGEXES)
+    elif rng.random() < 0.9:
+        rule['description'] = ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+    if rng.random() < 0.35:
+        rule['match_amount'] = True
+        if rng.random() < 0.9:
+            rule['amount'] = rng.choice(AMOUNTS + ['-19.99', 'abc'])
+    if rng.random() < 0.3:
+        rule['original_category'] = rng.choice(CATEGORIES[:-1])
+    if rng.random() < 0.15:
+        rule['original_subcategory'] = rng.choice(SUBCATEGORIES[:-1])
+    if rng.random() < 0.1:
+        rule['amount_min'] = rng.choice(['5', '15'])
+    if rng.random() < 0.1:
+        rule['amount_max'] = rng.choice(['20', '70', 'x'])
+    if rng.random() < 0.1:
+        rule['account_id'] = rng.choice(ACCOUNTS)
+    if rng.random() < 0.1:
+        rule['date_start'] = rng.choice(['2024-01-01', '2024-06-15'])
+    if rng.random() < 0.1:
+        rule['date_end'] = rng.choice(['2024-06-30', '2024-13-01'])
+    if rng.random() < 0.1:
+        rule['active'] = False
+    return rule
+
+def random_transaction(rng):
+    raw = rng.choice(MERCHANTS)
+    if rng.random() < 0.3:
+        raw = f"{raw} {rng.choice(WORDS).upper()}"
+    cents = rule_utils.amount_to_cents(rng.choice(AMOUNTS + ['7.77', '30']))
+    date = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+    return normalize_merchant(raw), cents, rng.choice(CATEGORIES), rng.choice(SUBCATEGORIES), rng.choice(ACCOUNTS), date, raw
+
+def naive_match(compiled_rules, description, cents, category, subcategory, account_id, date, raw):
+    for compiled in compiled_rules.ordered:
+        if compiled.active and compiled.matches(description, cents, category, subcategory, account_id, date, raw):
+            return compiled
+    return None
+
+def naive_match_all(compiled_rules, description, cents, account_id, date, raw):
+    return [
+        compiled for compiled in compiled_rules.ordered
+        if compiled.active and compiled.matches_past(description, cents, account_id, date, raw)
+    ]
+
+@pytest.mark.parametrize('seed', range(20))
+def test_match_equals_rule_by_rule_scan(seed):
+    rng = random.Random(seed)
+    rules = {str(i): random_rule(rng) for i in range(rng.randint(1, 80))}
+    compiled_rules = CompiledRuleSet(rules)
+
+    for _ in range(300):
+        description, cents, category, subcategory, account_id, date, raw = random_transaction(rng)
+        expected = naive_match(compiled_rules, description, cents, category, subcategory, account_id, date, raw)
+        assert compiled_rules.match(description, cents, category, subcategory, account_id, date, raw) is expected
+
+        each = compiled_rules.match_each(description, cents, category, subcategory, account_id, date, raw)
+        assert (each[0] if each else None) is expected
+
+        assert compiled_rules.match_all(description, cents, account_id, date, raw) == \
+            naive_match_all(compiled_rules, description, cents, account_id, date, raw)
+
+def test_regex_rules_search_the_raw_merchant():
+    compiled_rules = CompiledRuleSet({
+        'square': {'description': r'^sq \*', 'match_type': 'regex', 'category': 'Square'},
+        'store': {'description': r'\d{4}', 'match_type': 'regex', 'category': 'Numbered'},
+    })
+    raw = 'SQ *BLUE BOTTLE COFFEE 1234'
+    assert compiled_rules.match(normalize_merchant(raw), 450, raw_description=raw).rule_id == 'square'
+    assert [c.rule_id for c in compiled_rules.match_all(normalize_merchant(raw), 450, raw_description=raw)] == \
+        ['square', 'store']
+
+@pytest.mark.parametrize('match_all', [False, True])
+def test_run_bulk_parallel_equals_serial(monkeypatch, caplog, match_all):
+    rng = random.Random(99)
+    compiled_rules = CompiledRuleSet({str(i): random_rule(rng) for i in range(60)})
+    transactions = [random_transaction(rng) for _ in range(500)]
+    if match_all:
+        rows = [(tx[0], tx[1], tx[4], tx[5], tx[6]) for tx in transactions]
+        expected = [tuple(c.rule_id for c in naive_match_all(compiled_rules, *row)) for row in rows]
+    else:
+        rows = transactions
+        expected = [getattr(naive_match(compiled_rules, *row), 'rule_id', None) for row in rows]
+
+    monkeypatch.setattr(rule_utils, 'PARALLEL_CHUNK_ROWS', 64)
+    monkeypatch.setattr(rule_utils, 'PARALLEL_MAX_WORKERS', 2)
+    assert run_bulk(compiled_rules, rows, match_all=match_all, parallel=False) == expected
+    assert run_bulk(compiled_rules, rows, match_all=match_all, parallel=True) == expected
+    # A failed pool falls back to serial matching, which would hide a broken parallel path
+    assert 'falling back to serial' not in caplog.text
+    assert any(expected)
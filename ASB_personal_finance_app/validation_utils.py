@@ -1,6 +1,7 @@
 import re
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
+from rule_utils import MATCH_TYPES as RULE_MATCH_TYPES
 
 class ValidationError(Exception):
     """Custom exception for validation errors"""
@@ -100,6 +101,16 @@ class InputValidator:
             if len(description) > 200:
                 errors.append("Description must be 200 characters or less")
         
+        # Validate how the description is matched
+        match_type = data.get('match_type') or 'contains'
+        if match_type not in RULE_MATCH_TYPES:
+            errors.append(f"Match type must be one of: {', '.join(RULE_MATCH_TYPES)}")
+        elif match_type == 'regex' and data.get('match_description', True):
+            try:
+                re.compile(data.get('description', '').strip())
+            except re.error as e:
+                errors.append(f"Invalid regular expression: {str(e)}")
+        
         # Validate amount if matching is enabled
         if data.get('match_amount', False):
             try:
@@ -109,6 +120,34 @@ class InputValidator:
             except (InvalidOperation, ValueError):
                 errors.append("Invalid amount format")
         
+        # Validate the optional amount range
+        bounds = {}
+        for field in ('amount_min', 'amount_max'):
+            if data.get(field) not in (None, ''):
+                try:
+                    bounds[field] = Decimal(str(data[field]))
+                    if bounds[field] < 0:
+                        errors.append(f"{field} cannot be negative")
+                except (InvalidOperation, ValueError):
+                    errors.append(f"Invalid {field} format")
+        if len(bounds) == 2 and bounds['amount_min'] > bounds['amount_max']:
+            errors.append("amount_min cannot be greater than amount_max")
+        
+        # Validate the optional account condition
+        if data.get('account_id') and not InputValidator.is_valid_id(data['account_id']):
+            errors.append("Invalid account ID")
+        
+        # Validate the optional date window
+        dates = {}
+        for field in ('date_start', 'date_end'):
+            if data.get(field) not in (None, ''):
+                try:
+                    dates[field] = datetime.strptime(str(data[field]).strip(), "%Y-%m-%d")
+                except ValueError:
+                    errors.append(f"{field} must be a YYYY-MM-DD date")
+        if len(dates) == 2 and dates['date_start'] > dates['date_end']:
+            errors.append("date_start cannot be after date_end")
+        
         # Validate category
         if 'category' not in data or not data['category'].strip():
             errors.append("Target category is required")